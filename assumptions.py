@@ -0,0 +1,265 @@
+# Actuarial assumption tables
+#
+#   HSS_ASSUMPTIONS=/srv/hss/assumptions/2026.2 python scoring_service.py
+#   tables = current_assumptions()
+#   tables.risk_multiplier[age, status]     # dense lookups, indexed like the engines
+#
+# Cost, risk and insurance assumptions live in a versioned directory of tables (CSV, or
+# Parquet with the same stem), one directory per version; assumption_tables/v1 holds
+# the shipped defaults. Tables keyed by age band x health status are expanded to one
+# row per age 0..MAX_AGE and every table is compiled into read-only NumPy arrays, so
+# the vectorized engines look values up by plain indexing. With mmap, the compiled
+# arrays are cached as .npy files next to the tables and memory-mapped, so every worker
+# process shares one copy. current_assumptions() re-checks the table files every
+# RELOAD_INTERVAL seconds and swaps in a recompiled set when they change, so a running
+# service picks up new tables without a restart. CSV tables are parsed with the csv
+# module, so loading assumptions never imports pandas.
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from itertools import repeat
+
+import numpy as np
+
+HEALTH_STATES = ("healthy", "chronic", "high_risk")
+MAX_AGE = 85
+CARE_SCOPES = ("household", "family_only", "per_dependent")
+TABLES = ("parameters", "risk_multipliers", "care_addons", "insurance", "state_risk", "transitions")
+PARAMETERS = ("base_cost", "aging_rate", "dependent_cost_share")
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assumption_tables", "v1")
+ASSUMPTIONS_DIR = os.environ.get("HSS_ASSUMPTIONS", DEFAULT_DIR)
+ASSUMPTIONS_MMAP = os.environ.get("HSS_ASSUMPTIONS_MMAP", "") not in ("", "0")
+RELOAD_INTERVAL = 5.0
+COMPILED_DIR = ".compiled"
+
+
+def _table_path(directory, name):
+    parquet = os.path.join(directory, name + ".parquet")
+    return parquet if os.path.exists(parquet) else os.path.join(directory, name + ".csv")
+
+
+def _read_table(directory, name, columns):
+    path = _table_path(directory, name)
+    if not os.path.exists(path):
+        raise ValueError(f"Assumption table {name!r} not found in {directory}")
+    # {column: array}; CSV cells stay strings until a column is converted
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = {column: np.asarray(values) for column, values in pq.read_table(path).to_pydict().items()}
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f))
+        header, rows = (rows[0], rows[1:]) if rows else ([], [])
+        table = {column: np.array([row[i] for row in rows], dtype=str) for i, column in enumerate(header)}
+    missing = set(columns) - set(table)
+    if missing:
+        raise ValueError(f"Assumption table {name!r} is missing columns {sorted(missing)}")
+    return table
+
+
+def label_codes(values, labels):
+    """Position of each value in `labels`; -1 for anything else (unknown, None, NaN)."""
+    lookup = {label: i for i, label in enumerate(labels)}
+    if np.ndim(values) == 0:
+        return np.asarray(lookup.get(values, -1), dtype=np.intp)
+    values = values.tolist() if hasattr(values, "tolist") else list(values)
+    return np.fromiter(map(lookup.get, values, repeat(-1)), dtype=np.intp, count=len(values))
+
+
+def _codes(values, labels, table, column):
+    codes = label_codes(values, labels)
+    if (codes < 0).any():
+        unknown = sorted(set(np.asarray(values)[codes < 0].tolist()))
+        raise ValueError(f"Assumption table {table!r} has unknown {column} values {unknown}")
+    return codes
+
+
+def _by_age(df, table, key_columns, value_column):
+    # Expand age-band rows (age = band start age) into one entry per age 0..MAX_AGE;
+    # every band needs a value for every key
+    ages = df["age"].astype(np.int64)
+    bands = np.unique(ages)
+    keys = tuple(_codes(df[column], HEALTH_STATES, table, column) for column in key_columns)
+    values = np.full((len(bands),) + (len(HEALTH_STATES),) * len(key_columns), np.nan)
+    values[(np.searchsorted(bands, ages),) + keys] = df[value_column].astype(np.float64)
+    if bands[0] != 0 or np.isnan(values).any():
+        raise ValueError(f"Assumption table {table!r} needs a {value_column} for every "
+                         f"{'/'.join(key_columns)} in every age band, starting at age 0")
+    return values[np.searchsorted(bands, np.arange(MAX_AGE + 1), side="right") - 1]
+
+
+def compile_tables(directory):
+    """Read the tables in `directory` into a dict of dense arrays and labels."""
+    parameters = _read_table(directory, "parameters", ("name", "value"))
+    values = dict(zip(parameters["name"].tolist(), parameters["value"].astype(np.float64).tolist()))
+    missing = set(PARAMETERS) - set(values)
+    if missing:
+        raise ValueError(f"Assumption table 'parameters' is missing {sorted(missing)}")
+
+    care = _read_table(directory, "care_addons", ("care_category", "annual_cost", "scope"))
+    insurance = _read_table(directory, "insurance", ("insurance_type", "employee_premium", "employer_premium",
+                                                     "oop_pct"))
+    transitions = _by_age(_read_table(directory, "transitions", ("age", "from_status", "to_status", "probability")),
+                          "transitions", ("from_status", "to_status"), "probability")
+    if not np.allclose(transitions.sum(axis=-1), 1.0):
+        raise ValueError("Assumption table 'transitions' rows must sum to 1 for every age and from_status")
+    return {
+        "arrays": {
+            "risk_multiplier": _by_age(_read_table(directory, "risk_multipliers",
+                                                   ("age", "health_status", "multiplier")),
+                                       "risk_multipliers", ("health_status",), "multiplier"),
+            "state_risk": _by_age(_read_table(directory, "state_risk", ("age", "health_status", "risk")),
+                                  "state_risk", ("health_status",), "risk"),
+            "transitions": transitions,
+            "care_cost": care["annual_cost"].astype(np.float64),
+            "care_scope": _codes(care["scope"], CARE_SCOPES, "care_addons", "scope").astype(np.int8),
+            "premiums": np.stack([insurance["employee_premium"], insurance["employer_premium"]],
+                                 axis=1).astype(np.float64),
+            "oop_pct": insurance["oop_pct"].astype(np.float64)
+        },
+        "labels": {
+            "parameters": {name: values[name] for name in PARAMETERS},
+            "care_categories": care["care_category"].astype(str).tolist(),
+            "insurance_types": insurance["insurance_type"].astype(str).tolist()
+        }
+    }
+
+
+def _stamp(directory):
+    # Cheap change check: (path, size, mtime) of every table file
+    stamp = []
+    for name in TABLES:
+        path = _table_path(directory, name)
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append((path, info.st_size, info.st_mtime_ns))
+    return tuple(stamp)
+
+
+def _fingerprint(stamp):
+    digest = hashlib.blake2b(digest_size=8)
+    for path, _, _ in stamp:
+        with open(path, "rb") as f:
+            digest.update(os.path.basename(path).encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+
+def _load_compiled(directory, fingerprint):
+    # Memory-map the compiled arrays for these tables, compiling them on first use.
+    # Falls back to in-memory arrays when the table directory is not writable.
+    compiled_dir = os.path.join(directory, COMPILED_DIR, fingerprint)
+    if not os.path.exists(compiled_dir):
+        compiled = compile_tables(directory)
+        tmp_dir = f"{compiled_dir}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            for name, array in compiled["arrays"].items():
+                np.save(os.path.join(tmp_dir, name + ".npy"), array)
+            with open(os.path.join(tmp_dir, "labels.json"), "w") as f:
+                json.dump(compiled["labels"], f)
+            os.replace(tmp_dir, compiled_dir)
+        except OSError:
+            # Another process may have won the rename; otherwise serve the in-memory arrays
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(compiled_dir):
+                return compiled
+    with open(os.path.join(compiled_dir, "labels.json")) as f:
+        labels = json.load(f)
+    arrays = {name[:-4]: np.load(os.path.join(compiled_dir, name), mmap_mode="r")
+              for name in os.listdir(compiled_dir) if name.endswith(".npy")}
+    return {"arrays": arrays, "labels": labels}
+
+
+class Assumptions:
+    """One compiled version of the assumption tables; never modified after loading.
+
+    Arrays are indexed by age (0..MAX_AGE), HEALTH_STATES position, care category and
+    insurance type position. Values derived from the tables (e.g. the risk trajectory
+    tables) are cached per instance with `derived`, so they are rebuilt on reload.
+    """
+
+    def __init__(self, directory, compiled, stamp, fingerprint):
+        self.directory = directory
+        self.version = os.path.basename(os.path.normpath(directory))
+        self.stamp = stamp
+        self.fingerprint = fingerprint
+        for name, array in compiled["arrays"].items():
+            if isinstance(array, np.ndarray) and not isinstance(array, np.memmap):
+                array.flags.writeable = False
+            setattr(self, name, array)
+        labels = compiled["labels"]
+        self.parameters = labels["parameters"]
+        self.care_categories = tuple(labels["care_categories"])
+        self.insurance_types = tuple(labels["insurance_types"])
+        # Dict views for single-profile callers (Step 1 widgets, scenario sweeps)
+        self.average_premiums = {name: tuple(float(v) for v in self.premiums[i])
+                                 for i, name in enumerate(self.insurance_types)}
+        self.average_oop_pct = {name: float(self.oop_pct[i]) for i, name in enumerate(self.insurance_types)}
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def status_codes(self, statuses):
+        # HEALTH_STATES position of each status, -1 for unknown ones
+        return label_codes(statuses, HEALTH_STATES)
+
+    def insurance_codes(self, insurance_types):
+        # insurance_types position of each type, -1 for unknown ones
+        return label_codes(insurance_types, self.insurance_types)
+
+    def derived(self, key, build):
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+
+def load_assumptions(directory=DEFAULT_DIR, mmap=False) -> Assumptions:
+    directory = os.path.abspath(directory)
+    stamp = _stamp(directory)
+    fingerprint = _fingerprint(stamp)
+    compiled = _load_compiled(directory, fingerprint) if mmap else compile_tables(directory)
+    return Assumptions(directory, compiled, stamp, fingerprint)
+
+
+_lock = threading.Lock()
+_state = {"directory": ASSUMPTIONS_DIR, "mmap": ASSUMPTIONS_MMAP, "current": None, "checked": 0.0}
+
+
+def current_assumptions() -> Assumptions:
+    """The active tables, reloaded when their files have changed.
+
+    Files are checked at most every RELOAD_INTERVAL seconds; a failed reload (e.g. a
+    half-edited table) keeps serving the previous version.
+    """
+    current = _state["current"]
+    if current is not None and time.monotonic() - _state["checked"] < RELOAD_INTERVAL:
+        return current
+    with _lock:
+        current = _state["current"]
+        if current is None or _stamp(current.directory) != current.stamp:
+            try:
+                current = load_assumptions(_state["directory"], _state["mmap"])
+            except (ValueError, OSError):
+                if current is None:
+                    raise
+            _state["current"] = current
+        _state["checked"] = time.monotonic()
+        return current
+
+
+def use_assumptions(directory, mmap=None):
+    """Switch to the tables in `directory` (and load them now, so errors surface here)."""
+    with _lock:
+        _state["directory"] = directory
+        if mmap is not None:
+            _state["mmap"] = mmap
+        _state["current"] = load_assumptions(directory, _state["mmap"])
+        _state["checked"] = time.monotonic()
+        return _state["current"]
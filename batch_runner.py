@@ -0,0 +1,165 @@
+# Headless batch runner: profiles in, Steps 1-4 projections out
+#
+#   python batch_runner.py profiles.csv projections.parquet --chunk-size 50000
+#
+# Input is CSV, JSONL or Parquet with one profile per row. Missing columns fall back
+# to the Streamlit app's defaults. Rows failing the input rules (no age, age outside
+# 18-85, unknown labels, non-numeric amounts) are skipped and reported with their ids.
+# Chunks are projected with the vectorized engines (core_api) and appended to the
+# output Parquet file, so memory stays flat for any input size.
+
+import argparse
+import json
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core_api import MONTHLY_FIELDS, SERIES_FIELDS, SUMMARY_FIELDS, profile_errors, project_profiles
+
+CHUNK_SIZE = 50000
+# Columns holding a list per profile; CSV cells carry them as "[20, 24]" or "20;24"
+LIST_COLUMNS = ("dependent_ages",)
+# Rejected rows printed by the CLIs; the rest are only counted
+MAX_REPORTED = 20
+
+
+def _parse_list(value):
+    # A list cell written as text; anything else is left for validation to reject
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    try:
+        if text.startswith("["):
+            return json.loads(text)
+        return [float(part) for part in text.split(";") if part.strip()]
+    except ValueError:
+        return value
+
+
+def _read_chunks(path, chunk_size):
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif path.endswith((".jsonl", ".json")):
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size)
+    else:
+        # "None" is a valid insurance_type, so only empty cells count as missing
+        yield from pd.read_csv(path, chunksize=chunk_size, keep_default_na=False, na_values=[""])
+
+
+def read_profiles(path, chunk_size=CHUNK_SIZE):
+    # Yield DataFrame chunks without loading the whole input
+    for chunk in _read_chunks(path, chunk_size):
+        for name in LIST_COLUMNS:
+            if name in chunk.columns:
+                chunk[name] = chunk[name].astype(object).map(_parse_list)
+        yield chunk
+
+
+def split_invalid(chunk: pd.DataFrame, id_column="profile_id", row_offset=0):
+    """(rows that can be projected, [(id, reason), ...] for the rest).
+
+    Without an `id_column`, rows first get their input position as id, so dropping
+    bad rows does not shift the ids of the others.
+    """
+    if id_column not in chunk.columns:
+        chunk = chunk.assign(**{id_column: np.arange(row_offset, row_offset + len(chunk))})
+    errors = profile_errors(chunk)
+    bad = errors != ""
+    if not bad.any():
+        return chunk, []
+    return chunk[~bad], list(zip(chunk[id_column][bad].tolist(), errors[bad].tolist()))
+
+
+def print_rejected(rejected, limit=MAX_REPORTED):
+    for row_id, reason in rejected[:limit]:
+        print(f"Skipped profile {row_id}: {reason}", file=sys.stderr)
+    if len(rejected) > limit:
+        print(f"... and {len(rejected) - limit:,} more skipped profiles", file=sys.stderr)
+
+
+def _list_column(matrix, in_horizon, years):
+    offsets = np.concatenate([[0], np.cumsum(years)]).astype(np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), pa.array(matrix[in_horizon]))
+
+
+def project_chunk(chunk: pd.DataFrame, id_column="profile_id", row_offset=0, monthly=False) -> pa.Table:
+    """Run Steps 1-4 for every profile in `chunk`; one output row per profile.
+
+    With `monthly`, Steps 2-3 are also evaluated month by month and the output gains
+    the number of deficit months and the month (counted from the start age) of the first.
+    Every row must pass the input rules (ValueError otherwise); see split_invalid.
+    """
+    result = project_profiles(chunk, monthly=monthly)
+    n = len(chunk)
+    years = result["years"]
+    in_horizon = np.arange(result["surplus"].shape[1])[None, :] < years[:, None]
+
+    ids = chunk[id_column] if id_column in chunk.columns else np.arange(row_offset, row_offset + n)
+    options = {"first_deficit_age": {"mask": ~result["has_deficit"]},
+               "recommendation_ids": {"type": pa.list_(pa.string())}}
+    fields = SUMMARY_FIELDS
+    if monthly:
+        options["first_deficit_month"] = {"mask": result["deficit_months"] == 0}
+        fields += MONTHLY_FIELDS
+    columns = {id_column: pa.array(ids)}
+    for name in fields:
+        columns[name] = pa.array(result[name], **options.get(name, {}))
+    for name in SERIES_FIELDS:
+        columns[name] = _list_column(result[name], in_horizon, years)
+    return pa.table(columns)
+
+
+def run_batch(input_path, output_path, chunk_size=CHUNK_SIZE, id_column="profile_id", monthly=False):
+    start = time.perf_counter()
+    processed = 0
+    rejected = []
+    writer = None
+    try:
+        for chunk in read_profiles(input_path, chunk_size):
+            valid, chunk_rejected = split_invalid(chunk, id_column, processed)
+            processed += len(chunk)
+            rejected += chunk_rejected
+            if not len(valid):
+                continue
+            table = project_chunk(valid, id_column=id_column, monthly=monthly)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "profiles": processed,
+        "rejected": rejected,
+        "seconds": elapsed,
+        "profiles_per_sec": processed / elapsed if elapsed else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Steps 1-4 projections for a file of profiles.")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file with one profile per row")
+    parser.add_argument("output", help="Parquet file to write projections to")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--id-column", default="profile_id")
+    parser.add_argument("--monthly", action="store_true", help="add monthly deficit columns")
+    args = parser.parse_args(argv)
+
+    stats = run_batch(args.input, args.output, args.chunk_size, args.id_column, args.monthly)
+    print_rejected(stats["rejected"])
+    print(f"Projected {stats['profiles'] - len(stats['rejected']):,} profiles in {stats['seconds']:.1f}s "
+          f"({stats['profiles_per_sec']:,.0f} profiles/sec, peak RSS {stats['peak_rss_mb']:,.0f} MB); "
+          f"{len(stats['rejected']):,} invalid profiles skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Cold-start budget for the headless core
+#
+#   python benchmarks/import_time.py
+#   python benchmarks/import_time.py --repeat 9 --output imports.json --budget core_api=60
+#
+# Each module is imported in a fresh interpreter, and core_api also runs a first
+# one-profile projection (loading the assumption tables). The interpreter imports NumPy
+# first and only the module's own import is timed, since every core module needs NumPy
+# and its import cost is a property of the machine; budgets are for the milliseconds on
+# top of it, as the median of --repeat interpreters.
+# A case fails when it is over budget or leaves any of HEAVY_MODULES loaded, so pool
+# workers and serverless handlers that only need the engines keep starting quickly.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("pandas", "pyarrow", "matplotlib", "streamlit")
+# Milliseconds allowed on top of the NumPy import, about twice the measured medians
+IMPORT_BUDGETS = {
+    "instrumentation": 15,
+    "assumptions": 20,
+    "simulator_core": 25,
+    "monthly_cashflow": 25,
+    "projected_health_risk": 25,
+    "recommendation_engine": 25,
+    "capital_optimizer": 30,
+    "monte_carlo": 40,
+    "risk_chart": 25,
+    "core_api": 60,
+    "scoring_service": 90
+}
+# Work timed after the import, so lazy loading cannot hide cost from the budget
+FIRST_CALLS = {
+    "core_api": "module.project_profiles({'age': [45], 'health_status': ['chronic']})"
+}
+
+_CHILD = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import numpy
+numpy_seconds = time.perf_counter() - start
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+{call}
+seconds = time.perf_counter() - start
+print(json.dumps({{"numpy": numpy_seconds, "seconds": seconds,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def time_import(module, call="", repeat=5):
+    # Median seconds for importing `module` (and running `call`) in a fresh interpreter
+    # that has already imported NumPy, the median NumPy import, and the heavy modules
+    # any run left loaded
+    code = _CHILD.format(root=ROOT, module=module, call=call, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {"seconds": statistics.median(run["seconds"] for run in runs),
+            "numpy": statistics.median(run["numpy"] for run in runs),
+            "loaded": sorted({name for run in runs for name in run["loaded"]})}
+
+
+def run(repeat=5, only=None):
+    results = {}
+    for module in IMPORT_BUDGETS:
+        if only and module not in only:
+            continue
+        timing = time_import(module, FIRST_CALLS.get(module, ""), repeat)
+        results[module] = {"ms": (timing["numpy"] + timing["seconds"]) * 1e3, "numpy_ms": timing["numpy"] * 1e3,
+                           "over_numpy_ms": timing["seconds"] * 1e3, "loaded": timing["loaded"]}
+    return results
+
+
+def check(results, budgets):
+    failures = []
+    for module, result in results.items():
+        if module not in budgets:
+            continue
+        if result["over_numpy_ms"] > budgets[module]:
+            failures.append(f"{module}: {result['over_numpy_ms']:.1f} ms over NumPy (budget {budgets[module]} ms)")
+        if result["loaded"]:
+            failures.append(f"{module}: imports {', '.join(result['loaded'])}")
+    return failures
+
+
+def _parse_budgets(values):
+    budgets = dict(IMPORT_BUDGETS)
+    for value in values or []:
+        name, ms = value.split("=", 1)
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the core modules' cold-start import time.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (median of)")
+    parser.add_argument("--budget", action="append", help="override one budget, e.g. core_api=60 (ms over NumPy)")
+    parser.add_argument("--only", action="append", help="check only these modules")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    for module, result in results.items():
+        print(f"{module}: {result['ms']:.1f} ms ({result['over_numpy_ms']:.1f} ms over NumPy's "
+              f"{result['numpy_ms']:.1f} ms)", file=sys.stderr)
+
+    failures = check(results, _parse_budgets(args.budget))
+    for failure in failures:
+        print(f"COLD START {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
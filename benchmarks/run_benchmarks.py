@@ -0,0 +1,328 @@
+# Benchmark suite with size-scaling cases and regression gates
+#
+#   python benchmarks/run_benchmarks.py --output results.json
+#   python benchmarks/run_benchmarks.py --save-baseline             # record benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --threshold 0.25 --threshold recommend_bulk=0.5
+#
+# Each case is timed at several sizes: horizon (start age 18 vs 80), number of profiles
+# (1 -> 1M) and number of dependents. Results are written as JSON and compared with the
+# baseline by median time; a case slower than baseline * (1 + threshold) is flagged.
+# Cases under SHORT_CASE also have to be slower by SHORT_CASE_NOISE of their baseline,
+# since they jitter by that much between runs. A fixed reference kernel is timed around
+# every case, and when it ran slower than in the baseline the allowance grows with it.
+# Flagged cases are timed again, interleaved with the reference, and only those still
+# slow in every round fail the run. This damps machine noise but cannot rule it out on
+# a busy machine. Re-record the baseline when a case's code changes on purpose.
+# Some cases also have a budget relative to another case of the same run (RATIO_LIMITS),
+# e.g. monthly Steps 2-3 must stay within 2x the annual ones; a case over it is timed
+# again next to its pair and fails only if it stays over in every round.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+import simulator_core as core
+from assumptions import current_assumptions
+import monthly_cashflow as monthly
+import population_stats as population
+import projected_health_risk as risk
+import recommendation_engine as recs
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR = 0.0002  # seconds; smaller slowdowns are timer noise, not regressions
+SHORT_CASE = 0.005  # seconds
+SHORT_CASE_NOISE = 0.5
+RETIME_ROUNDS = 3
+# case name -> (reference case with the same params, allowed median time ratio)
+RATIO_LIMITS = {"monthly_summary": ("steps_2_3", 2.0)}
+START_AGES = (18, 80)
+PROFILE_COUNTS = (1, 1000, 100000, 1000000)
+DEPENDENTS = (0, 10)
+CARE_PREFS = {key: True for key in current_assumptions().care_categories}
+REFERENCE_SMALL = np.full(68, 1.05)
+REFERENCE_LARGE = np.full(200000, 1.0001)
+
+
+def _profile(age, dependents):
+    return {
+        "age": age,
+        "health_status": "chronic",
+        "family_status": "family" if dependents else "single",
+        "num_dependents": dependents,
+        "dependent_ages": [5] * dependents,
+        "partner_age": age,
+        "partner_health_status": "healthy"
+    }
+
+
+def _profiles(n, dependents, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "age": rng.integers(18, 86, n),
+        "health_status": rng.choice(risk.HEALTH_STATES, n),
+        "family_status": "family" if dependents else "single",
+        "num_dependents": dependents,
+        "insurance_type": rng.choice(list(current_assumptions().insurance_types), n),
+        "coverage_ratio": rng.random(n) * 2,
+        "max_cost": rng.random(n) * 30000
+    })
+
+
+def _cost_df(age, dependents):
+    return core.apply_insurance(core.generate_costs(_profile(age, dependents), CARE_PREFS), 8000, 0.15, 0.05)
+
+
+def _steps_2_3(n, years):
+    # Step 2 projections and Step 3 surplus for n profiles over `years`
+    premiums = core.growth_schedule(np.full(n, 8000.0), 0.05, years)
+    oop = np.full((n, years), 900.0)
+
+    def run():
+        finances = core.project_finances(np.full(n, 45000.0), 0.02, 10000, 0.03, 3000, 6000, 0.05, years)
+        core.expense_comparison(premiums, oop, finances["income_proj"], finances["savings_proj"], 2500, 500, 0.02)
+    return run
+
+
+def _monthly_summary(n, years):
+    # The same Step 2/3 inputs at monthly resolution, streamed into yearly aggregates
+    premiums = core.growth_schedule(np.full(n, 8000.0), 0.05, years)
+    oop = np.full((n, years), 900.0)
+
+    def run():
+        income = core.growth_schedule(np.full(n, 45000.0), 0.02, years)
+        for _ in monthly.iter_monthly_summary(premiums, oop, income, 2500, 500, 0.02, 10000, 0.03, 3000, 6000, 0.05):
+            pass
+    return run
+
+
+def _population_update(n):
+    # Folding one projected chunk into the population aggregate (projection not timed)
+    profiles = _profiles(n, 0)
+    projections = population.project_chunk(profiles)
+    return lambda: population.PopulationStats().update(profiles, projections)
+
+
+def cases(max_profiles):
+    """Yield (name, params, callable) for every benchmark case."""
+    for age in START_AGES:
+        for dependents in DEPENDENTS:
+            profile = _profile(age, dependents)
+            yield "generate_costs", {"start_age": age, "dependents": dependents}, \
+                lambda profile=profile: core.generate_costs(profile, CARE_PREFS)
+
+        cost_df = _cost_df(age, 0)
+        yield "simulate_investment_strategy", {"start_age": age}, \
+            lambda cost_df=cost_df: core.simulate_investment_strategy(cost_df, 0.05, 1000, 10000)
+        yield "projected_risk", {"start_age": age}, lambda age=age: risk.projected_risk(age, "chronic")
+        yield "get_risk_insight", {"start_age": age}, lambda age=age: risk.get_risk_insight(age, "chronic")
+        yield "generate_recommendation", {"start_age": age}, \
+            lambda age=age, cost_df=cost_df: recs.generate_recommendation(
+                _profile(age, 0), cost_df, [-1.0, 1.0], "Employer-based", {})
+        yield "steps_2_3", {"start_age": age, "profiles": 1}, _steps_2_3(1, core.AGE_END - age + 1)
+        yield "monthly_summary", {"start_age": age, "profiles": 1}, _monthly_summary(1, core.AGE_END - age + 1)
+
+    for n in (count for count in PROFILE_COUNTS if count <= max_profiles):
+        for dependents in DEPENDENTS:
+            table = _profiles(n, dependents)
+            yield "generate_costs_batch", {"profiles": n, "dependents": dependents}, \
+                lambda table=table: core.generate_costs_batch(table, CARE_PREFS)
+        table = _profiles(n, 0)
+        yield "risk_summary", {"profiles": n}, \
+            lambda table=table: risk.risk_summary(table["age"], table["health_status"])
+        yield "recommend_bulk", {"profiles": n}, lambda table=table: recs.recommend_bulk(table)
+        if n > 1:
+            yield "steps_2_3", {"start_age": 18, "profiles": n}, _steps_2_3(n, core.AGE_END - 18 + 1)
+            yield "monthly_summary", {"start_age": 18, "profiles": n}, _monthly_summary(n, core.AGE_END - 18 + 1)
+        if n <= population.CHUNK_SIZE * 2:
+            yield "population_update", {"profiles": n}, _population_update(n)
+        yield "simulate_investment_grid", {"strategies": n}, \
+            lambda n=n: core.simulate_investment_grid(68, np.linspace(0, 0.1, n), [1000.0], [0.0])
+
+
+def time_case(func, min_time=0.5, min_repeats=5, max_repeats=100):
+    func()  # warm-up
+    samples = []
+    start = time.perf_counter()
+    while len(samples) < max_repeats and (len(samples) < min_repeats or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return {"median": statistics.median(samples), "min": min(samples), "repeats": len(samples)}
+
+
+def _reference():
+    # Machine-speed probe: interpreter-bound small-array calls plus one memory-bound pass,
+    # like the small and large cases
+    for _ in range(50):
+        np.cumprod(REFERENCE_SMALL)
+    np.cumsum(REFERENCE_LARGE)
+
+
+def time_reference():
+    return time_case(_reference, min_time=0.01, min_repeats=3, max_repeats=10)["min"]
+
+
+def measure(func):
+    # Timing of one case with the reference taken just before and after it
+    before = time_reference()
+    timing = time_case(func)
+    return {**timing, "reference": min(before, time_reference())}
+
+
+def case_key(name, params):
+    return name + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+
+
+def run(max_profiles, only=None):
+    results = {}
+    for name, params, func in cases(max_profiles):
+        if only and name not in only:
+            continue
+        key = case_key(name, params)
+        results[key] = {"name": name, "params": params, **measure(func)}
+        print(f"{key:<70} {results[key]['median'] * 1e3:>10.3f} ms", file=sys.stderr)
+    return results
+
+
+def slowdown(result, base, threshold):
+    # Median time as a multiple of the baseline's, or None when within the allowance
+    expected = base["median"]
+    if "reference" in result and "reference" in base:
+        # Only ever loosened: a fast reference run must not turn noise into a regression
+        expected *= max(result["reference"] / base["reference"], 1.0)
+    noise = max(NOISE_FLOOR, SHORT_CASE_NOISE * expected) if expected < SHORT_CASE else NOISE_FLOOR
+    ratio = result["median"] / expected
+    return ratio if ratio > 1 + threshold and result["median"] - expected > noise else None
+
+
+def compare(results, baseline, default_threshold, thresholds):
+    # Cases slower than baseline by more than their threshold
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        threshold = thresholds.get(result["name"], default_threshold)
+        ratio = slowdown(result, baseline[key], threshold)
+        if ratio is not None:
+            regressions.append((key, ratio, threshold))
+    return regressions
+
+
+def retime(regressions, baseline, max_profiles, rounds=RETIME_ROUNDS):
+    # Time flagged cases again, each round between reference runs; a case that is
+    # within its allowance in any round was noise
+    flagged = {key: threshold for key, _, threshold in regressions}
+    confirmed = []
+    for name, params, func in cases(max_profiles):
+        key = case_key(name, params)
+        if key not in flagged:
+            continue
+        for _ in range(rounds):
+            ratio = slowdown(measure(func), baseline[key], flagged[key])
+            if ratio is None:
+                break
+        else:
+            confirmed.append((key, ratio, flagged[key]))
+    return confirmed
+
+
+def _over_ratio(result, paired, limit):
+    # Median ratio to the paired case, or None when within the limit (or timer noise)
+    ratio = result["median"] / paired["median"]
+    return ratio if ratio > limit and result["median"] - limit * paired["median"] > NOISE_FLOOR else None
+
+
+def check_ratios(results, max_profiles, limits=RATIO_LIMITS, rounds=RETIME_ROUNDS):
+    """(key, ratio, limit) for cases slower than their limit times the paired case.
+
+    Cases over the limit are timed again next to their pair, and only count when they
+    stay over it in every round.
+    """
+    flagged = {}
+    for key, result in results.items():
+        if result["name"] not in limits:
+            continue
+        other, limit = limits[result["name"]]
+        paired = results.get(case_key(other, result["params"]))
+        if paired is None:
+            continue
+        print(f"{key:<70} {result['median'] / paired['median']:>9.2f}x {other}", file=sys.stderr)
+        if _over_ratio(result, paired, limit) is not None:
+            flagged[key] = (case_key(other, result["params"]), limit)
+    if not flagged:
+        return []
+
+    funcs = {case_key(name, params): func for name, params, func in cases(max_profiles)}
+    over = []
+    for key, (other, limit) in flagged.items():
+        for _ in range(rounds):
+            ratio = _over_ratio(time_case(funcs[key]), time_case(funcs[other]), limit)
+            if ratio is None:
+                break
+        else:
+            over.append((key, ratio, limit))
+    return over
+
+
+def _parse_thresholds(values):
+    default, per_case = DEFAULT_THRESHOLD, {}
+    for value in values or ():
+        if "=" in value:
+            name, limit = value.split("=", 1)
+            per_case[name] = float(limit)
+        else:
+            default = float(value)
+    return default, per_case
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the simulator benchmark suite.")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--threshold", action="append",
+                        help="allowed slowdown, e.g. 0.25 for all cases or name=0.5 for one case")
+    parser.add_argument("--max-profiles", type=int, default=max(PROFILE_COUNTS))
+    parser.add_argument("--only", action="append", help="run only these case names")
+    args = parser.parse_args(argv)
+
+    results = run(args.max_profiles, args.only)
+    over = check_ratios(results, args.max_profiles)
+    for key, ratio, limit in over:
+        print(f"OVER BUDGET {key}: {ratio:.2f}x its {RATIO_LIMITS[results[key]['name']][0]} case "
+              f"(allowed {limit:.2f}x)", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        return 1 if over else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.", file=sys.stderr)
+        return 1 if over else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    default_threshold, thresholds = _parse_thresholds(args.threshold)
+    regressions = compare(results, baseline, default_threshold, thresholds)
+    if regressions:
+        print(f"Timing {len(regressions)} flagged cases again", file=sys.stderr)
+        regressions = retime(regressions, baseline, args.max_profiles)
+    for key, ratio, threshold in regressions:
+        print(f"REGRESSION {key}: {ratio:.2f}x baseline (allowed {1 + threshold:.2f}x)", file=sys.stderr)
+    return 1 if regressions or over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
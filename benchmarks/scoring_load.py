@@ -0,0 +1,90 @@
+# Load generator for scoring_service.py
+#
+#   python scoring_service.py --port 8080 &
+#   python benchmarks/scoring_load.py --port 8080 --requests 20000 --concurrency 256
+#
+# Opens --concurrency keep-alive connections that each send randomized /score requests
+# back to back, then reports throughput, latency percentiles and status counts.
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+HEALTH_STATES = ("healthy", "chronic", "high_risk")
+INSURANCE_TYPES = ("Employer-based", "Marketplace / Self-insured", "None")
+
+
+def _profiles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(18, 80, n)
+    health = rng.integers(0, len(HEALTH_STATES), n)
+    insurance = rng.integers(0, len(INSURANCE_TYPES), n)
+    income = rng.integers(2000, 15000, n)
+    return [json.dumps({"age": int(a), "health_status": HEALTH_STATES[h], "insurance_type": INSURANCE_TYPES[i],
+                        "monthly_income": int(m)}).encode()
+            for a, h, i, m in zip(ages, health, insurance, income)]
+
+
+async def _client(host, port, bodies, deadline_ms, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            writer.write(b"POST /score HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+                         b"X-Deadline-Ms: %d\r\nContent-Length: %d\r\n\r\n%s"
+                         % (host.encode(), deadline_ms, len(body), body))
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, n_requests, concurrency, deadline_ms):
+    bodies = _profiles(n_requests)
+    latencies, statuses = [], Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, bodies[c::concurrency], deadline_ms, latencies, statuses)
+                           for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1e3
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "statuses": dict(statuses)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive load against the scoring service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--deadline-ms", type=int, default=2000)
+    args = parser.parse_args(argv)
+    stats = asyncio.run(run_load(args.host, args.port, args.requests, args.concurrency, args.deadline_ms))
+    json.dump(stats, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Capital allocation frontier search for Step 4
+#
+# Candidate strategies are (short/mid/long split, monthly contribution, % of savings
+# moved into the fund). Candidates that break the Step 4 free-cash check are dropped
+# before simulation. The rest run through the bucket engine in blocks of funding levels,
+# cheapest first, and a candidate whose shortfall bound is already beaten by a cheaper
+# level is never simulated. Only the Pareto frontier of lifetime shortfall vs.
+# contribution burden is returned.
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from simulator_core import BUCKET_RETURNS, CAPITAL_BUCKETS, simulate_capital_buckets
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ALLOCATION_STEP = 0.1
+CONTRIBUTION_LEVELS = 21
+SAVINGS_PCT_LEVELS = np.arange(0, 101, 10)
+# Funding levels simulated per bucket-engine call
+LEVEL_BLOCK = 16
+
+
+def free_monthly_cash(net_income_annual, monthly_expenses, debt_monthly_payment, cost_df):
+    # Same check as Step 4: net income less expenses, debt and first-year OOP
+    return net_income_annual / 12 - monthly_expenses - debt_monthly_payment - cost_df["OOP Cost"].iloc[0] / 12
+
+
+def allocation_grid(step=ALLOCATION_STEP):
+    # Every short/mid/long split on a `step` grid that sums to 1
+    n = int(round(1 / step))
+    splits = [(s, m, n - s - m) for s in range(n + 1) for m in range(n + 1 - s)]
+    return np.array(splits, dtype=np.float64) / n
+
+
+def pareto_frontier(burden, shortfall):
+    # Indices of non-dominated points (lower is better on both), ordered by burden
+    order = np.lexsort((shortfall, burden))
+    best_so_far = np.minimum.accumulate(shortfall[order])
+    improves = np.empty(len(order), dtype=bool)
+    improves[:1] = True
+    improves[1:] = shortfall[order][1:] < best_so_far[:-1]
+    return order[improves]
+
+
+def shortfall_bound(costs, allocations, contribution, savings, bucket_returns=None):
+    """Lower bound on lifetime shortfall for each funding level (rows) and allocation.
+
+    No bucket can pay out more than its money grown at its own return, or kept whole if
+    that return is negative, so the bound is the total cost less all the money grown at
+    the best return among the buckets an allocation uses, with no lock-up.
+    """
+    bucket_returns = {**BUCKET_RETURNS, **(bucket_returns or {})}
+    costs = np.nan_to_num(np.asarray(costs, dtype=np.float64))
+    years = costs.shape[-1]
+    growth = 1 + np.array([bucket_returns[b] for b in CAPITAL_BUCKETS])
+    best = np.where(allocations > 0, np.maximum(growth, 1), 1).max(axis=-1)
+    powers = best[:, None] ** np.arange(1, years + 1)
+    funded = np.outer(savings, powers[:, -1]) + np.outer(contribution, powers.sum(axis=-1))
+    return np.maximum(costs.sum() - funded, 0)
+
+
+def capital_frontier(cost_df: pd.DataFrame, savings_start, free_cash, allocations=None,
+                     contributions=None, savings_pcts=SAVINGS_PCT_LEVELS, bucket_returns=None,
+                     lock_years=None) -> pd.DataFrame:
+    """Pareto frontier of lifetime capital shortfall vs. contribution burden.
+
+    Burden is the total committed to the fund: monthly contribution over the horizon
+    plus the share of current savings moved in. Funding levels are simulated in order
+    of burden, and a (level, allocation) pair is skipped when its shortfall_bound is no
+    better than the best shortfall of a strictly cheaper level, since it could not be
+    on the frontier. Of the rest, each level keeps its best allocation and the Pareto
+    frontier of those is returned.
+    """
+    import pandas as pd
+
+    years = len(cost_df)
+    costs = cost_df["Healthcare Cost"].to_numpy()
+    allocations = allocation_grid() if allocations is None else np.asarray(allocations, dtype=np.float64)
+    cap = max(free_cash, 0)
+    if contributions is None:
+        contributions = np.linspace(0, cap, CONTRIBUTION_LEVELS)
+    # With no free cash the grid collapses to one zero level
+    contributions = np.unique(np.clip(np.asarray(contributions, dtype=np.float64), 0, None))
+    contributions = contributions[contributions <= cap]
+    savings_pcts = np.unique(np.asarray(savings_pcts, dtype=np.float64))
+
+    monthly, pct = (grid.ravel() for grid in np.meshgrid(contributions, savings_pcts, indexing="ij"))
+    burden = monthly * 12 * years + savings_start * pct / 100
+    bound = shortfall_bound(costs, allocations, monthly * 12, savings_start * pct / 100, bucket_returns)
+
+    # Equal burden: keep each funding level's best allocation. Levels go cheapest first;
+    # a level with no pair left to simulate is dominated and keeps an infinite shortfall.
+    shortfall = np.full(bound.shape, np.inf)
+    order = np.argsort(burden, kind="stable")
+    for first in range(0, len(order), LEVEL_BLOCK):
+        levels = order[first:first + LEVEL_BLOCK]
+        done = order[:first]
+        cheaper = burden[done][None, :] < burden[levels][:, None]
+        beaten = np.where(cheaper, shortfall[done].min(axis=1)[None, :], np.inf).min(axis=1, initial=np.inf)
+        level, allocation = np.nonzero(bound[levels] < beaten[:, None])
+        if not len(level):
+            continue
+        level = levels[level]
+        run = simulate_capital_buckets(costs, allocations[allocation], (monthly[level] * 12)[:, None],
+                                       savings_start * pct[level] / 100, bucket_returns, lock_years)
+        shortfall[level, allocation] = run["shortfall"].sum(axis=-1)
+
+    best = shortfall.argmin(axis=1)
+    level_shortfall = shortfall[np.arange(len(monthly)), best]
+    frontier = pareto_frontier(burden, level_shortfall)
+    frontier = frontier[np.isfinite(level_shortfall[frontier])]
+
+    chosen = allocations[best[frontier]]
+    return pd.DataFrame({
+        **{bucket: chosen[:, b] for b, bucket in enumerate(CAPITAL_BUCKETS)},
+        "monthly_contribution": monthly[frontier],
+        "savings_pct": pct[frontier],
+        "burden": burden[frontier],
+        "lifetime_shortfall": level_shortfall[frontier]
+    })
+
+
+def suggest_allocation(frontier: pd.DataFrame, max_shortfall=0.0):
+    # Cheapest frontier strategy within `max_shortfall`, else the lowest-shortfall one
+    within = frontier[frontier["lifetime_shortfall"] <= max_shortfall]
+    if len(within):
+        return within.iloc[0]
+    return frontier.iloc[frontier["lifetime_shortfall"].to_numpy().argmin()]
@@ -0,0 +1,131 @@
+# Headless core API on plain arrays
+#
+#   from core_api import project_profiles
+#   result = project_profiles({"age": [45, 62], "health_status": ["chronic", "healthy"]})
+#   result["lifetime_healthcare_cost"], result["recommendation_ids"]
+#
+# Steps 1-4 for a dict of equal-length arrays (or lists, or a list of profile dicts)
+# with batch_runner's column names; missing columns and values take PROFILE_DEFAULTS.
+# Importing it loads NumPy and the engines only, not pandas, pyarrow, matplotlib or
+# Streamlit, so pool workers, serverless handlers and CLIs start quickly.
+# batch_runner and the scoring service wrap these results in Parquet and JSON.
+# Rows failing simulator_core.profile_errors (the scoring service's input rules) are
+# refused, so callers skip and report them instead of projecting garbage.
+
+import numpy as np
+
+from monthly_cashflow import MONTHS, monthly_summary
+from recommendation_engine import recommendation_ids
+from simulator_core import (expense_comparison, generate_costs_batch, horizon_years, insurance_costs,
+                            profile_errors, project_finances, simulate_capital_buckets, with_profile_defaults)
+
+# Per-profile results, in batch_runner's output column order
+SUMMARY_FIELDS = ("age", "lifetime_healthcare_cost", "max_healthcare_cost", "min_surplus", "total_shortfall",
+                  "first_deficit_age", "capital_shortfall", "capital_coverage_ratio", "recommendation_ids")
+MONTHLY_FIELDS = ("deficit_months", "first_deficit_month")
+# (profiles x years) series; entries past a profile's horizon are NaN (surplus) or 0
+SERIES_FIELDS = ("healthcare_cost", "surplus", "savings_proj", "proj_401k")
+
+
+def project_profiles(profiles, monthly=False):
+    """Run Steps 1-4 for every profile; returns {field: array} with one entry per profile.
+
+    Keys are SUMMARY_FIELDS, SERIES_FIELDS, `years` (horizon length) and `has_deficit`;
+    `first_deficit_age` is only meaningful where `has_deficit`. With `monthly`, Steps 2-3
+    are also evaluated month by month and MONTHLY_FIELDS are added: the number of deficit
+    months and the month (counted from the start age) of the first, meaningful where
+    `deficit_months` > 0. Raises ValueError when any row fails profile_errors.
+    """
+    errors = profile_errors(profiles)
+    bad = np.flatnonzero(errors != "")
+    if len(bad):
+        details = "; ".join(f"row {i}: {errors[i]}" for i in bad[:5])
+        raise ValueError(f"{len(bad)} invalid profiles ({details}{'; ...' if len(bad) > 5 else ''})")
+    columns = with_profile_defaults(profiles)
+    age = np.asarray(columns["age"]).astype(np.int64)
+    n = len(age)
+    if not n:
+        return _empty_result(monthly)
+
+    def col(name):
+        return np.asarray(columns[name], dtype=np.float64)
+
+    # Step 1: medical cost, premiums and OOP
+    costs = generate_costs_batch(columns, columns)
+    step1 = insurance_costs(costs, col("employee_premium") + col("employer_premium"), col("oop_pct"),
+                            col("premium_inflation"))
+    years = horizon_years(age)
+    max_years = costs.shape[1]
+    in_horizon = np.arange(max_years)[None, :] < years[:, None]
+
+    # Step 2: income, savings and 401(k)
+    net_income_annual = col("monthly_income") * (1 - col("est_tax_rate")) * 12
+    finances = project_finances(net_income_annual, col("income_growth"), col("savings_start"),
+                                col("savings_growth"), col("annual_contrib"),
+                                col("contrib_401k_employee") + col("contrib_401k_employer"),
+                                col("growth_401k"), max_years)
+
+    # Step 3: surplus / deficit
+    comparison = expense_comparison(step1["Premiums"], step1["OOP Cost"], finances["income_proj"],
+                                    finances["savings_proj"], col("monthly_expenses"),
+                                    col("debt_monthly_payment"), col("income_growth"))
+    surplus = np.where(in_horizon, comparison["Surplus/Deficit"], np.nan)
+
+    # Step 4: capital buckets and recommendations
+    healthcare = np.where(in_horizon, step1["Healthcare Cost"], 0.0)
+    shares = np.stack([col("cap_short"), col("cap_mid"), col("cap_long")], axis=1)
+    capital = simulate_capital_buckets(healthcare, shares, (col("capital_monthly_contrib") * 12)[:, None],
+                                       col("savings_start") * col("capital_from_savings_pct") / 100)
+
+    deficit = np.where(in_horizon, surplus < 0, False)
+    lifetime_cost = healthcare.sum(axis=1)
+    max_cost = np.where(in_horizon, healthcare, -np.inf).max(axis=1)
+    total_shortfall = np.where(deficit, surplus, 0.0).sum(axis=1)
+    last_year = (np.arange(n), years - 1)
+    capital_funded = capital["balances"].sum(axis=1)[last_year] + capital["drawdown"].sum(axis=(1, 2))
+    coverage_ratio = capital_funded / lifetime_cost
+
+    metrics = {name: columns[name] for name in ("age", "health_status", "partner_health_status", "family_status",
+                                                 "insurance_type", "include_surgical")}
+    metrics.update(coverage_ratio=coverage_ratio, max_cost=max_cost, shortfall=total_shortfall)
+
+    result = {
+        "age": age,
+        "lifetime_healthcare_cost": lifetime_cost,
+        "max_healthcare_cost": max_cost,
+        "min_surplus": np.nanmin(surplus, axis=1),
+        "total_shortfall": total_shortfall,
+        "first_deficit_age": age + deficit.argmax(axis=1),
+        "capital_shortfall": capital["shortfall"].sum(axis=1),
+        "capital_coverage_ratio": coverage_ratio,
+        "recommendation_ids": recommendation_ids(metrics),
+        "healthcare_cost": healthcare,
+        "surplus": surplus,
+        "savings_proj": finances["savings_proj"],
+        "proj_401k": finances["proj_401k"],
+        "years": years,
+        "has_deficit": deficit.any(axis=1)
+    }
+    if monthly:
+        months = monthly_summary(step1["Premiums"], step1["OOP Cost"], finances["income_proj"],
+                                 col("monthly_expenses"), col("debt_monthly_payment"), col("income_growth"),
+                                 col("savings_start"), col("savings_growth"), col("annual_contrib"),
+                                 col("contrib_401k_employee") + col("contrib_401k_employer"), col("growth_401k"))
+        deficit_months = np.where(in_horizon, months["Deficit Months"], 0)
+        deficit_year = (deficit_months > 0).argmax(axis=1)
+        result["deficit_months"] = deficit_months.sum(axis=1)
+        result["first_deficit_month"] = (deficit_year * MONTHS
+                                         + months["First Deficit Month"][np.arange(n), deficit_year] - 1)
+    return result
+
+
+def _empty_result(monthly):
+    # project_profiles of zero profiles, e.g. a chunk whose rows were all rejected
+    result = {name: np.zeros(0) for name in SUMMARY_FIELDS}
+    result.update({name: np.zeros((0, 0)) for name in SERIES_FIELDS})
+    result.update(age=np.zeros(0, dtype=np.int64), first_deficit_age=np.zeros(0, dtype=np.int64),
+                  recommendation_ids=np.empty(0, dtype=object), years=np.zeros(0, dtype=np.int64),
+                  has_deficit=np.zeros(0, dtype=bool))
+    if monthly:
+        result.update({name: np.zeros(0, dtype=np.int64) for name in MONTHLY_FIELDS})
+    return result
@@ -3,10 +3,46 @@
 import streamlit as st
 st.set_page_config(page_title="Health Strategy Simulator", layout="wide")
 
+from contextlib import contextmanager
+
+import numpy as np
 import pandas as pd
-from simulator_core import generate_costs, simulate_investment_strategy
-from recommendation_engine import generate_recommendation
-from projected_health_risk import get_risk_insight
+from assumptions import current_assumptions
+from simulator_core import apply_capital_buckets, project_finances, expense_comparison, CAPITAL_COLUMNS
+from step_graph import StepGraph, COST_COLUMNS, COMPARE_COLUMNS
+from session_store import SessionStore, session_bytes
+from risk_chart import RISK_CHART_SERVICE
+from plan_io import PLAN_INPUTS, PLAN_SUFFIX, load_plan, plan_bytes, plan_mismatch
+from monthly_cashflow import MONTHS, monthly_cashflow
+from capital_optimizer import capital_frontier, free_monthly_cash, suggest_allocation
+from sim_cache import SIMULATION_CACHE, cache_key
+import instrumentation
+from instrumentation import span
+
+# Load matplotlib on the chart thread while the first page renders
+RISK_CHART_SERVICE.warm()
+
+# Simulation state dropped by "Reset simulation"; the steps' inputs are kept
+SIMULATION_KEYS = ("store", "step_graph", "loaded_upload", "step1_submitted", "step2_submitted", "step3_submitted",
+                   "step4_submitted")
+
+
+def reset_simulation():
+    for key in SIMULATION_KEYS:
+        st.session_state.pop(key, None)
+
+
+@contextmanager
+def store_ceiling():
+    # SessionStore refuses columns past its byte ceiling; explain, offer a fresh start and end the run
+    try:
+        yield
+    except MemoryError as e:
+        st.error(f"This simulation is too large for one session: {e}. Reset the simulation and try a "
+                 f"shorter horizon or fewer dependents.")
+        st.button("🔄 Reset simulation", on_click=reset_simulation)
+        st.stop()
+
 
 st.title("🗭 Health Strategy Simulator")
 
@@ -16,15 +52,48 @@ with st.sidebar:
     code = st.text_input("Enter beta access code:", type="password")
     if code != "HSS_Beta_2025v1!":
         st.stop()
+    # Per-step latency panel, rendered at the end of the run; the checkbox lives in this
+    # session's state and only traces this session's runs
+    show_timings = st.checkbox("🛠 Show step timings", value=instrumentation.enabled(), key="show_timings")
+    instrumentation.enable_local(show_timings)
 
 # --- Upload Previous Simulation ---
 with st.expander("⬆️ Upload Previous Simulation", expanded=False):
-    uploaded_file = st.file_uploader("Choose a file to upload", type="json")
-    if uploaded_file is not None:
-        import json
-        session_data = json.load(uploaded_file)
-        st.session_state.update(session_data)
-        st.success("Previous simulation loaded successfully!")
+    uploaded_file = st.file_uploader("Choose a file to upload", type=["arrow", "json"])
+    # The uploader keeps its file across reruns; load each upload once
+    if uploaded_file is not None and st.session_state.get("loaded_upload") != (uploaded_file.name, uploaded_file.size):
+        try:
+            if uploaded_file.name.endswith(".json"):
+                import json
+                session_data, columns = json.load(uploaded_file), {}
+            else:
+                session_data, columns, engine_version, assumptions = load_plan(uploaded_file.getvalue())
+                mismatch = plan_mismatch(engine_version, assumptions)
+                if mismatch:
+                    # Saved series from another engine or other tables would not match what
+                    # the steps compute now
+                    st.warning(f"This plan was saved with {mismatch}. Its inputs were restored; submit "
+                               f"Steps 1-3 again to recompute the results.")
+                    columns = {}
+            # Filled before the session is touched, so a plan over the ceiling leaves it as it was
+            store = SessionStore()
+            store.put(**columns)
+        except (ValueError, MemoryError) as e:
+            st.error(f"Could not load simulation: {e}")
+        else:
+            st.session_state.update({key: session_data[key] for key in PLAN_INPUTS if key in session_data})
+            st.session_state.step4_submitted = False
+            # A restored plan has no graph; Steps 2-4 read the saved series
+            st.session_state.pop("step_graph", None)
+            if columns:
+                st.session_state.store = store
+            else:
+                # Legacy JSON uploads and plans from another engine version or other
+                # assumption tables restore inputs only, so the steps rerun from Step 1
+                st.session_state.step1_submitted = st.session_state.step2_submitted = False
+                st.session_state.step3_submitted = False
+            st.session_state.loaded_upload = (uploaded_file.name, uploaded_file.size)
+            st.success("Previous simulation loaded successfully!")
 
 # Step 1 – Insurance and Profile
 st.header("Step 1: Profile & Insurance")
@@ -43,22 +112,14 @@ if family_status == "family":
     partner_age = st.number_input("Partner Age", 18, 85, 30)
     partner_health_status = st.selectbox("Partner Health Status", ["healthy", "chronic", "high_risk"])
 
-insurance_type = st.radio("Insurance Type", ["Employer-based", "Marketplace / Self-insured", "None"])
+insurance_type = st.radio("Insurance Type", list(current_assumptions().insurance_types))
 
 # Allow user to input or use national average premiums
 st.subheader("📄 Insurance Premium Setup")
 use_avg_premium = st.radio("Do you want to use national average premiums?", ["Yes", "No"], index=0)
 
 if use_avg_premium == "Yes":
-    if insurance_type == "Employer-based":
-        employee_premium = 2000
-        employer_premium = 6000
-    elif insurance_type == "Marketplace / Self-insured":
-        employee_premium = 6550
-        employer_premium = 0
-    else:
-        employee_premium = 0
-        employer_premium = 0
+    employee_premium, employer_premium = current_assumptions().average_premiums[insurance_type]
 else:
     employee_premium = st.number_input("Employee Contribution ($/yr)", min_value=0, value=2000)
     employer_premium = st.number_input("Employer Contribution ($/yr)", min_value=0, value=6000 if insurance_type == "Employer-based" else 0)
@@ -68,12 +129,7 @@ st.subheader("💸 Out-of-Pocket Cost Setup")
 use_avg_oop = st.radio("Do you want to use national average out-of-pocket (OOP) costs?", ["Yes", "No"], index=0)
 
 if use_avg_oop == "Yes":
-    if insurance_type == "Employer-based":
-        oop_pct = 0.15
-    elif insurance_type == "Marketplace / Self-insured":
-        oop_pct = 0.25
-    else:
-        oop_pct = 1.0
+    oop_pct = current_assumptions().average_oop_pct[insurance_type]
 else:
     oop_pct = st.slider("Custom OOP % of Healthcare Cost", 0, 100, 25) / 100
 
@@ -129,14 +185,23 @@ if st.button("Run Step 1"):
 
     care_prefs = st.session_state.get("care_prefs", {})
 
-    cost_df = generate_costs(profile, care_prefs)
     total_premium = employee_premium + employer_premium
-    premiums = [total_premium * ((1 + premium_inflation) ** i) for i in range(len(cost_df))]
-    cost_df["Premiums"] = premiums
-    cost_df["OOP Cost"] = cost_df["Healthcare Cost"] * oop_pct
-    cost_df["Healthcare Cost"] = cost_df["OOP Cost"] + cost_df["Premiums"]
+    # Only the columns downstream of the edited inputs are recomputed
+    if "step_graph" not in st.session_state:
+        st.session_state.step_graph = StepGraph()
+    graph = st.session_state.step_graph
+    with span("step1"):
+        graph.update(profile=profile, care_prefs=care_prefs, total_premium=total_premium, oop_pct=oop_pct,
+                     premium_inflation=premium_inflation)
+        # One compact store per session; columns shared with the graph are not copied
+        store = st.session_state.store = SessionStore()
+        with store_ceiling():
+            store.put(**{name: graph.get(name) for name in COST_COLUMNS},
+                      risk_trajectory=graph.get("risk_trajectory"))
+        cost_df = store.frame(COST_COLUMNS)
+        # Start the Step 4 risk chart now, off the request path
+        RISK_CHART_SERVICE.submit(store["Age"], store["risk_trajectory"])
 
-    st.session_state.cost_df = cost_df
     st.session_state.profile = profile
     st.session_state.insurance_type = insurance_type
     st.session_state.employee_premium = employee_premium
@@ -156,17 +221,14 @@ if st.button("Run Step 1"):
     st.line_chart(cost_df.set_index("Age")["Healthcare Cost"])
     st.success("Step 1 complete.")
 
-    # Projected health risk
-    from projected_health_risk import get_risk_trajectory
-    st.session_state["risk_trajectory"] = get_risk_trajectory(age, health_status)
-
 
 # --- Step 2: Financial Capacity ---
-if "cost_df" in st.session_state and not st.session_state.get("step2_submitted"):
+if "store" in st.session_state and not st.session_state.get("step2_submitted"):
 
     st.header("Step 2: Financial Capacity")
 
-    cost_df = st.session_state.cost_df
+    store = st.session_state.store
+    cost_df = store.frame(COST_COLUMNS)
     insurance_type = st.session_state.insurance_type
     profile = st.session_state.profile
     oop_first_year = round(cost_df["OOP Cost"].iloc[0], 2)
@@ -213,23 +275,21 @@ if "cost_df" in st.session_state and not st.session_state.get("step2_submitted")
         submit2 = st.form_submit_button("Run Step 2")
 
     if submit2:
-        years = len(cost_df)
-        income_proj = [net_income_annual * ((1 + income_growth) ** i) for i in range(years)]
-
-        savings_proj = []
-        current = savings_start
-        for i in range(years):
-            current *= (1 + savings_growth)
-            current += annual_contrib
-            savings_proj.append(current)
-
-        # 401(k) simulation
-        proj_401k = []
-        value_401k = 0
-        for i in range(years):
-            value_401k *= (1 + growth_401k)
-            value_401k += contrib_401k_employee + contrib_401k_employer
-            proj_401k.append(value_401k)
+        graph = st.session_state.get("step_graph")
+        with span("step2"):
+            if graph is not None:
+                graph.update(monthly_income=monthly_income, est_tax_rate=est_tax_rate, income_growth=income_growth,
+                             monthly_expenses=monthly_expenses, debt_monthly_payment=debt_monthly_payment,
+                             savings_start=savings_start, savings_growth=savings_growth,
+                             annual_contrib=annual_contrib, contrib_401k_employee=contrib_401k_employee,
+                             contrib_401k_employer=contrib_401k_employer, growth_401k=growth_401k)
+                projections = {name: graph.get(name) for name in ("income_proj", "savings_proj", "proj_401k")}
+            else:
+                projections = project_finances(net_income_annual, income_growth, savings_start, savings_growth,
+                                               annual_contrib, contrib_401k_employee + contrib_401k_employer,
+                                               growth_401k, len(cost_df))
+        with store_ceiling():
+            store.put(**projections)
 
         st.session_state.monthly_income = monthly_income
         st.session_state.net_income_annual = net_income_annual
@@ -243,9 +303,6 @@ if "cost_df" in st.session_state and not st.session_state.get("step2_submitted")
         st.session_state.contrib_401k_employee = contrib_401k_employee
         st.session_state.contrib_401k_employer = contrib_401k_employer
         st.session_state.growth_401k = growth_401k
-        st.session_state.income_proj = income_proj
-        st.session_state.savings_proj = savings_proj
-        st.session_state.proj_401k = proj_401k
         st.session_state.step2_submitted = True
 
 
@@ -253,45 +310,27 @@ if "cost_df" in st.session_state and not st.session_state.get("step2_submitted")
 if st.session_state.get("step2_submitted") and not st.session_state.get("step3_submitted"):
     st.header("Step 3: Expense vs. Income Overview")
 
-    cost_df = st.session_state.cost_df
-    income_proj = st.session_state.income_proj
-    savings_proj = st.session_state.savings_proj
-    proj_401k = st.session_state.proj_401k
+    store = st.session_state.store
     monthly_expenses = st.session_state.monthly_expenses
     debt_monthly_payment = st.session_state.debt_monthly_payment
     income_growth = st.session_state.income_growth
 
-    years = len(cost_df)
-
     # Inflation-adjusted expenses
-    household = [monthly_expenses * 12 * ((1 + income_growth) ** i) for i in range(years)]
-    debt = [debt_monthly_payment * 12 * ((1 + income_growth) ** i) for i in range(years)]
-    premiums = cost_df["Premiums"].tolist()
-    oop = cost_df["OOP Cost"].tolist()
-    healthcare = [premiums[i] + oop[i] for i in range(years)]
-
-    total_exp = [household[i] + debt[i] + healthcare[i] for i in range(years)]
-    total_income = [income_proj[i] + savings_proj[i] for i in range(years)]
-
-    surplus = [total_income[i] - total_exp[i] for i in range(years)]
-
-    # Save to session
-    st.session_state.surplus = surplus
-
-    df_compare = pd.DataFrame({
-        "Age": cost_df["Age"],
-        "Household Expenses": household,
-        "Debt Payments": debt,
-        "Premiums": premiums,
-        "OOP": oop,
-        "Total Healthcare": healthcare,
-        "Total Expenses": total_exp,
-        "Income + Savings": total_income,
-        "Surplus/Deficit": surplus
-    })
+    graph = st.session_state.get("step_graph")
+    with span("step3"):
+        if graph is not None:
+            comparison = {name: graph.get(name) for name in COMPARE_COLUMNS}
+        else:
+            # Restored simulations carry the stored series but no graph
+            comparison = expense_comparison(store["Premiums"], store["OOP Cost"], store["income_proj"],
+                                            store["savings_proj"], monthly_expenses, debt_monthly_payment,
+                                            income_growth)
+            comparison = {name: values for name, values in comparison.items() if name not in ("Premiums", "OOP")}
+        with store_ceiling():
+            store.put(**comparison)
+        df_compare = store.frame(COMPARE_COLUMNS, rename={"OOP Cost": "OOP"})
 
     st.session_state.step3_submitted = True
-    st.session_state.expense_df = df_compare
 
     st.write("### 📊 Financial Overview by Age")
     st.dataframe(df_compare.set_index("Age"))
@@ -308,12 +347,34 @@ if st.session_state.get("step2_submitted") and not st.session_state.get("step3_s
     chart_health = df_compare.set_index("Age")[["Total Healthcare", "Total Expenses"]]
     st.line_chart(chart_health)
 
+    # Monthly view: when in the year a tight budget first runs short
+    with st.expander("📅 Monthly Cash Flow"):
+        with span("step3.monthly"):
+            months = monthly_cashflow(
+                store["Premiums"], store["OOP Cost"], store["income_proj"], monthly_expenses, debt_monthly_payment,
+                income_growth, st.session_state.savings_start, st.session_state.savings_growth,
+                st.session_state.annual_contrib,
+                st.session_state.contrib_401k_employee + st.session_state.contrib_401k_employer,
+                st.session_state.growth_401k)
+        month_ages = np.repeat(store["Age"], MONTHS) + np.tile(np.arange(MONTHS), len(store["Age"])) / MONTHS
+        df_monthly = pd.DataFrame({name: months[name] for name in ("Net Cash Flow", "Surplus/Deficit", "Savings")},
+                                  index=pd.Index(month_ages, name="Age"))
+        deficit = np.flatnonzero(months["Surplus/Deficit"] < 0)
+        if len(deficit):
+            first = deficit[0]
+            st.warning(f"⚠️ Monthly budget first runs short at age {store['Age'][first // MONTHS]}, "
+                       f"month {first % MONTHS + 1} ({len(deficit):,} deficit months in total).")
+        else:
+            st.success("✅ No month runs a deficit.")
+        st.line_chart(df_monthly)
+
 # Step 4 – Capital Care Investment & Recommendations
 if st.session_state.get("step3_submitted") and not st.session_state.get("step4_submitted"):
     st.header("Step 4: Capital Health Investment & Strategy")
 
-    surplus = st.session_state.surplus
-    cost_df = st.session_state.cost_df
+    store = st.session_state.store
+    surplus = store["Surplus/Deficit"]
+    cost_df = store.frame(COST_COLUMNS)
     profile = st.session_state.profile
 
     st.markdown("### 📊 Surplus vs. Cost Analysis")
@@ -350,12 +411,8 @@ if st.session_state.get("step3_submitted") and not st.session_state.get("step4_s
                                                     value=200)
 
             # Free cash check
-            net_income_monthly = st.session_state.net_income_annual / 12
-            monthly_expenses = st.session_state.monthly_expenses
-            debt_payment = st.session_state.debt_monthly_payment
-            monthly_oop = cost_df["OOP Cost"].iloc[0] / 12
-
-            free_cash = net_income_monthly - monthly_expenses - debt_payment - monthly_oop
+            free_cash = free_monthly_cash(st.session_state.net_income_annual, st.session_state.monthly_expenses,
+                                          st.session_state.debt_monthly_payment, cost_df)
             st.markdown(f"💡 Estimated Free Cash: **${free_cash:,.0f}/month**")
             if new_fund_contribution > free_cash:
                 st.warning(
@@ -378,79 +435,80 @@ if st.session_state.get("step3_submitted") and not st.session_state.get("step4_s
         }
         st.session_state.cap_alloc = cap_alloc
 
+        # Bucket drawdown preview, rerun on every slider change
+        capital_start = st.session_state.savings_start * allocate_from_savings / 100
+        with span("step4.capital_buckets"):
+            capital_df = apply_capital_buckets(cost_df, cap_alloc,
+                                               contribution=new_fund_contribution * 12,
+                                               savings_start=capital_start)
+        with store_ceiling():
+            store.put_frame(capital_df, CAPITAL_COLUMNS)
+
+        shortfall_ages = capital_df.loc[capital_df["Capital Shortfall"] > 0, "Age"]
+        if len(shortfall_ages):
+            st.markdown(f"⚠️ Capital falls short of healthcare costs in **{len(shortfall_ages)} years** "
+                        f"(first at age {shortfall_ages.iloc[0]}), "
+                        f"total shortfall ${capital_df['Capital Shortfall'].sum():,.0f}")
+        else:
+            st.markdown("✅ Capital buckets cover projected healthcare costs in every year.")
+        st.line_chart(capital_df.set_index("Age")[["Capital - Short", "Capital - Mid", "Capital - Long"]])
+
+        # Suggested strategy from the shortfall vs. contribution frontier
+        with st.expander("💡 Suggested Capital Strategy", expanded=False):
+            # Only depends on the cost curve, savings and free cash, not on the sliders,
+            # so reruns from slider changes reuse it
+            free_cash = free_monthly_cash(st.session_state.net_income_annual, st.session_state.monthly_expenses,
+                                          st.session_state.debt_monthly_payment, cost_df)
+            frontier_key = cache_key("capital_frontier", cost_df["Healthcare Cost"].to_numpy(),
+                                     st.session_state.savings_start, free_cash)
+            with span("step4.capital_frontier"):
+                frontier = SIMULATION_CACHE.get_or_compute(
+                    frontier_key, lambda: capital_frontier(cost_df, st.session_state.savings_start, free_cash))
+            suggestion = suggest_allocation(frontier)
+            st.markdown(f"Lowest-burden strategy with the smallest shortfall: "
+                        f"**{suggestion['short']:.0%} short / {suggestion['mid']:.0%} mid / "
+                        f"{suggestion['long']:.0%} long**, ${suggestion['monthly_contribution']:,.0f}/month "
+                        f"plus {suggestion['savings_pct']:.0f}% of current savings "
+                        f"(lifetime shortfall ${suggestion['lifetime_shortfall']:,.0f}).")
+            st.line_chart(frontier.set_index("burden")["lifetime_shortfall"])
+
     submit4 = st.button("Generate AI Recommendations")
     if submit4:
         from recommendation_engine import generate_recommendation
-        from projected_health_risk import get_risk_insight
 
         st.session_state.step4_submitted = True
 
-        surplus = st.session_state.surplus
-        final_df = st.session_state.cost_df
-        recs = generate_recommendation(
-            profile=profile,
-            cost_df=final_df,
-            surplus=surplus,
-            insurance_type=st.session_state.insurance_type,
-            capital_strategy=st.session_state.cap_alloc if capital_invest_toggle == "Yes" else {}
-        )
-
-        # Append risk-based insight
-        risk_insight = get_risk_insight(profile["age"], profile["health_status"])
-        if risk_insight:
-            recs.append("🧠 " + risk_insight)
+        final_df = store.frame(COST_COLUMNS + CAPITAL_COLUMNS) if capital_invest_toggle == "Yes" else cost_df
+        with span("step4.recommendations"):
+            recs = generate_recommendation(
+                profile=profile,
+                cost_df=final_df,
+                surplus=surplus,
+                insurance_type=st.session_state.insurance_type,
+                capital_strategy=st.session_state.cap_alloc if capital_invest_toggle == "Yes" else {}
+            )
 
         st.subheader("🧭 Personalized Recommendations")
         for rec in recs:
             st.markdown(f"- {rec}")
 
-        trajectory = st.session_state["risk_trajectory"]
-
         # ✅ Show Risk Chart here
-        import matplotlib.pyplot as plt
-
-        if "risk_trajectory" in st.session_state:
+        if "risk_trajectory" in store:
             st.markdown("### 📉 Projected Health Risk Over Time")
 
-            trajectory = st.session_state["risk_trajectory"]
+            trajectory = store["risk_trajectory"]
             num_years = len(trajectory)
+            age_values = store["Age"][:num_years]
 
-            age_values = cost_df["Age"].iloc[:num_years].astype(int).tolist()
-            risk_values = pd.Series(trajectory).astype(float).tolist()
-
-            # Identify the critical age where risk hits or exceeds 0.9
-            try:
-                critical_index = next(i for i, val in enumerate(risk_values) if val >= 0.9)
-                critical_age = age_values[critical_index]
-            except StopIteration:
-                critical_index = None
-                critical_age = None
-
-            # Plotting
-            fig, ax = plt.subplots(figsize=(10, 4))
-
-            ax.plot(age_values, risk_values, color='black', linewidth=2, label="Risk Score")
-
-            # Color fill for risk zones
-            ax.fill_between(age_values, risk_values, 0, where=[r < 0.5 for r in risk_values], color='green', alpha=0.2,
-                            label="Low Risk")
-            ax.fill_between(age_values, risk_values, 0, where=[0.5 <= r < 0.9 for r in risk_values], color='orange',
-                            alpha=0.2, label="Moderate Risk")
-            ax.fill_between(age_values, risk_values, 0, where=[r >= 0.9 for r in risk_values], color='red', alpha=0.2,
-                            label="High Risk")
-
-            if critical_age is not None:
-                ax.axvline(x=critical_age, color='red', linestyle='--', linewidth=2,
-                           label=f"Critical Age: {critical_age}")
-                ax.text(critical_age + 0.5, 0.92, f"⚠️ Age {critical_age}", color='red', fontsize=10)
-
-            ax.set_xlabel("Age")
-            ax.set_ylabel("Risk Level")
-            ax.set_ylim([0, 1.05])
-            ax.set_title("Projected Health Risk Trajectory")
-            ax.legend(loc="upper left")
+            # Usually already rendered in the background since Step 1
+            with span("step4.risk_chart"):
+                st.image(RISK_CHART_SERVICE.chart(age_values, trajectory))
 
-            st.pyplot(fig)
+            # Markov state mix behind the risk score
+            from projected_health_risk import state_distributions, HEALTH_STATES
+            st.markdown("#### Projected Health State Mix")
+            state_mix = state_distributions([profile["age"]], [profile["health_status"]])[0, :num_years]
+            st.area_chart(pd.DataFrame(state_mix, index=pd.Index(age_values, name="Age"), columns=HEALTH_STATES))
 
 # Reset logic if Step 1 changes
 if st.session_state.get("step1_changed"):
@@ -458,3 +516,26 @@ if st.session_state.get("step1_changed"):
     st.session_state.step3_submitted = False
     st.session_state.step4_submitted = False
 
+# --- Save Simulation ---
+if "store" in st.session_state:
+    st.download_button("💾 Save Simulation",
+                       plan_bytes(st.session_state, st.session_state.store.columns),
+                       file_name="health_simulation" + PLAN_SUFFIX)
+
+# Step timings collected during this run, with the memory held by live sessions
+if instrumentation.enabled():
+    sizes = session_bytes()
+    instrumentation.set_gauge("hss_session_stores", len(sizes), "Live session stores.")
+    instrumentation.set_gauge("hss_session_store_bytes", sizes.sum(), "Bytes held by all live session stores.")
+    instrumentation.set_gauge("hss_session_store_max_bytes", sizes.max() if len(sizes) else 0,
+                              "Bytes held by the largest live session store.")
+    instrumentation.flush()
+if show_timings:
+    with st.sidebar:
+        st.markdown("### 🛠 Step Timings")
+        st.dataframe(instrumentation.summary().set_index("span").round(2))
+        if "store" in st.session_state:
+            st.caption(f"Session store: {st.session_state.store.nbytes / 1024:,.1f} KB")
+        st.download_button("Download JSON log", instrumentation.json_log(), file_name="hss_spans.jsonl")
+        st.download_button("Download Prometheus metrics", instrumentation.prometheus_text(),
+                           file_name="hss_spans.prom")
@@ -0,0 +1,205 @@
+# Span timers for the simulation hot paths
+#
+#   with span("step1"):
+#       ...
+#   @timed("generate_costs")
+#   def generate_costs(...): ...
+#
+# Tracing is off unless HSS_TRACE=1 or enable() is called; enable_local() switches it
+# for the current thread only (one Streamlit session's script run). Disabled spans are
+# a shared no-op and timed functions cost one flag check. Latencies are kept per span name in a
+# bounded window and can be exported as a JSON log or Prometheus text, next to any gauges
+# set with set_gauge (e.g. session memory); flush() writes both into HSS_TRACE_DIR when
+# it is set.
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+WINDOW = 2048
+QUANTILES = (0.5, 0.9, 0.99)
+METRIC_NAME = "hss_span_latency_seconds"
+
+TRACE_DIR = os.environ.get("HSS_TRACE_DIR")
+
+_enabled = os.environ.get("HSS_TRACE", "") not in ("", "0")
+# Per-thread override of _enabled; None follows the process-wide flag
+_local_enabled = ContextVar("hss_trace_enabled", default=None)
+_lock = threading.Lock()
+_samples = {}
+_totals = {}
+_log = deque(maxlen=WINDOW)
+_gauges = {}
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+def enable_local(on=True):
+    # Threads start with a fresh context, so other sessions keep the process-wide flag
+    _local_enabled.set(bool(on))
+
+
+def enabled():
+    local = _local_enabled.get()
+    return _enabled if local is None else local
+
+
+def record(name, seconds):
+    with _lock:
+        if name not in _samples:
+            _samples[name] = deque(maxlen=WINDOW)
+            _totals[name] = [0, 0.0]
+        _samples[name].append(seconds)
+        _totals[name][0] += 1
+        _totals[name][1] += seconds
+        _log.append({"span": name, "seconds": seconds, "ts": time.time()})
+
+
+def set_gauge(name, value, description=""):
+    # Latest value of a process-wide metric, exported with the span latencies
+    with _lock:
+        _gauges[name] = (float(value), description)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name):
+    return _Span(name) if enabled() else _NOOP
+
+
+def timed(name=None):
+    # Decorator timing every call of a function under `name` (default: function name)
+    def decorate(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _log.clear()
+        _gauges.clear()
+
+
+def summary() -> pd.DataFrame:
+    """Per-span call count and latency quantiles (ms) over the recent window."""
+    import pandas as pd
+
+    with _lock:
+        windows = {name: np.array(values) for name, values in _samples.items()}
+        totals = {name: tuple(total) for name, total in _totals.items()}
+    rows = []
+    for name, values in sorted(windows.items()):
+        count, total = totals[name]
+        quantiles = np.quantile(values, QUANTILES) * 1e3
+        rows.append({
+            "span": name,
+            "count": count,
+            "mean_ms": total / count * 1e3,
+            **{f"p{int(q * 100)}_ms": value for q, value in zip(QUANTILES, quantiles)},
+            "max_ms": values.max() * 1e3
+        })
+    return pd.DataFrame(rows, columns=["span", "count", "mean_ms"] +
+                        [f"p{int(q * 100)}_ms" for q in QUANTILES] + ["max_ms"])
+
+
+def json_log():
+    # Recent span events, one JSON object per line
+    with _lock:
+        events = list(_log)
+    return "".join(json.dumps(event) + "\n" for event in events)
+
+
+def prometheus_text():
+    # Summary metric and gauges in the Prometheus text exposition format
+    with _lock:
+        windows = {name: np.array(values) for name, values in _samples.items()}
+        totals = {name: tuple(total) for name, total in _totals.items()}
+        gauges = dict(_gauges)
+    lines = [f"# HELP {METRIC_NAME} Latency of simulator spans.", f"# TYPE {METRIC_NAME} summary"]
+    for name, values in sorted(windows.items()):
+        for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+            lines.append(f'{METRIC_NAME}{{span="{name}",quantile="{q}"}} {value:.9f}')
+        count, total = totals[name]
+        lines.append(f'{METRIC_NAME}_sum{{span="{name}"}} {total:.9f}')
+        lines.append(f'{METRIC_NAME}_count{{span="{name}"}} {count}')
+    for name, (value, description) in sorted(gauges.items()):
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {value!r}"]
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Files are replaced atomically so a log shipper or textfile collector never reads a
+# partial write
+def export_json(path):
+    _write_atomic(path, json_log())
+
+
+def export_prometheus(path):
+    _write_atomic(path, prometheus_text())
+
+
+def flush(directory=TRACE_DIR):
+    if directory:
+        export_json(os.path.join(directory, "hss_spans.jsonl"))
+        export_prometheus(os.path.join(directory, "hss_spans.prom"))
@@ -0,0 +1,125 @@
+# Stochastic projection logic (Monte Carlo mode)
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+MC_ASSUMPTIONS = {
+    "return_volatility": 0.15,
+    "inflation_volatility": 0.02,
+    "catastrophic_probability": 0.02,
+    "catastrophic_mean": 25000,
+    "catastrophic_sigma": 0.75
+}
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_PATHS = 10000
+
+
+def _simulate_chunk(task):
+    # One chunk of paths from its own seeded stream, laid out (years, paths) so the
+    # yearly scan and the percentile pass read contiguous rows; float32 halves memory
+    (seed, n_paths, premiums, oop, oop_pct, premium_inflation, investment_rate,
+     contribution, savings_start, assumptions) = task
+    rng = np.random.default_rng(seed)
+    years = len(premiums)
+
+    returns = rng.normal(investment_rate, assumptions["return_volatility"], (years, n_paths))
+    np.maximum(returns, -0.99, out=returns)
+
+    # Inflation surprise relative to the deterministic premium_inflation path
+    inflation = rng.normal(premium_inflation, assumptions["inflation_volatility"], (years, n_paths))
+    surprise = np.ones((years, n_paths))
+    np.cumprod((1 + inflation[:-1]) / (1 + premium_inflation), axis=0, out=surprise[1:])
+
+    mean = assumptions["catastrophic_mean"]
+    sigma = assumptions["catastrophic_sigma"]
+    events = rng.random((years, n_paths)) < assumptions["catastrophic_probability"]
+    catastrophic = np.zeros((years, n_paths))
+    catastrophic[events] = rng.lognormal(np.log(mean) - sigma ** 2 / 2, sigma, events.sum()) * oop_pct
+
+    costs = (premiums + oop)[:, None] + catastrophic
+    costs *= surprise
+
+    # Returns apply to the invested (positive) part only; a shortfall carries over as
+    # is, neither earning returns nor being wiped out by a negative return
+    balances = np.empty((years, n_paths))
+    balance = np.full(n_paths, float(savings_start))
+    for t in range(years):
+        balance += contribution[t]
+        balance = np.maximum(balance, 0) * (1 + returns[t]) + np.minimum(balance, 0) - costs[t]
+        balances[t] = balance
+
+    return balances.astype(np.float32), costs.astype(np.float32)
+
+
+def _chunk_tasks(n_paths, seed, chunk_paths, base):
+    # Seeds depend only on (seed, chunk index), so results are identical for any pool size
+    n_chunks = -(-n_paths // chunk_paths)
+    streams = np.random.SeedSequence(seed).spawn(n_chunks)
+    sizes = [min(chunk_paths, n_paths - i * chunk_paths) for i in range(n_chunks)]
+    return [(stream, size) + base for stream, size in zip(streams, sizes)]
+
+
+def run_monte_carlo(cost_df: pd.DataFrame, premium_inflation, oop_pct, investment_rate,
+                    contribution=0, savings_start=0, n_paths=10000, seed=0,
+                    chunk_paths=CHUNK_PATHS, executor=None, assumptions=None) -> pd.DataFrame:
+    """Percentile bands and probability of shortfall at each age.
+
+    `cost_df` is the Step 1 frame with `Premiums` and `OOP Cost`. Each path draws
+    yearly investment returns, premium inflation and catastrophic cost events; the
+    capital balance compounds like `simulate_investment_strategy` and pays that
+    year's healthcare cost. Once negative, the balance is an uninvested shortfall:
+    returns only apply to the positive part. Chunks run on `executor` (e.g. a ProcessPoolExecutor)
+    when given, otherwise inline.
+    """
+    import pandas as pd
+
+    assumptions = {**MC_ASSUMPTIONS, **(assumptions or {})}
+    years = len(cost_df)
+    contribution = np.broadcast_to(np.asarray(contribution, dtype=np.float64), (years,))
+    base = (cost_df["Premiums"].to_numpy(dtype=np.float64), cost_df["OOP Cost"].to_numpy(dtype=np.float64),
+            oop_pct, premium_inflation, investment_rate, contribution, savings_start, assumptions)
+    tasks = _chunk_tasks(n_paths, seed, chunk_paths, base)
+
+    results = executor.map(_simulate_chunk, tasks) if executor else map(_simulate_chunk, tasks)
+    balances = np.empty((years, n_paths), dtype=np.float32)
+    costs = np.empty((years, n_paths), dtype=np.float32)
+    col = 0
+    for chunk_balances, chunk_costs in results:
+        size = chunk_balances.shape[1]
+        balances[:, col:col + size] = chunk_balances
+        costs[:, col:col + size] = chunk_costs
+        col += size
+
+    bands = {"Age": cost_df["Age"].to_numpy()}
+    balance_pct = np.percentile(balances, PERCENTILES, axis=1)
+    cost_pct = np.percentile(costs, PERCENTILES, axis=1)
+    for i, p in enumerate(PERCENTILES):
+        bands[f"Balance P{p}"] = balance_pct[i]
+    for i, p in enumerate(PERCENTILES):
+        bands[f"Cost P{p}"] = cost_pct[i]
+    bands["Shortfall Probability"] = (balances < 0).mean(axis=1)
+    return pd.DataFrame(bands)
+
+
+def run_monte_carlo_book(clients, n_paths=10000, seed=0, workers=None, chunk_paths=CHUNK_PATHS):
+    """Yield (client_id, bands) for a whole book, one client in memory at a time.
+
+    `clients` is an iterable of dicts holding `cost_df` plus the keyword arguments
+    of `run_monte_carlo`; an optional `client_id` labels the output. Each client
+    gets its own stream derived from `seed` and its position in the book.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for i, client in enumerate(clients):
+            client = dict(client)
+            client_id = client.pop("client_id", i)
+            cost_df = client.pop("cost_df")
+            bands = run_monte_carlo(cost_df, n_paths=n_paths, seed=[seed, i],
+                                    chunk_paths=chunk_paths, executor=pool, **client)
+            yield client_id, bands
@@ -0,0 +1,241 @@
+# Monthly-resolution cash flow for Steps 1-3
+#
+# Premiums, OOP, income, household expenses and debt keep their yearly amounts (they
+# step up once a year) and are spread evenly over the year's months. Savings and the
+# 401(k) compound monthly at the rate equivalent to the annual one, with 1/12 of the
+# annual contribution paid in each month. Balances come from the closed form of that
+# recurrence, so any block of years is evaluated without the months before it and a
+# whole horizon can be streamed out as yearly aggregates with bounded memory.
+
+import numpy as np
+
+from simulator_core import growth_factors
+
+MONTHS = 12
+MONTH_NUMBERS = np.arange(1, MONTHS + 1)
+# Years per streamed block: a quarter of the longest horizon. Narrower blocks of the
+# years-last arrays leave NumPy with short inner loops and get slower per year.
+CHUNK_YEARS = 17
+FLOW_COLUMNS = ("Household Expenses", "Debt Payments", "Premiums", "OOP", "Total Healthcare", "Total Expenses",
+                "Income")
+BALANCE_COLUMNS = ("Savings", "401(k)")
+MONTHLY_COLUMNS = FLOW_COLUMNS + BALANCE_COLUMNS + ("Net Cash Flow", "Surplus/Deficit")
+SUMMARY_COLUMNS = FLOW_COLUMNS + BALANCE_COLUMNS + ("Surplus/Deficit", "Deficit Months", "First Deficit Month")
+
+
+def _balance_terms(start, annual_rate, annual_contribution, years):
+    # Balances at the start of each year (plus the final year end) and the within-year
+    # month factors: month j of year y ends at year_start[..., y] * growth[..., j] + accrued[..., j]
+    start = np.asarray(start, dtype=np.float64)[..., None]
+    rate = np.asarray(annual_rate, dtype=np.float64)[..., None]
+    contribution = np.asarray(annual_contribution, dtype=np.float64)[..., None] / MONTHS
+
+    log_month = np.log1p(rate) / MONTHS
+    step = np.expm1(log_month)
+    growth = np.exp(log_month * MONTH_NUMBERS)
+    flat = step == 0
+    any_flat = flat.any()
+    if any_flat:
+        safe_step = np.where(flat, 1.0, step)
+        level = np.where(flat, 0.0, contribution / safe_step)
+        accrued = contribution * np.where(flat, MONTH_NUMBERS, np.expm1(log_month * MONTH_NUMBERS) / safe_step)
+    else:
+        level = contribution / step
+        accrued = contribution * (np.expm1(log_month * MONTH_NUMBERS) / step)
+
+    # start * g**y + contribution * (g**y - 1) / step, written as one scaled growth curve
+    year_start = growth_factors(rate[..., 0], years + 1) * (start + level)
+    year_start -= level
+    if any_flat:
+        np.copyto(year_start, start + contribution * MONTHS * np.arange(years + 1), where=flat)
+    # With a non-negative rate and contribution, a year that starts non-negative only grows
+    rising = (step >= 0) & (contribution >= 0)
+    return year_start, growth, accrued, rising
+
+
+def _monthly_balances(terms, first_year, last_year):
+    year_start, growth, accrued, _ = terms
+    return year_start[..., first_year:last_year, None] * growth[..., None, :] + accrued[..., None, :]
+
+
+def _negative_months(level, slope):
+    # Number of months j in 1..MONTHS where level + j * slope < 0 (a suffix of the year
+    # when slope < 0, otherwise a prefix), as floats
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cross = np.divide(level, slope)
+    np.negative(cross, out=cross)
+    count = np.where(slope < 0, MONTHS - np.floor(cross), np.ceil(cross) - 1)
+    # fmax first so the 0/0 of a flat zero line counts as no months
+    np.fmax(count, 0, out=count)
+    return np.fmin(count, MONTHS, out=count)
+
+
+class _Projection:
+    """Yearly amounts and balance terms shared by every block of months."""
+
+    def __init__(self, premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                 savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k):
+        self.premiums = np.asarray(premiums, dtype=np.float64)
+        self.oop = np.asarray(oop, dtype=np.float64)
+        self.income = np.asarray(income_proj, dtype=np.float64)
+        self.years = self.premiums.shape[-1]
+        # Household expenses and debt step up at the same rate: one set of growth factors
+        factors = growth_factors(income_growth, self.years)
+        self.household = np.asarray(monthly_expenses, dtype=np.float64)[..., None] * 12 * factors
+        self.debt = np.asarray(debt_monthly_payment, dtype=np.float64)[..., None] * 12 * factors
+        self.savings = _balance_terms(savings_start, savings_growth, annual_contrib, self.years)
+        self.retirement = _balance_terms(np.zeros_like(np.asarray(contrib_401k, dtype=np.float64)), growth_401k,
+                                         contrib_401k, self.years)
+        # Whether every savings balance starts every year non-negative with a non-negative
+        # rate and contribution (see summary)
+        self.monotone = bool(self.savings[3].all() and (self.savings[0] >= 0).all())
+        # Yearly cash flow below which the lower line of summary ends the year negative,
+        # for every year at once; it has the shape of the savings terms, often one row
+        # shared by every profile
+        year_start, growth, accrued, _ = self.savings
+        self.deficit_bound = year_start[..., :-1] * (growth[..., :1] - 1 + 1 / MONTHS) + accrued[..., :1]
+        self.deficit_bound *= -MONTHS
+
+    def yearly(self, first_year, last_year):
+        # Yearly flows for years [first_year, last_year), built per block so a streamed
+        # horizon never holds more than one block of totals
+        years = slice(first_year, last_year)
+        healthcare = self.premiums[..., years] + self.oop[..., years]
+        total_exp = self.household[..., years] + self.debt[..., years] + healthcare
+        return {
+            "Household Expenses": self.household[..., years],
+            "Debt Payments": self.debt[..., years],
+            "Premiums": self.premiums[..., years],
+            "OOP": self.oop[..., years],
+            "Total Healthcare": healthcare,
+            "Total Expenses": total_exp,
+            "Income": self.income[..., years]
+        }
+
+    def block(self, first_year, last_year):
+        # Monthly series for years [first_year, last_year) shaped (..., years, MONTHS)
+        yearly = self.yearly(first_year, last_year)
+        savings = _monthly_balances(self.savings, first_year, last_year)
+        retirement = _monthly_balances(self.retirement, first_year, last_year)
+        net_flow = ((yearly["Income"] - yearly["Total Expenses"]) / MONTHS)[..., None]
+        surplus = savings + net_flow * MONTH_NUMBERS
+        shape = np.broadcast_shapes(surplus.shape, retirement.shape)
+        months = {name: np.broadcast_to(values[..., None] / MONTHS, shape) for name, values in yearly.items()}
+        months["Savings"] = np.broadcast_to(savings, shape)
+        months["401(k)"] = np.broadcast_to(retirement, shape)
+        months["Net Cash Flow"] = np.broadcast_to(net_flow, shape)
+        months["Surplus/Deficit"] = np.broadcast_to(surplus, shape)
+        return months
+
+    def summary(self, first_year, last_year):
+        """Yearly aggregates for years [first_year, last_year).
+
+        While the savings balance starts the year non-negative and neither its rate nor
+        its contribution is negative, it is convex and rising through the year: month j
+        lies above start * (1 + j * step) + j * contribution and below the chord to the
+        year-end balance. The monthly surplus is then bracketed by two lines in j, and
+        when both lines go negative in the same months those are the deficit months.
+        Months are only evaluated where the lines disagree.
+        """
+        summary = self.yearly(first_year, last_year)
+        cash_flow = summary["Income"] - summary["Total Expenses"]
+        year_start, growth, accrued, rising = self.savings
+        shape = np.broadcast_shapes(year_start.shape[:-1] + (last_year - first_year,), cash_flow.shape)
+        start = np.broadcast_to(year_start[..., first_year:last_year], shape)
+        year_end = np.broadcast_to(year_start[..., first_year + 1:last_year + 1], shape)
+        flows = np.broadcast_to(cash_flow, shape)
+        bound = self.deficit_bound[..., first_year:last_year]
+        deficit_months = np.zeros(shape, dtype=np.int8)
+        first_deficit = np.zeros(shape, dtype=np.int8)
+
+        # The lower line starts at start >= 0, so it can only go negative if it is negative
+        # at month 12; most years clear it and need nothing more
+        bracketed = flows < bound
+        monotone = self.monotone or rising & (start >= 0)
+        if monotone is not True:
+            bracketed &= monotone
+        where = np.nonzero(bracketed)
+        if len(where[0]):
+            level = start[where]
+            net_flow = flows[where] / MONTHS
+            slope = (year_end[where] - level) / MONTHS + net_flow
+            count = _negative_months(level, slope)
+            low_end = net_flow - np.broadcast_to(bound, shape)[where] / MONTHS
+            resolved = count == _negative_months(level, low_end - level / MONTHS)
+            known = tuple(index[resolved] for index in where)
+            count, falling = count[resolved], slope[resolved] < 0
+            deficit_months[known] = count
+            first_deficit[known] = np.where(count == 0, 0, np.where(falling, MONTHS + 1 - count, 1))
+            where = tuple(index[~resolved] for index in where)
+        if monotone is not True:
+            bracketed[:] = False
+            bracketed[where] = True
+            where = np.nonzero(bracketed | (~monotone & ~np.isnan(flows)))
+
+        if len(where[0]):
+            # Walk the months of the remaining (profile, year) pairs only
+            profile = where[:-1]
+            growth_rows = np.broadcast_to(growth, shape[:-1] + (MONTHS,))[profile].T
+            accrued_rows = np.broadcast_to(accrued, shape[:-1] + (MONTHS,))[profile].T
+            balance = start[where]
+            flow = flows[where] / MONTHS
+            count = np.zeros(len(balance), dtype=np.int8)
+            first = np.zeros(len(balance), dtype=np.int8)
+            surplus = np.empty(len(balance))
+            for month in range(MONTHS):
+                np.multiply(balance, growth_rows[month], out=surplus)
+                surplus += accrued_rows[month]
+                surplus += flow * (month + 1)
+                short = surplus < 0
+                count += short
+                first[(first == 0) & short] = month + 1
+            deficit_months[where] = count
+            first_deficit[where] = first
+
+        summary["Savings"] = year_start[..., first_year + 1:last_year + 1]
+        summary["401(k)"] = self.retirement[0][..., first_year + 1:last_year + 1]
+        summary["Surplus/Deficit"] = year_end + cash_flow
+        summary["Deficit Months"] = deficit_months
+        summary["First Deficit Month"] = first_deficit
+        return summary
+
+
+def monthly_cashflow(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                     savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k):
+    """Steps 2-3 at monthly resolution; keys are MONTHLY_COLUMNS.
+
+    `premiums`, `oop` and `income_proj` are the yearly Step 1/2 series (years on the
+    last axis); the other inputs are the Step 2 scalars or one value per profile.
+    Returns (..., years * 12) arrays where index 12 * y + m is month m of year y.
+    Surplus/Deficit is the savings balance plus the year-to-date net cash flow, so
+    month 12 is the monthly-compounded counterpart of the yearly Step 3 figure and the
+    months before it show when in the year a deficit starts.
+    """
+    projection = _Projection(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                             savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k)
+    months = projection.block(0, projection.years)
+    return {name: values.reshape(values.shape[:-2] + (-1,)) for name, values in months.items()}
+
+
+def iter_monthly_summary(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                         savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k,
+                         chunk_years=CHUNK_YEARS):
+    """Yield (first_year, yearly aggregates) for consecutive blocks of `chunk_years`.
+
+    Flows are the yearly totals, Savings/401(k) and Surplus/Deficit the year-end
+    values, and Deficit Months and First Deficit Month (1-12, 0 if none) count the
+    months with a negative monthly Surplus/Deficit. Only one block of years is
+    evaluated at a time.
+    """
+    projection = _Projection(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                             savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k)
+    for first_year in range(0, projection.years, chunk_years):
+        yield first_year, projection.summary(first_year, min(first_year + chunk_years, projection.years))
+
+
+def monthly_summary(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                    savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k):
+    # The iter_monthly_summary aggregates for the whole horizon at once; keys are SUMMARY_COLUMNS
+    projection = _Projection(premiums, oop, income_proj, monthly_expenses, debt_monthly_payment, income_growth,
+                             savings_start, savings_growth, annual_contrib, contrib_401k, growth_401k)
+    return projection.summary(0, projection.years)
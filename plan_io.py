@@ -0,0 +1,141 @@
+# Binary save/load of simulations
+#
+# A saved plan is an Arrow IPC file: one record batch holding every per-year series of
+# the session (one column each) and the Step 1-4 inputs as JSON in the schema metadata,
+# next to the plan format and engine versions and the assumption tables' fingerprint.
+# Files are memory-mapped on load, so columns come back as zero-copy NumPy views, and
+# the schema is checked before any data is touched.
+
+import glob
+import json
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+
+from assumptions import current_assumptions
+from simulator_core import ENGINE_VERSION
+
+PLAN_FORMAT_VERSION = "1"
+PLAN_SUFFIX = ".plan.arrow"
+REQUIRED_COLUMNS = ("Age", "Healthcare Cost", "Premiums", "OOP Cost")
+
+# Session inputs a plan carries; anything else in an upload is ignored
+PLAN_INPUTS = (
+    "profile", "care_prefs", "insurance_type", "employee_premium", "employer_premium", "oop_pct",
+    "premium_inflation", "monthly_income", "net_income_annual", "income_growth", "monthly_expenses",
+    "debt_monthly_payment", "savings_start", "savings_growth", "annual_contrib", "savings_goals",
+    "contrib_401k_employee", "contrib_401k_employer", "growth_401k", "capital_fund_source",
+    "capital_from_savings_pct", "capital_monthly_contrib", "cap_alloc",
+    "step1_submitted", "step2_submitted", "step3_submitted"
+)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Cannot save {type(value).__name__} in a plan")
+
+
+def plan_table(inputs, columns) -> pa.Table:
+    """Arrow table for a plan: `columns` maps names to equal-length 1-D arrays."""
+    inputs = {name: value for name, value in inputs.items() if name in PLAN_INPUTS}
+    metadata = {
+        "hss_plan_version": PLAN_FORMAT_VERSION,
+        "hss_engine_version": ENGINE_VERSION,
+        "hss_assumptions": current_assumptions().fingerprint,
+        "hss_inputs": json.dumps(inputs, default=_json_default)
+    }
+    table = pa.table({name: np.asarray(values) for name, values in columns.items()})
+    return table.replace_schema_metadata(metadata)
+
+
+def _write(sink, inputs, columns):
+    table = plan_table(inputs, columns)
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def plan_bytes(inputs, columns) -> bytes:
+    sink = pa.BufferOutputStream()
+    _write(sink, inputs, columns)
+    return sink.getvalue().to_pybytes()
+
+
+def save_plan(path, inputs, columns):
+    # Written to a unique temporary file in the same directory then renamed, so a batch
+    # reader never opens a partial plan and concurrent saves never share a file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    os.close(fd)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            _write(sink, inputs, columns)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def validate_schema(schema: pa.Schema):
+    metadata = schema.metadata or {}
+    version = metadata.get(b"hss_plan_version", b"").decode()
+    if version != PLAN_FORMAT_VERSION:
+        raise ValueError(f"Unsupported plan format version {version!r} (expected {PLAN_FORMAT_VERSION})")
+    if b"hss_inputs" not in metadata:
+        raise ValueError("Plan has no saved inputs")
+    missing = [name for name in REQUIRED_COLUMNS if name not in schema.names]
+    if missing:
+        raise ValueError(f"Plan is missing columns: {missing}")
+    for field in schema:
+        if not (pa.types.is_floating(field.type) or pa.types.is_integer(field.type)):
+            raise ValueError(f"Plan column {field.name!r} has unsupported type {field.type}")
+
+
+def load_plan(source, memory_map=True):
+    """Read a plan from a path or bytes-like object.
+
+    Returns (inputs, columns, engine_version, assumptions), where `assumptions` is the
+    fingerprint of the tables the plan was saved with ("" if it predates them). With a
+    path and `memory_map`, columns are read-only NumPy views over the mapped file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        source = pa.memory_map(os.fspath(source)) if memory_map else pa.OSFile(os.fspath(source))
+    else:
+        source = pa.BufferReader(source)
+    reader = pa.ipc.open_file(source)
+    validate_schema(reader.schema)
+    metadata = reader.schema.metadata
+    inputs = json.loads(metadata[b"hss_inputs"])
+
+    if reader.num_record_batches != 1:
+        raise ValueError("Plan must hold a single record batch")
+    batch = reader.get_batch(0)
+    columns = {}
+    for name, column in zip(batch.schema.names, batch.columns):
+        if column.null_count:
+            raise ValueError(f"Plan column {name!r} has missing values")
+        columns[name] = column.to_numpy(zero_copy_only=True)
+    return (inputs, columns, metadata[b"hss_engine_version"].decode(),
+            metadata.get(b"hss_assumptions", b"").decode())
+
+
+def plan_mismatch(engine_version, assumptions):
+    # Why a plan's saved series would differ from what the steps compute now, or None
+    if engine_version != ENGINE_VERSION:
+        return f"simulation engine version {engine_version} (current: {ENGINE_VERSION})"
+    if assumptions != current_assumptions().fingerprint:
+        return "a different version of the assumption tables"
+    return None
+
+
+def plan_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "*" + PLAN_SUFFIX)))
+
+
+def iter_plans(directory, memory_map=True):
+    # (path, inputs, columns, engine_version, assumptions) for every plan in a directory, in name order
+    for path in plan_paths(directory):
+        yield (path, *load_plan(path, memory_map))
@@ -0,0 +1,361 @@
+# Population aggregates for employer and insurer books
+#
+#   python population_stats.py profiles.parquet --workers 4 --output summary.json --save book.npz
+#   python population_stats.py book_east.npz book_west.npz --output summary.json
+#
+# Profiles are projected chunk by chunk (batch_runner.project_chunk) and folded into
+# a PopulationStats: running moments and a log-bucketed quantile sketch per metric,
+# plus per-age counts of member-years in deficit and in each risk zone. Counts and
+# sketch buckets are integers, so partial aggregates from separate workers (or saved
+# .npz files from separate runs) merge exactly and in any order; moments merge with
+# the pairwise update and agree to rounding. No per-member rows are kept; invalid
+# input rows are skipped and counted as `rejected`.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from batch_runner import CHUNK_SIZE, project_chunk, read_profiles, split_invalid
+from projected_health_risk import MIN_AGE, MAX_AGE, STATUS_INDEX, risk_tables
+from risk_chart import CRITICAL_RISK, MODERATE_RISK, RISK_ZONES
+from simulator_core import AGE_END, horizon_years
+
+METRICS = ("lifetime_healthcare_cost", "max_healthcare_cost", "total_shortfall", "min_surplus",
+           "capital_coverage_ratio")
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+AGES = AGE_END + 1
+ZONES = tuple(RISK_ZONES)
+
+# Quantile sketch buckets: estimates are within SKETCH_ALPHA relative error for
+# magnitudes in [SKETCH_MIN, SKETCH_MAX]; smaller ones count as zero and larger ones
+# land in the top bucket
+SKETCH_ALPHA = 0.005
+SKETCH_MIN = 1e-4
+SKETCH_MAX = 1e12
+
+
+class RunningMoments:
+    """Count, mean, sum of squared deviations, min and max of the finite values seen."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _combine(self, count, mean, m2, low, high):
+        # Pairwise update (Chan et al.), so chunk order only changes rounding
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values):
+            mean = values.mean()
+            self._combine(len(values), mean, float(np.square(values - mean).sum()), values.min(), values.max())
+
+    def merge(self, other):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else np.nan
+
+    def to_array(self):
+        return np.array([self.count, self.mean, self.m2, self.min, self.max])
+
+    @classmethod
+    def from_array(cls, array):
+        moments = cls()
+        moments.count = int(array[0])
+        moments.mean, moments.m2, moments.min, moments.max = (float(v) for v in array[1:])
+        return moments
+
+
+class QuantileSketch:
+    """Mergeable quantiles from log-spaced buckets (DDSketch) with fixed, dense bounds.
+
+    Bucket k holds magnitudes in (gamma**(k-1), gamma**k] with gamma = (1+alpha)/(1-alpha),
+    and a dense count array per sign, so sketches with the same parameters merge by
+    adding counts.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA, min_value=SKETCH_MIN, max_value=SKETCH_MAX):
+        self.params = (float(alpha), float(min_value), float(max_value))
+        self.log_gamma = np.log1p(2 * alpha / (1 - alpha))
+        self.offset = int(np.floor(np.log(min_value) / self.log_gamma))
+        size = int(np.ceil(np.log(max_value) / self.log_gamma)) - self.offset + 1
+        self.positive = np.zeros(size, dtype=np.int64)
+        self.negative = np.zeros(size, dtype=np.int64)
+        self.zero = 0
+
+    @property
+    def count(self):
+        return int(self.positive.sum() + self.negative.sum()) + self.zero
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        magnitude = np.abs(values)
+        large = magnitude >= self.params[1]
+        self.zero += len(values) - int(large.sum())
+        index = np.ceil(np.log(magnitude[large]) / self.log_gamma) - self.offset
+        index = np.clip(index, 0, len(self.positive) - 1).astype(np.intp)
+        negative = values[large] < 0
+        self.positive += np.bincount(index[~negative], minlength=len(self.positive))
+        self.negative += np.bincount(index[negative], minlength=len(self.negative))
+
+    def merge(self, other):
+        if other.params != self.params:
+            raise ValueError(f"Cannot merge sketches with parameters {other.params} into {self.params}")
+        self.positive += other.positive
+        self.negative += other.negative
+        self.zero += other.zero
+
+    def quantiles(self, qs):
+        # Values at quantiles `qs` (0-1), NaN when the sketch is empty
+        qs = np.asarray(qs, dtype=np.float64)
+        count = self.count
+        if count == 0:
+            return np.full(qs.shape, np.nan)
+        gamma = np.exp(self.log_gamma)
+        bucket = 2 * np.exp((np.arange(len(self.positive)) + self.offset) * self.log_gamma) / (gamma + 1)
+        values = np.concatenate([-bucket[::-1], [0.0], bucket])
+        counts = np.concatenate([self.negative[::-1], [self.zero], self.positive])
+        ranks = qs * (count - 1)
+        return values[np.searchsorted(np.cumsum(counts), ranks, side="right")]
+
+
+class PopulationStats:
+    """Distribution-level Steps 1-4 results for a population, built chunk by chunk."""
+
+    def __init__(self):
+        self.members = 0
+        self.rejected = 0
+        self.moments = {name: RunningMoments() for name in METRICS}
+        self.sketches = {name: QuantileSketch() for name in METRICS}
+        # Per attained age: member-years simulated, in deficit, healthcare cost and risk zone
+        self.member_years = np.zeros(AGES, dtype=np.int64)
+        self.deficit_years = np.zeros(AGES, dtype=np.int64)
+        self.cost_sum = np.zeros(AGES)
+        self.risk_zones = np.zeros((AGES, len(ZONES)), dtype=np.int64)
+        # Members by the zone of their peak projected risk
+        self.peak_zones = np.zeros(len(ZONES), dtype=np.int64)
+
+    def update(self, profiles: pd.DataFrame, projections):
+        """Fold in one chunk: `profiles` and its project_chunk output table."""
+        ages = projections["age"].to_numpy().astype(np.int64)
+        self.members += len(ages)
+        for name in METRICS:
+            values = projections[name].to_numpy(zero_copy_only=False)
+            self.moments[name].update(values)
+            self.sketches[name].update(values)
+
+        # Yearly series are in-horizon lists; recover each value's attained age
+        years = horizon_years(ages)
+        starts = np.cumsum(years) - years
+        attained = np.repeat(ages - starts, years) + np.arange(years.sum())
+        cost = projections["healthcare_cost"].combine_chunks().flatten().to_numpy()
+        surplus = projections["surplus"].combine_chunks().flatten().to_numpy()
+        self.member_years += np.bincount(attained, minlength=AGES)
+        self.deficit_years += np.bincount(attained, weights=surplus < 0, minlength=AGES).astype(np.int64)
+        self.cost_sum += np.bincount(attained, weights=cost, minlength=AGES)
+
+        # Risk zones of the projected_risk trajectories; unknown statuses are healthy
+        statuses = profiles.get("health_status", pd.Series("healthy", index=profiles.index))
+        age_index = np.clip(ages, MIN_AGE, MAX_AGE) - MIN_AGE
+        status_index = statuses.map(STATUS_INDEX).fillna(0).to_numpy(dtype=np.int64)
+        tables = risk_tables()
+        risk = tables["risk"][age_index, status_index]
+        valid = ~np.isnan(risk)
+        zone = (risk >= MODERATE_RISK).astype(np.intp) + (risk >= CRITICAL_RISK)
+        cell = (age_index[:, None] + MIN_AGE + np.arange(risk.shape[1])) * len(ZONES) + zone
+        self.risk_zones += np.bincount(cell[valid], minlength=AGES * len(ZONES)).reshape(AGES, len(ZONES))
+        peak = tables["max_risk"][age_index, status_index]
+        self.peak_zones += np.bincount((peak >= MODERATE_RISK).astype(np.intp) + (peak >= CRITICAL_RISK),
+                                       minlength=len(ZONES))
+        return self
+
+    def merge(self, other):
+        self.members += other.members
+        self.rejected += other.rejected
+        for name in METRICS:
+            self.moments[name].merge(other.moments[name])
+            self.sketches[name].merge(other.sketches[name])
+        self.member_years += other.member_years
+        self.deficit_years += other.deficit_years
+        self.cost_sum += other.cost_sum
+        self.risk_zones += other.risk_zones
+        self.peak_zones += other.peak_zones
+        return self
+
+    def metrics_frame(self) -> pd.DataFrame:
+        rows = {}
+        for name in METRICS:
+            moments = self.moments[name]
+            quantiles = self.sketches[name].quantiles(np.array(PERCENTILES) / 100)
+            rows[name] = {"count": moments.count, "mean": moments.mean if moments.count else np.nan,
+                          "std": moments.std, "min": moments.min if moments.count else np.nan,
+                          **{f"p{p}": q for p, q in zip(PERCENTILES, quantiles)},
+                          "max": moments.max if moments.count else np.nan}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def age_frame(self) -> pd.DataFrame:
+        members = self.member_years
+        with np.errstate(divide="ignore", invalid="ignore"):
+            df = pd.DataFrame({
+                "Age": np.arange(AGES),
+                "Members": members,
+                "Deficit Share": self.deficit_years / members,
+                "Mean Healthcare Cost": self.cost_sum / members,
+                **{RISK_ZONES[zone][1]: self.risk_zones[:, i] for i, zone in enumerate(ZONES)}
+            })
+        return df[members > 0].reset_index(drop=True)
+
+    def summary(self):
+        return {
+            "members": self.members,
+            "rejected": self.rejected,
+            "peak_risk_zones": {RISK_ZONES[zone][1]: int(n) for zone, n in zip(ZONES, self.peak_zones)},
+            "metrics": self.metrics_frame(),
+            "by_age": self.age_frame()
+        }
+
+    def to_arrays(self):
+        arrays = {
+            "members": np.array(self.members),
+            "rejected": np.array(self.rejected),
+            "sketch_params": np.array(QuantileSketch().params),
+            "member_years": self.member_years,
+            "deficit_years": self.deficit_years,
+            "cost_sum": self.cost_sum,
+            "risk_zones": self.risk_zones,
+            "peak_zones": self.peak_zones
+        }
+        for name in METRICS:
+            sketch = self.sketches[name]
+            arrays[f"{name}.moments"] = self.moments[name].to_array()
+            arrays[f"{name}.positive"] = sketch.positive
+            arrays[f"{name}.negative"] = sketch.negative
+            arrays[f"{name}.zero"] = np.array(sketch.zero)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        if tuple(arrays["sketch_params"]) != QuantileSketch().params:
+            raise ValueError("Saved aggregate was built with different sketch parameters")
+        stats = cls()
+        stats.members = int(arrays["members"])
+        # Aggregates saved before rows were validated have no count
+        stats.rejected = int(arrays["rejected"]) if "rejected" in arrays else 0
+        for name in ("member_years", "deficit_years", "cost_sum", "risk_zones", "peak_zones"):
+            setattr(stats, name, np.array(arrays[name]))
+        for name in METRICS:
+            stats.moments[name] = RunningMoments.from_array(arrays[f"{name}.moments"])
+            sketch = stats.sketches[name]
+            sketch.positive = np.array(arrays[f"{name}.positive"])
+            sketch.negative = np.array(arrays[f"{name}.negative"])
+            sketch.zero = int(arrays[f"{name}.zero"])
+        return stats
+
+    def save(self, path):
+        # Written to a hidden temporary file and renamed, so a partial aggregate is never half-written
+        path = os.path.abspath(path)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix="." + os.path.basename(path) + ".")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **self.to_arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls.from_arrays(arrays)
+
+
+def aggregate_chunk(chunk: pd.DataFrame) -> PopulationStats:
+    # Project one chunk and reduce it to a partial aggregate; runs in a pool worker
+    valid, rejected = split_invalid(chunk)
+    stats = PopulationStats().update(valid, project_chunk(valid))
+    stats.rejected = len(rejected)
+    return stats
+
+
+def run_population_stats(input_path, chunk_size=CHUNK_SIZE, workers=None) -> PopulationStats:
+    """Aggregate every profile in `input_path` on a process pool.
+
+    At most two chunks per worker are in flight, so memory stays flat for any input
+    size; partial aggregates are merged as they complete.
+    """
+    workers = workers or os.cpu_count()
+    stats = PopulationStats()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk in read_profiles(input_path, chunk_size):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats.merge(future.result())
+            pending.add(pool.submit(aggregate_chunk, chunk))
+        for future in pending:
+            stats.merge(future.result())
+    return stats
+
+
+def summary_json(stats: PopulationStats):
+    # stats.summary() with the frames as plain JSON values
+    summary = stats.summary()
+    summary["metrics"] = json.loads(summary["metrics"].to_json(orient="index"))
+    summary["by_age"] = json.loads(summary["by_age"].to_json(orient="records"))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Population-level Steps 1-4 statistics.")
+    parser.add_argument("inputs", nargs="+", help="profile files (CSV/JSONL/Parquet) and/or saved .npz aggregates")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="JSON summary path (default: stdout)")
+    parser.add_argument("--save", help="write the merged aggregate to this .npz for later merging")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = PopulationStats()
+    for path in args.inputs:
+        if path.endswith(".npz"):
+            stats.merge(PopulationStats.load(path))
+        else:
+            stats.merge(run_population_stats(path, args.chunk_size, args.workers))
+    elapsed = time.perf_counter() - start
+    if args.save:
+        stats.save(args.save)
+
+    summary = summary_json(stats)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    print(f"Aggregated {stats.members:,} members in {elapsed:.1f}s "
+          f"({stats.members / elapsed if elapsed else 0:,.0f} members/sec); "
+          f"{stats.rejected:,} invalid profiles skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,116 @@
 # Risk trajectory logic
+#
+# Health risk follows a yearly Markov chain over healthy -> chronic -> high_risk with
+# transition matrices by age band (the transitions and state_risk assumption tables).
+# State distributions for every (start age, status) pair are propagated once per
+# version of the tables with batched matrix products, so single-user lookups are plain
+# array indexing.
+
+import numpy as np
+
+from assumptions import HEALTH_STATES, MAX_AGE, current_assumptions
+from instrumentation import timed
+
+MIN_AGE = 0
+
+RISK_INSIGHTS = {
+    "critical": "🚨 Your health risk is projected to reach critical levels. Consider both capital care and catastrophic insurance early.",
+    "rising": "📊 Your risk profile is rising rapidly. A capital health investment strategy can reduce future financial strain.",
+    "steady": "✅ Your risk progression is steady. Early investment may still yield high coverage and long-term flexibility."
+}
+
+
+def propagate(distributions, start_ages, years, transitions=None):
+    """State distributions over `years` for a cohort, one batched product per year.
+
+    `distributions` is (n, 3) over HEALTH_STATES and `start_ages` is (n,). Returns
+    (n, years, 3); ages past MAX_AGE keep the last band's matrix. `transitions` is the
+    (age, from, to) table and defaults to the current assumptions.
+    """
+    if transitions is None:
+        transitions = current_assumptions().transitions
+    current = np.asarray(distributions, dtype=np.float64)
+    start_ages = np.asarray(start_ages, dtype=np.int64)
+    out = np.empty(current.shape[:-1] + (years, len(HEALTH_STATES)))
+    for t in range(years):
+        out[..., t, :] = current
+        age_index = np.clip(start_ages + t, MIN_AGE, MAX_AGE) - MIN_AGE
+        current = np.matmul(current[..., None, :], transitions[age_index])[..., 0, :]
+    return out
+
+
+def _risk_tables(tables):
+    horizon = MAX_AGE - MIN_AGE + 1
+    start_ages = np.arange(MIN_AGE, MAX_AGE + 1)
+    # Every (start age, status) pair starts in that status with certainty
+    initial = np.broadcast_to(np.eye(len(HEALTH_STATES)), (horizon, len(HEALTH_STATES), len(HEALTH_STATES)))
+    dist = propagate(initial, start_ages[:, None], horizon, tables.transitions)
+    ages = np.clip(start_ages[:, None] + np.arange(horizon), MIN_AGE, MAX_AGE) - MIN_AGE
+    risk = np.einsum("asty,aty->ast", dist, tables.state_risk[ages])
+    # Years beyond MAX_AGE are outside every trajectory
+    outside = np.arange(horizon)[None, :] > (MAX_AGE - start_ages)[:, None]
+    risk = np.where(outside[:, None, :], np.nan, risk)
+    rise_year = np.minimum(10, MAX_AGE - start_ages)
+    return {
+        # distributions[start age, status, year, state] and risk[start age, status, year]
+        "distributions": dist,
+        "risk": risk,
+        "max_risk": np.nanmax(risk, axis=2),
+        "risk_rise": risk[np.arange(horizon), :, rise_year] - risk[..., 0]
+    }
+
+
+def risk_tables():
+    # Trajectory tables for the current assumptions, built once per table version
+    return current_assumptions().derived("risk_tables", _risk_tables)
+
+
+STATUS_INDEX = {status: i for i, status in enumerate(HEALTH_STATES)}
+
+
+def _indices(ages, health_statuses):
+    age_index = np.clip(np.asarray(ages, dtype=np.int64), MIN_AGE, MAX_AGE) - MIN_AGE
+    # Unknown statuses are treated as healthy
+    status_index = current_assumptions().status_codes(health_statuses)
+    return age_index, np.maximum(status_index, 0)
 
-import pandas as pd
 
 # Function to simulate projected health risk
 def projected_risk(age, health_status):
-    base_risk = {
-        "healthy": 0.2,
-        "chronic": 0.5,
-        "high_risk": 0.8
-    }.get(health_status, 0.2)
-
-    risk_by_year = []
-    for i in range(0, 86 - age):  # simulate up to age 85
-        aging_factor = 0.02 * i  # 2% risk increase per year
-        total_risk = min(base_risk + aging_factor, 1.0)
-        risk_by_year.append(total_risk)
-    return risk_by_year
+    age_index = min(max(age, MIN_AGE), MAX_AGE) - MIN_AGE
+    return risk_tables()["risk"][age_index, STATUS_INDEX.get(health_status, 0), :MAX_AGE - age + 1].tolist()
+
+# State probabilities for many individuals: (n, years, 3), NaN past MAX_AGE
+def state_distributions(ages, health_statuses):
+    age_index, status_index = _indices(ages, health_statuses)
+    tables = risk_tables()
+    dist = tables["distributions"][age_index, status_index].copy()
+    dist[np.isnan(tables["risk"][age_index, status_index])] = np.nan
+    return dist
+
+# Vectorized peak risk and 10-year rise for many (age, health_status) pairs
+def risk_summary(ages, health_statuses):
+    age_index, status_index = _indices(ages, health_statuses)
+    tables = risk_tables()
+    return {
+        "max_risk": tables["max_risk"][age_index, status_index],
+        "risk_rise": tables["risk_rise"][age_index, status_index]
+    }
+
+# Insight key ("critical", "rising" or "steady") from peak risk and 10-year rise
+def risk_level(max_risk, risk_rise):
+    return np.select([np.asarray(max_risk) > 0.9, np.asarray(risk_rise) > 0.25], ["critical", "rising"], "steady")
 
 # Function to retrieve projected risk insight based on risk profile
+@timed()
 def get_risk_insight(age=None, health_status=None):
     if age is None or health_status is None:
         return None
 
-    risk_trajectory = projected_risk(age, health_status)
-    risks = risk_trajectory
-    max_risk = max(risks)
-    rising_fast = risks[10] - risks[0] > 0.25
-
-    if max_risk > 0.9:
-        return "🚨 Your health risk is projected to reach critical levels. Consider both capital care and catastrophic insurance early."
-    elif rising_fast:
-        return "📊 Your risk profile is rising rapidly. A capital health investment strategy can reduce future financial strain."
-    else:
-        return "✅ Your risk progression is steady. Early investment may still yield high coverage and long-term flexibility."
+    summary = risk_summary([age], [health_status])
+    return RISK_INSIGHTS[str(risk_level(summary["max_risk"], summary["risk_rise"])[0])]
 
 # Optional: expose a utility to get both risk values and trajectory
+@timed()
 def get_risk_trajectory(age, health_status):
     return projected_risk(age, health_status)
@@ -1,54 +1,139 @@
 # AI recommendation logic
+#
+# Rules run on plain arrays (rule_masks, recommendation_ids); evaluate_rules and
+# recommend_bulk wrap them for DataFrames and import pandas only when called.
 
-import streamlit as st
-def generate_recommendation(profile, cost_df, surplus, insurance_type, capital_strategy):
-    from projected_health_risk import get_risk_insight
+from __future__ import annotations
 
-    print("RISK INSIGHT:", get_risk_insight())
+from typing import TYPE_CHECKING
 
-    age = profile.get("age")
-    health_status = profile.get("health_status")
-    partner_health = profile.get("partner_health_status")
-    family = profile.get("family_status") == "family"
+import numpy as np
 
-    total_shortfall = sum([x for x in surplus if x < 0])
+from instrumentation import timed
+from projected_health_risk import RISK_INSIGHTS, risk_level, risk_summary
 
-    if "Capital - Total" in cost_df.columns and "Cumulative Cost" in cost_df.columns:
-        capital_coverage_ratio = cost_df["Capital - Total"].iloc[-1] / cost_df["Cumulative Cost"].iloc[-1]
-    else:
-        capital_coverage_ratio = 0
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Rule IDs in display order, with the message shown for each
+RULE_MESSAGES = {
+    "light_coverage": "📉 You may not need full insurance coverage. Consider a catastrophic-only plan or ACA Bronze plan with capital-based savings.",
+    "high_risk_coverage": "🛡️ High-risk detected. Retaining comprehensive insurance or supplementing with surgical and chronic bundles is advised.",
+    "no_insurance": "⚠️ No insurance detected. Make sure capital + care bundles are sufficient for expected needs.",
+    "digital_first": "💡 Digital-first care (e.g., Mira, telehealth) and primary care subscriptions could reduce costs while maintaining access.",
+    "family_bundles": "👨‍👩‍👧 Pediatric and family bundles should be considered for dependents or partner care planning.",
+    "surgical_bundles": "🛠️ Surgical bundles can reduce costs for procedures common in older age brackets.",
+    "low_coverage": "📊 Consider increasing long-term capital allocation or raising your savings contributions.",
+    "excess_coverage": "✅ Your capital strategy exceeds projected healthcare needs. You may be able to optimize for other life goals.",
+    "catastrophic_costs": "🚨 One or more years project catastrophic costs. Consider catastrophic insurance or HSA-backed savings.",
+    **{f"risk_{level}": "📉 " + insight for level, insight in RISK_INSIGHTS.items()}
+}
+RULE_IDS = list(RULE_MESSAGES)
+
+# Columns read by evaluate_rules and their values when absent
+METRIC_DEFAULTS = {
+    "partner_health_status": None,
+    "family_status": "single",
+    "insurance_type": "None",
+    "include_surgical": False,
+    "coverage_ratio": 0.0,
+    "max_cost": 0.0,
+    "shortfall": 0.0
+}
+
+
+def capital_coverage_ratio(cost_df: pd.DataFrame) -> float:
+    if "Capital - Total" not in cost_df.columns or "Cumulative Cost" not in cost_df.columns:
+        return 0
+    # Costs already paid from capital count towards coverage alongside what is left
+    capital_funded = cost_df["Capital - Total"].iloc[-1]
+    if "Capital Drawdown" in cost_df.columns:
+        capital_funded += cost_df["Capital Drawdown"].sum()
+    return capital_funded / cost_df["Cumulative Cost"].iloc[-1]
+
+
+def rule_masks(metrics) -> np.ndarray:
+    """Evaluate every rule as a boolean mask over a table of profiles.
 
-    recs = []
+    `metrics` is a DataFrame or dict of equal-length arrays with `age` and
+    `health_status` plus the summary columns in METRIC_DEFAULTS (`coverage_ratio`,
+    `max_cost`, ...). `max_risk` and `risk_rise` are used when present, otherwise
+    derived from age and health status. Returns a (profiles x RULE_IDS) bool array.
+    """
+    age = np.asarray(metrics["age"])
+    status = np.asarray(metrics["health_status"])
 
-    if insurance_type != "None":
-        if health_status == "healthy" and age < 40 and capital_coverage_ratio > 0.8:
-            recs.append("📉 You may not need full insurance coverage. Consider a catastrophic-only plan or ACA Bronze plan with capital-based savings.")
-        elif health_status == "high_risk" or partner_health == "high_risk":
-            recs.append("🛡️ High-risk detected. Retaining comprehensive insurance or supplementing with surgical and chronic bundles is advised.")
+    def col(name):
+        if name in metrics:
+            return np.asarray(metrics[name])
+        return np.full(len(age), METRIC_DEFAULTS[name], dtype=object)
+
+    healthy = status == "healthy"
+    high_risk = (status == "high_risk") | (col("partner_health_status") == "high_risk")
+    insured = col("insurance_type") != "None"
+    coverage = col("coverage_ratio").astype(np.float64)
+
+    if "max_risk" in metrics and "risk_rise" in metrics:
+        risk = {"max_risk": np.asarray(metrics["max_risk"]), "risk_rise": np.asarray(metrics["risk_rise"])}
     else:
-        recs.append("⚠️ No insurance detected. Make sure capital + care bundles are sufficient for expected needs.")
+        risk = risk_summary(age, status)
+    level = risk_level(risk["max_risk"], risk["risk_rise"])
+
+    light_coverage = insured & healthy & (age < 40) & (coverage > 0.8)
+    masks = {
+        "light_coverage": light_coverage,
+        "high_risk_coverage": insured & ~light_coverage & high_risk,
+        "no_insurance": ~insured,
+        "digital_first": (age < 40) & healthy,
+        "family_bundles": col("family_status") == "family",
+        "surgical_bundles": (age > 50) & col("include_surgical").astype(bool),
+        "low_coverage": coverage < 0.75,
+        "excess_coverage": coverage > 1.2,
+        "catastrophic_costs": col("max_cost").astype(np.float64) > 20000,
+        **{f"risk_{name}": level == name for name in RISK_INSIGHTS}
+    }
+    return np.stack([np.broadcast_to(masks[rule_id], age.shape) for rule_id in RULE_IDS], axis=-1)
+
 
-    if age < 40 and health_status == "healthy":
-        recs.append("💡 Digital-first care (e.g., Mira, telehealth) and primary care subscriptions could reduce costs while maintaining access.")
-    if family:
-        recs.append("👨‍👩‍👧 Pediatric and family bundles should be considered for dependents or partner care planning.")
-    if age > 50 and "include_surgical" in profile:
-        recs.append("🛠️ Surgical bundles can reduce costs for procedures common in older age brackets.")
+def evaluate_rules(metrics: pd.DataFrame) -> pd.DataFrame:
+    # rule_masks as a frame with one column per rule ID
+    import pandas as pd
 
-    if capital_coverage_ratio < 0.75:
-        recs.append("📊 Consider increasing long-term capital allocation or raising your savings contributions.")
-    elif capital_coverage_ratio > 1.2:
-        recs.append("✅ Your capital strategy exceeds projected healthcare needs. You may be able to optimize for other life goals.")
+    return pd.DataFrame(rule_masks(metrics), index=metrics.index, columns=RULE_IDS)
 
-    if "Healthcare Cost" in cost_df.columns and max(cost_df["Healthcare Cost"]) > 20000:
-        recs.append("🚨 One or more years project catastrophic costs. Consider catastrophic insurance or HSA-backed savings.")
 
-    print("RISK TRAJECTORY:", st.session_state.get("risk_trajectory"))
-    print("MAX RISK:", st.session_state.get("max_risk"))
+@timed()
+def recommendation_ids(metrics) -> np.ndarray:
+    # Tuple of fired rule IDs per row, in display order
+    masks = rule_masks(metrics)
+    # Only a few hundred distinct mask patterns occur, so build each ID list once
+    bits = np.int64(1) << np.arange(len(RULE_IDS), dtype=np.int64)
+    patterns, inverse = np.unique(masks @ bits, return_inverse=True)
+    unpacked = (patterns[:, None] & bits) != 0
+    id_lists = np.empty(len(patterns), dtype=object)
+    id_lists[:] = [tuple(rule_id for rule_id, fired in zip(RULE_IDS, row) if fired) for row in unpacked]
+    return id_lists[inverse.reshape(-1)]
 
-    # Add projected risk insight if available
-    risk_insight = get_risk_insight()
-    if risk_insight:
-        recs.append("📉 " + risk_insight)
 
-    return recs
+@timed()
+def recommend_bulk(metrics: pd.DataFrame) -> pd.Series:
+    # recommendation_ids aligned with the frame's index
+    import pandas as pd
+
+    return pd.Series(recommendation_ids(metrics), index=metrics.index)
+
+
+@timed()
+def generate_recommendation(profile, cost_df, surplus, insurance_type, capital_strategy):
+    metrics = {name: np.array([value]) for name, value in {
+        "age": profile.get("age"),
+        "health_status": profile.get("health_status"),
+        "partner_health_status": profile.get("partner_health_status"),
+        "family_status": profile.get("family_status"),
+        "insurance_type": insurance_type,
+        "include_surgical": bool(profile.get("include_surgical")),
+        "coverage_ratio": capital_coverage_ratio(cost_df),
+        "max_cost": cost_df["Healthcare Cost"].max() if "Healthcare Cost" in cost_df.columns else 0.0,
+        "shortfall": sum(x for x in surplus if x < 0)
+    }.items()}
+    return [RULE_MESSAGES[rule_id] for rule_id in recommendation_ids(metrics)[0]]
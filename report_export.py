@@ -0,0 +1,333 @@
+# Client report export: Excel workbooks and PDF summaries from saved plans
+#
+#   python report_export.py plans/ reports/ --formats xlsx,pdf --workers 8
+#
+# Each saved plan (see plan_io) becomes <name>.xlsx and/or <name>.pdf holding the Step 3
+# overview table, the cost/surplus charts and the Step 4 recommendations. Workbooks are
+# streamed row by row in xlsxwriter's constant-memory mode with native Excel charts; PDF
+# charts reuse one matplotlib figure per chart kind, and identical series are rendered
+# once. Plans are spread over a process pool. A plan saved by another engine version or
+# with other assumption tables is recomputed from its inputs, as the app does on upload,
+# and listed at the end of the run.
+
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from matplotlib.figure import Figure
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from plan_io import PLAN_SUFFIX, load_plan, plan_mismatch, plan_paths
+from recommendation_engine import generate_recommendation
+from simulator_core import CAPITAL_COLUMNS, apply_capital_buckets, expense_comparison
+from step_graph import COMPARE_COLUMNS, COST_COLUMNS, StepGraph
+
+REPORT_FORMATS = ("xlsx", "pdf")
+# Embed chart images as binary; reportlab's pure-Python ASCII85 encoding dominates PDF time
+rl_config.useA85 = 0
+CHART_CACHE_SIZE = 256
+
+# chart kind: (title, columns plotted)
+REPORT_CHARTS = {
+    "surplus": ("Surplus/Deficit vs. Income and Total Expenses",
+                ("Surplus/Deficit", "Total Expenses", "Income + Savings")),
+    "healthcare": ("Healthcare vs. Total Expenses", ("Total Healthcare", "Total Expenses"))
+}
+
+
+# What a plan needs for a report when its Step 3 table was not saved; plans saved
+# right after Step 1 have no Step 2 series yet
+STEP2_COLUMNS = ("Age", "Healthcare Cost", "Premiums", "OOP Cost", "income_proj", "savings_proj")
+STEP2_INPUTS = ("monthly_expenses", "debt_monthly_payment", "income_growth")
+# Saved inputs that StepGraph takes as they are (net_income_annual replaces its node)
+GRAPH_STEP1_INPUTS = ("profile", "oop_pct", "premium_inflation")
+GRAPH_STEP2_INPUTS = ("net_income_annual", "income_growth", "monthly_expenses", "debt_monthly_payment",
+                      "savings_start", "savings_growth", "annual_contrib", "contrib_401k_employee",
+                      "contrib_401k_employer", "growth_401k")
+CAPITAL_INPUTS = ("cap_alloc", "capital_monthly_contrib", "capital_from_savings_pct", "savings_start")
+
+
+def missing_for_report(inputs, columns):
+    # Columns and inputs a plan lacks for a report; empty when it is complete
+    if all(name in columns for name in COMPARE_COLUMNS):
+        needed_columns, needed_inputs = ("Healthcare Cost",), ()
+    else:
+        needed_columns, needed_inputs = STEP2_COLUMNS, STEP2_INPUTS
+    return ([name for name in needed_columns if name not in columns]
+            + [name for name in ("profile", *needed_inputs) if name not in inputs])
+
+
+def recompute_columns(inputs):
+    """A plan's Steps 1-4 series recomputed from its inputs with this engine and tables.
+
+    Only the steps whose inputs the plan saved are recomputed, like the app rerunning
+    Steps 1-3 after an upload; Step 4 capital columns need the saved allocation.
+    """
+    missing = [name for name in (*GRAPH_STEP1_INPUTS, "employee_premium", "employer_premium") if name not in inputs]
+    if missing:
+        raise ValueError(f"cannot recompute plan, missing {', '.join(missing)}")
+    graph = StepGraph()
+    graph.update(care_prefs=inputs.get("care_prefs", {}),
+                 total_premium=inputs["employee_premium"] + inputs["employer_premium"],
+                 **{name: inputs[name] for name in GRAPH_STEP1_INPUTS})
+    columns = {name: graph.get(name) for name in COST_COLUMNS}
+    if all(name in inputs for name in GRAPH_STEP2_INPUTS):
+        graph.update(**{name: inputs[name] for name in GRAPH_STEP2_INPUTS})
+        columns.update({name: graph.get(name) for name in (*COMPARE_COLUMNS, "income_proj", "savings_proj",
+                                                            "proj_401k")})
+        if inputs.get("cap_alloc") and all(name in inputs for name in CAPITAL_INPUTS):
+            capital_df = apply_capital_buckets(graph.cost_df(), inputs["cap_alloc"],
+                                               contribution=inputs["capital_monthly_contrib"] * 12,
+                                               savings_start=inputs["savings_start"]
+                                               * inputs["capital_from_savings_pct"] / 100)
+            columns.update({name: capital_df[name].to_numpy() for name in CAPITAL_COLUMNS})
+    return columns
+
+
+def report_frame(inputs, columns) -> pd.DataFrame:
+    # Step 3 overview for a plan; recomputed from the Step 1/2 series when not saved
+    if all(name in columns for name in COMPARE_COLUMNS):
+        data = {name: columns[name] for name in COMPARE_COLUMNS}
+    else:
+        data = {"Age": columns["Age"], **expense_comparison(
+            columns["Premiums"], columns["OOP Cost"], columns["income_proj"], columns["savings_proj"],
+            inputs["monthly_expenses"], inputs["debt_monthly_payment"], inputs["income_growth"])}
+    return pd.DataFrame(data).rename(columns={"OOP Cost": "OOP"})
+
+
+def report_recommendations(inputs, columns, df_compare):
+    capital = inputs.get("cap_alloc") and all(name in columns for name in CAPITAL_COLUMNS)
+    cost_df = pd.DataFrame({name: columns[name] for name in
+                            ("Age", "Healthcare Cost", *(CAPITAL_COLUMNS if capital else ()))})
+    return generate_recommendation(
+        profile=inputs["profile"],
+        cost_df=cost_df,
+        surplus=df_compare["Surplus/Deficit"].to_numpy(),
+        insurance_type=inputs.get("insurance_type"),
+        capital_strategy=inputs["cap_alloc"] if capital else {}
+    )
+
+
+def _rows(df):
+    # Plain Python rows, without per-row pandas overhead
+    return zip(*(df[column].tolist() for column in df.columns))
+
+
+def write_workbook(path, title, df_compare, recommendations):
+    """Stream one client's workbook; rows go out in order, so memory stays constant."""
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    money = workbook.add_format({"num_format": "$#,##0"})
+    bold = workbook.add_format({"bold": True})
+
+    overview = workbook.add_worksheet("Overview")
+    overview.write_row(0, 0, list(df_compare.columns), bold)
+    overview.set_column(1, len(df_compare.columns) - 1, 16, money)
+    for row, values in enumerate(_rows(df_compare), start=1):
+        overview.write_row(row, 0, values)
+
+    n_rows = len(df_compare)
+    charts = workbook.add_worksheet("Charts")
+    for i, (title_text, plotted) in enumerate(REPORT_CHARTS.values()):
+        chart = workbook.add_chart({"type": "line"})
+        for column in plotted:
+            col = df_compare.columns.get_loc(column)
+            chart.add_series({
+                "name": column,
+                "categories": ["Overview", 1, 0, n_rows, 0],
+                "values": ["Overview", 1, col, n_rows, col]
+            })
+        chart.set_title({"name": title_text})
+        chart.set_x_axis({"name": "Age"})
+        charts.insert_chart(i * 20, 0, chart, {"x_scale": 1.6, "y_scale": 1.2})
+
+    notes = workbook.add_worksheet("Recommendations")
+    notes.write(0, 0, title, bold)
+    notes.set_column(0, 0, 120)
+    for row, text in enumerate(recommendations, start=2):
+        notes.write(row, 0, text)
+    workbook.close()
+
+
+class ChartRenderer:
+    """PNG line charts that reuse one laid-out figure per chart kind.
+
+    Only line data and axis limits change between clients; identical series hit a
+    small content-addressed cache and are not redrawn.
+    """
+
+    def __init__(self, cache_size=CHART_CACHE_SIZE):
+        self.figures = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.renders = 0
+
+    def _figure(self, kind):
+        if kind not in self.figures:
+            title, plotted = REPORT_CHARTS[kind]
+            # Not registered with pyplot, so kept figures don't pile up in its global state
+            fig = Figure(figsize=(7, 3))
+            ax = fig.subplots()
+            lines = [ax.plot([], [], label=column)[0] for column in plotted]
+            ax.set_title(title)
+            ax.set_xlabel("Age")
+            ax.legend(loc="upper left", fontsize=8)
+            fig.subplots_adjust(left=0.12, right=0.97, top=0.9, bottom=0.15)
+            self.figures[kind] = (fig, ax, lines)
+        return self.figures[kind]
+
+    def render(self, kind, df_compare) -> bytes:
+        _, plotted = REPORT_CHARTS[kind]
+        ages = df_compare["Age"].to_numpy(dtype=np.float64)
+        series = df_compare[list(plotted)].to_numpy(dtype=np.float64)
+        digest = hashlib.blake2b(kind.encode() + ages.tobytes() + series.tobytes(), digest_size=16).digest()
+        if digest in self.cache:
+            self.cache.move_to_end(digest)
+            return self.cache[digest]
+
+        fig, ax, lines = self._figure(kind)
+        for line, values in zip(lines, series.T):
+            line.set_data(ages, values)
+        ax.relim()
+        ax.autoscale_view()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=100)
+        self.renders += 1
+
+        png = buffer.getvalue()
+        self.cache[digest] = png
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return png
+
+
+def write_pdf(path, title, df_compare, recommendations, renderer):
+    styles = getSampleStyleSheet()
+    story = [Paragraph(title, styles["Title"]), Paragraph("Personalized Recommendations", styles["Heading2"])]
+    story += [Paragraph(escape(text), styles["BodyText"]) for text in recommendations]
+    for kind in REPORT_CHARTS:
+        story += [Spacer(1, 0.2 * inch),
+                  Image(io.BytesIO(renderer.render(kind, df_compare)), width=7 * inch, height=3 * inch)]
+
+    header = ["Age", *df_compare.columns[1:]]
+    rows = [[f"{age:.0f}", *(f"${value:,.0f}" for value in values)] for age, *values in _rows(df_compare)]
+    table = Table([header, *rows], repeatRows=1)
+    table.setStyle(TableStyle([
+        ("FONTSIZE", (0, 0), (-1, -1), 6),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("ALIGN", (1, 1), (-1, -1), "RIGHT")
+    ]))
+    story += [Spacer(1, 0.2 * inch), Paragraph("Financial Overview by Age", styles["Heading2"]), table]
+    SimpleDocTemplate(path, pagesize=letter, title=title).build(story)
+
+
+_renderer = None
+
+
+def build_report(task):
+    """Write the reports for one saved plan; runs in a pool worker.
+
+    Returns {"plan", "files", "recomputed", "error"}, where `recomputed` says why the
+    saved series were replaced (None when they were used). A plan that cannot be read
+    or is incomplete gets an error entry instead of raising, so one bad file never
+    stops a run.
+    """
+    plan_path = task[0]
+    try:
+        files, recomputed = _write_reports(*task)
+        return {"plan": plan_path, "files": files, "recomputed": recomputed, "error": None}
+    except Exception as e:
+        return {"plan": plan_path, "files": [], "recomputed": None, "error": f"{type(e).__name__}: {e}"}
+
+
+def _write_reports(plan_path, out_dir, formats):
+    global _renderer
+    if _renderer is None:
+        _renderer = ChartRenderer()
+    inputs, columns, engine_version, assumptions = load_plan(plan_path)
+    # Saved series from another engine or other tables would not match this run
+    recomputed = plan_mismatch(engine_version, assumptions)
+    if recomputed:
+        columns = recompute_columns(inputs)
+    missing = missing_for_report(inputs, columns)
+    if missing:
+        raise ValueError(f"incomplete plan (saved before Steps 2-3?), missing {', '.join(missing)}")
+    name = os.path.basename(plan_path)[:-len(PLAN_SUFFIX)]
+    title = f"Health Strategy Report: {name}"
+    df_compare = report_frame(inputs, columns)
+    recommendations = report_recommendations(inputs, columns, df_compare)
+
+    written = []
+    if "xlsx" in formats:
+        written.append(os.path.join(out_dir, name + ".xlsx"))
+        write_workbook(written[-1], title, df_compare, recommendations)
+    if "pdf" in formats:
+        written.append(os.path.join(out_dir, name + ".pdf"))
+        write_pdf(written[-1], title, df_compare, recommendations, _renderer)
+    return written, recomputed
+
+
+def run_reports(plan_dir, out_dir, formats=REPORT_FORMATS, workers=None, chunksize=16):
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown report formats: {sorted(unknown)}")
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    # Only paths cross the process boundary; each worker maps its own plans
+    tasks = [(path, out_dir, tuple(formats)) for path in plan_paths(plan_dir)]
+    reports = files = 0
+    failed, recomputed = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(build_report, tasks, chunksize=chunksize):
+            if result["error"]:
+                failed.append((result["plan"], result["error"]))
+                continue
+            if result["recomputed"]:
+                recomputed.append((result["plan"], result["recomputed"]))
+            reports += 1
+            files += len(result["files"])
+
+    elapsed = time.perf_counter() - start
+    return {
+        "reports": reports,
+        "files": files,
+        "failed": failed,
+        "recomputed": recomputed,
+        "seconds": elapsed,
+        "reports_per_minute": reports / elapsed * 60 if elapsed else 0.0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write Excel/PDF client reports for a directory of saved plans.")
+    parser.add_argument("plans", help="directory of saved *" + PLAN_SUFFIX + " plans")
+    parser.add_argument("output", help="directory to write reports to")
+    parser.add_argument("--formats", default=",".join(REPORT_FORMATS), help="comma-separated: xlsx,pdf")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    stats = run_reports(args.plans, args.output, args.formats.split(","), args.workers)
+    for plan_path, reason in stats["recomputed"]:
+        print(f"Recomputed {plan_path}: saved with {reason}", file=sys.stderr)
+    for plan_path, error in stats["failed"]:
+        print(f"Skipped {plan_path}: {error}", file=sys.stderr)
+    print(f"Wrote {stats['reports']:,} reports ({stats['files']:,} files) in {stats['seconds']:.1f}s "
+          f"({stats['reports_per_minute']:,.0f} reports/min); {len(stats['failed']):,} plans skipped",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
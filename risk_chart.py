@@ -0,0 +1,145 @@
+# Step 4 risk chart rendering
+#
+# Zone masks and the critical age are computed with array comparisons. Charts are drawn
+# on a background thread into PNG bytes, cached by a hash of the trajectory, so the app
+# can request a chart as soon as Step 1 knows the trajectory and Step 4 serves it from
+# cache. Figures are plain matplotlib Figure objects (never registered with pyplot) and
+# are cleared as soon as the PNG is written, so figure memory does not grow across reruns.
+# matplotlib is imported on the render thread, so importing this module for the zone
+# constants stays cheap and the app never loads it on a request path (see warm()).
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+CRITICAL_RISK = 0.9
+MODERATE_RISK = 0.5
+CHART_CACHE_SIZE = 512
+
+# zone: (fill color, label)
+RISK_ZONES = {
+    "low": ("green", "Low Risk"),
+    "moderate": ("orange", "Moderate Risk"),
+    "high": ("red", "High Risk")
+}
+
+
+def risk_zone_masks(risk):
+    risk = np.asarray(risk, dtype=np.float64)
+    return {
+        "low": risk < MODERATE_RISK,
+        "moderate": (risk >= MODERATE_RISK) & (risk < CRITICAL_RISK),
+        "high": risk >= CRITICAL_RISK
+    }
+
+
+def critical_age(ages, risk):
+    # First age where risk reaches CRITICAL_RISK, or None
+    critical = np.asarray(risk, dtype=np.float64) >= CRITICAL_RISK
+    return int(np.asarray(ages)[critical.argmax()]) if critical.any() else None
+
+
+def render_risk_chart(ages, risk) -> bytes:
+    """PNG of the projected risk trajectory with zone fills and the critical age."""
+    from matplotlib.figure import Figure
+
+    ages = np.asarray(ages, dtype=np.int64)
+    risk = np.asarray(risk, dtype=np.float64)
+    fig = Figure(figsize=(10, 4))
+    try:
+        ax = fig.subplots()
+        ax.plot(ages, risk, color="black", linewidth=2, label="Risk Score")
+        for zone, mask in risk_zone_masks(risk).items():
+            color, label = RISK_ZONES[zone]
+            ax.fill_between(ages, risk, 0, where=mask, color=color, alpha=0.2, label=label)
+
+        age = critical_age(ages, risk)
+        if age is not None:
+            ax.axvline(x=age, color="red", linestyle="--", linewidth=2, label=f"Critical Age: {age}")
+            ax.text(age + 0.5, 0.92, f"⚠️ Age {age}", color="red", fontsize=10)
+
+        ax.set_xlabel("Age")
+        ax.set_ylabel("Risk Level")
+        ax.set_ylim([0, 1.05])
+        ax.set_title("Projected Health Risk Trajectory")
+        ax.legend(loc="upper left")
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def _load_matplotlib():
+    import matplotlib.figure  # noqa: F401
+
+
+def trajectory_key(ages, risk):
+    ages = np.ascontiguousarray(ages, dtype=np.int64)
+    risk = np.ascontiguousarray(risk, dtype=np.float64)
+    return hashlib.blake2b(ages.tobytes() + risk.tobytes(), digest_size=16).hexdigest()
+
+
+class RiskChartService:
+    """Renders risk charts on background threads with an LRU cache of PNG bytes.
+
+    `submit` returns a Future; repeat requests for a trajectory share the cached or
+    in-flight result instead of rendering again.
+    """
+
+    def __init__(self, max_workers=1, cache_size=CHART_CACHE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="risk-chart")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.renders = 0
+
+    def warm(self):
+        # Load matplotlib on the render thread ahead of the first chart
+        return self._executor.submit(_load_matplotlib)
+
+    def _render(self, ages, risk):
+        png = render_risk_chart(ages, risk)
+        with self._lock:
+            self.renders += 1
+        return png
+
+    def submit(self, ages, risk):
+        key = trajectory_key(ages, risk)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self._futures.move_to_end(key)
+                self.hits += 1
+                return future
+            future = self._executor.submit(self._render, np.array(ages), np.array(risk))
+            self._futures[key] = future
+            while len(self._futures) > self.cache_size:
+                self._futures.popitem(last=False)
+        future.add_done_callback(lambda done: self._drop_failed(key, done))
+        return future
+
+    def _drop_failed(self, key, future):
+        # Failed renders are not cached
+        if future.exception() is None:
+            return
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def chart(self, ages, risk, timeout=None) -> bytes:
+        return self.submit(ages, risk).result(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "renders": self.renders, "entries": len(self._futures)}
+
+
+# Process-wide service shared by every session
+RISK_CHART_SERVICE = RiskChartService()
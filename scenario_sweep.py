@@ -0,0 +1,111 @@
+# Scenario sweeps: a sensitivity cube over the Steps 1-4 assumptions
+#
+#   cube = scenario_sweep({"age": 45, "health_status": "chronic"},
+#                         premium_inflation=[0.03, 0.05, 0.07], oop_pct=[0.15, 0.25],
+#                         income_growth=np.linspace(0.01, 0.04, 4))
+#   cube["min_surplus"][2, 1, 0]   # 7% premium growth, 25% OOP, 1% income growth
+#
+# Each assumption gets its own axis and every step is computed only over the axes it
+# depends on, then broadcast; the full Cartesian grid is never looped over in Python.
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from assumptions import current_assumptions
+from simulator_core import (generate_costs_batch, growth_schedule, accumulate_balance, simulate_capital_buckets,
+                            PROFILE_DEFAULTS)
+
+SWEEP_AXES = ("premium_inflation", "oop_pct", "income_growth", "savings_growth", "growth_401k", "cap_alloc")
+SWEEP_METRICS = ("lifetime_cost", "min_surplus", "first_deficit_age", "final_401k", "capital_shortfall")
+
+
+def _along(values, axis):
+    # Place a 1-D range on its own axis of the cube
+    shape = [1] * len(SWEEP_AXES)
+    shape[axis] = len(values)
+    return np.asarray(values, dtype=np.float64).reshape(shape)
+
+
+def scenario_sweep(base, **ranges):
+    """Evaluate every combination of the given assumption ranges for one client.
+
+    `base` holds the client's profile and Step 1-4 inputs (PROFILE_DEFAULTS names, with
+    `age` required); keyword arguments give a range for any of SWEEP_AXES, where
+    `cap_alloc` values are (short, mid, long) share tuples. Axes without a range keep
+    the base value. Returns {"dims", "coords", <metric>: ndarray} with one array per
+    SWEEP_METRICS entry shaped by the coords; `first_deficit_age` is NaN when the
+    surplus never goes negative.
+    """
+    unknown = set(ranges) - set(SWEEP_AXES)
+    if unknown:
+        raise ValueError(f"Unknown sweep axes: {sorted(unknown)}")
+
+    scenario = {**PROFILE_DEFAULTS, **base}
+    tables = current_assumptions()
+    employee_premium, employer_premium = tables.average_premiums[scenario["insurance_type"]]
+    if not pd.isna(scenario["employee_premium"]):
+        employee_premium = scenario["employee_premium"]
+    if not pd.isna(scenario["employer_premium"]):
+        employer_premium = scenario["employer_premium"]
+    if pd.isna(scenario["oop_pct"]):
+        scenario["oop_pct"] = tables.average_oop_pct[scenario["insurance_type"]]
+    scenario["cap_alloc"] = (scenario["cap_short"], scenario["cap_mid"], scenario["cap_long"])
+
+    coords = {axis: list(ranges.get(axis, [scenario[axis]])) for axis in SWEEP_AXES}
+    axis = {name: i for i, name in enumerate(SWEEP_AXES)}
+
+    medical_cost = generate_costs_batch([scenario], scenario)[0]
+    years = len(medical_cost)
+
+    # Step 1: depends on premium_inflation x oop_pct
+    premiums = growth_schedule(employee_premium + employer_premium,
+                               _along(coords["premium_inflation"], axis["premium_inflation"]), years)
+    oop = medical_cost * _along(coords["oop_pct"], axis["oop_pct"])[..., None]
+    healthcare = oop + premiums
+
+    # Step 2: income x savings growth; 401(k) on its own axis
+    income_growth = _along(coords["income_growth"], axis["income_growth"])
+    net_income_annual = scenario["monthly_income"] * (1 - scenario["est_tax_rate"]) * 12
+    income_proj = growth_schedule(net_income_annual, income_growth, years)
+    savings_proj = accumulate_balance(scenario["savings_start"],
+                                      _along(coords["savings_growth"], axis["savings_growth"]),
+                                      scenario["annual_contrib"], years)
+    final_401k = accumulate_balance(0.0, _along(coords["growth_401k"], axis["growth_401k"]),
+                                    scenario["contrib_401k_employee"] + scenario["contrib_401k_employer"],
+                                    years)[..., -1]
+
+    # Step 3: surplus, same operation order as expense_comparison
+    household = growth_schedule(scenario["monthly_expenses"] * 12, income_growth, years)
+    debt = growth_schedule(scenario["debt_monthly_payment"] * 12, income_growth, years)
+    total_exp = household + debt + (premiums + oop)
+    surplus = (income_proj + savings_proj) - total_exp
+    deficit = surplus < 0
+    first_deficit_age = np.where(deficit.any(axis=-1), scenario["age"] + deficit.argmax(axis=-1), np.nan)
+
+    # Step 4: capital buckets over premium_inflation x oop_pct x cap_alloc
+    shares = np.asarray(coords["cap_alloc"], dtype=np.float64).reshape(
+        (1,) * axis["cap_alloc"] + (len(coords["cap_alloc"]), 3))
+    capital = simulate_capital_buckets(healthcare, shares, scenario["capital_monthly_contrib"] * 12,
+                                       scenario["savings_start"] * scenario["capital_from_savings_pct"] / 100)
+
+    shape = tuple(len(values) for values in coords.values())
+    metrics = {
+        "lifetime_cost": healthcare.sum(axis=-1),
+        "min_surplus": surplus.min(axis=-1),
+        "first_deficit_age": first_deficit_age,
+        "final_401k": final_401k,
+        "capital_shortfall": capital["shortfall"].sum(axis=-1)
+    }
+    return {
+        "dims": SWEEP_AXES,
+        "coords": coords,
+        **{name: np.broadcast_to(values, shape) for name, values in metrics.items()}
+    }
+
+
+def sweep_frame(cube) -> pd.DataFrame:
+    # Long-format view of a sweep cube, one row per scenario
+    index = pd.MultiIndex.from_tuples(list(itertools.product(*cube["coords"].values())), names=cube["dims"])
+    return pd.DataFrame({name: np.ravel(cube[name]) for name in SWEEP_METRICS}, index=index)
@@ -0,0 +1,322 @@
+# HTTP scoring service: Steps 1-4 for advisor platforms
+#
+#   python scoring_service.py --port 8080 --workers 4
+#   curl -d '{"age": 45, "health_status": "chronic"}' localhost:8080/score
+#
+# Requests carry one profile (batch_runner column names; missing fields use the app's
+# defaults). Concurrent requests are coalesced into micro-batches of up to --max-batch
+# profiles, or whatever arrived within --max-wait ms, and each batch is scored with one
+# vectorized core_api.project_profiles call on a process pool. A bounded queue sheds load with 503
+# and every request has a deadline (X-Deadline-Ms header) after which it gets 504.
+# GET /metrics exposes request and batch latency in Prometheus text format.
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from assumptions import current_assumptions
+from core_api import SERIES_FIELDS, SUMMARY_FIELDS, project_profiles
+from instrumentation import span
+from projected_health_risk import HEALTH_STATES
+from simulator_core import AGE_END, FAMILY_STATUSES, MAX_DEPENDENTS, MIN_START_AGE, PROFILE_DEFAULTS
+
+MAX_BATCH = 256
+MAX_WAIT = 0.005
+MAX_QUEUE = 4096
+DEFAULT_DEADLINE = 2.0
+MAX_BODY = 1024 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+
+def validate_profile(profile):
+    # Reject bad input per request, so one profile can't fail a whole batch
+    if not isinstance(profile, dict):
+        raise ValueError("Request body must be a JSON object")
+    age = profile.get("age")
+    if not _is_number(age) or not MIN_START_AGE <= age <= AGE_END:
+        raise ValueError(f"age must be a number between {MIN_START_AGE} and {AGE_END}")
+    if profile.get("health_status", "healthy") not in HEALTH_STATES:
+        raise ValueError(f"health_status must be one of {list(HEALTH_STATES)}")
+    insurance_types = current_assumptions().insurance_types
+    if profile.get("insurance_type", "Employer-based") not in insurance_types:
+        raise ValueError(f"insurance_type must be one of {list(insurance_types)}")
+    if profile.get("family_status", "single") not in FAMILY_STATUSES:
+        raise ValueError(f"family_status must be one of {list(FAMILY_STATUSES)}")
+    if profile.get("partner_health_status") not in (None, *HEALTH_STATES):
+        raise ValueError(f"partner_health_status must be one of {list(HEALTH_STATES)} or null")
+    # Step 1-4 inputs: flags must be booleans and amounts finite numbers (null = default)
+    for name, default in PROFILE_DEFAULTS.items():
+        value = profile.get(name)
+        if value is None:
+            continue
+        if isinstance(default, bool):
+            if not isinstance(value, bool):
+                raise ValueError(f"{name} must be true or false")
+        elif isinstance(default, (int, float)) and not _is_number(value):
+            raise ValueError(f"{name} must be a number")
+    if profile.get("partner_age") is not None and not _is_number(profile["partner_age"]):
+        raise ValueError("partner_age must be a number")
+    num_dependents = profile.get("num_dependents")
+    if num_dependents is not None and not (num_dependents == int(num_dependents)
+                                           and 0 <= num_dependents <= MAX_DEPENDENTS):
+        raise ValueError(f"num_dependents must be a whole number between 0 and {MAX_DEPENDENTS}")
+    dependent_ages = profile.get("dependent_ages")
+    if dependent_ages is not None and not (isinstance(dependent_ages, list) and len(dependent_ages) <= MAX_DEPENDENTS
+                                           and all(map(_is_number, dependent_ages))):
+        raise ValueError(f"dependent_ages must be a list of up to {MAX_DEPENDENTS} numbers")
+    return {**profile, "age": int(age)}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _json_value(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def score_batch(profiles, include_series=False):
+    """Score a list of profile dicts in one vectorized pass; runs in a pool worker.
+
+    If the batch fails, its profiles are scored one by one and a profile that still
+    fails gets an exception in its place, so it cannot fail the rest of the batch.
+    """
+    try:
+        return _score_rows(profiles, include_series)
+    except Exception:
+        pass
+    rows = []
+    for profile in profiles:
+        try:
+            rows.extend(_score_rows([profile], include_series))
+        except Exception as e:
+            rows.append(RuntimeError(f"Scoring failed: {type(e).__name__}: {e}"))
+    return rows
+
+
+def _score_rows(profiles, include_series):
+    result = project_profiles(profiles)
+    columns = {name: result[name].tolist() for name in SUMMARY_FIELDS}
+    columns["first_deficit_age"] = [age if deficit else None for age, deficit in
+                                    zip(columns["first_deficit_age"], result["has_deficit"].tolist())]
+    columns["recommendation_ids"] = [list(ids) for ids in columns["recommendation_ids"]]
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    for i, row in enumerate(rows):
+        if include_series:
+            for name in SERIES_FIELDS:
+                row[name] = result[name][i, :result["years"][i]].tolist()
+        for name, value in row.items():
+            row[name] = [_json_value(v) for v in value] if isinstance(value, list) else _json_value(value)
+    return rows
+
+
+class MicroBatcher:
+    """Coalesces concurrent score requests into batches for the process pool."""
+
+    def __init__(self, executor, max_batch=MAX_BATCH, max_wait=MAX_WAIT, max_queue=MAX_QUEUE,
+                 max_inflight=1):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.stats = {"requests": 0, "rejected": 0, "expired": 0, "batches": 0, "batched_profiles": 0}
+
+    def submit(self, profile, deadline):
+        # Future for the profile's score; raises asyncio.QueueFull when saturated
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((profile, deadline, future))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise
+        self.stats["requests"] += 1
+        return future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        end = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self._collect()
+            now = time.monotonic()
+            live = []
+            for profile, deadline, future in batch:
+                if future.done():
+                    continue
+                if deadline <= now:
+                    self.stats["expired"] += 1
+                    future.set_exception(asyncio.TimeoutError())
+                else:
+                    live.append((profile, future))
+            if live:
+                # Waiting for a free slot leaves requests in the queue, which is the backpressure
+                await self.inflight.acquire()
+                asyncio.create_task(self._score(live))
+
+    async def _score(self, live):
+        try:
+            self.stats["batches"] += 1
+            self.stats["batched_profiles"] += len(live)
+            loop = asyncio.get_running_loop()
+            with span("scoring.batch"):
+                rows = await loop.run_in_executor(self.executor, score_batch, [p for p, _ in live])
+        except Exception as e:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), row in zip(live, rows):
+                if future.done():
+                    continue
+                if isinstance(row, Exception):
+                    future.set_exception(row)
+                else:
+                    future.set_result(row)
+        finally:
+            self.inflight.release()
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY:
+        raise OverflowError
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+def _response(status, payload, content_type="application/json", extra_headers=()):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+    head = [f"HTTP/1.1 {status} {REASONS[status]}", f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}", *extra_headers]
+    return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+
+class ScoringServer:
+    def __init__(self, batcher, default_deadline=DEFAULT_DEADLINE):
+        self.batcher = batcher
+        self.default_deadline = default_deadline
+
+    async def score(self, headers, body):
+        try:
+            profile = validate_profile(json.loads(body))
+            timeout = float(headers.get("x-deadline-ms", self.default_deadline * 1000)) / 1000
+        except ValueError as e:
+            return _response(400, {"error": str(e)})
+        # Client ids are echoed back, not batched, so mixed id types can't break a batch
+        request_id = profile.pop("id", None)
+        deadline = time.monotonic() + timeout
+        try:
+            future = self.batcher.submit(profile, deadline)
+        except asyncio.QueueFull:
+            return _response(503, {"error": "Server busy"}, extra_headers=("Retry-After: 1",))
+        try:
+            result = await asyncio.wait_for(future, deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            return _response(504, {"error": "Deadline exceeded"})
+        except Exception as e:
+            return _response(500, {"error": str(e)})
+        return _response(200, result if request_id is None else {"id": request_id, **result})
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except OverflowError:
+                    writer.write(_response(413, {"error": "Request body too large"}))
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                with span("scoring.request"):
+                    if method == "POST" and path == "/score":
+                        response = await self.score(headers, body)
+                    elif method == "GET" and path == "/healthz":
+                        response = _response(200, {"status": "ok", **self.batcher.stats})
+                    elif method == "GET" and path == "/metrics":
+                        response = _response(200, instrumentation.prometheus_text().encode(), "text/plain")
+                    else:
+                        response = _response(404, {"error": "Not found"})
+                writer.write(response)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=8080, workers=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT,
+                max_queue=MAX_QUEUE):
+    instrumentation.enable()
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        batcher = MicroBatcher(executor, max_batch, max_wait, max_queue, max_inflight=workers)
+        batch_task = asyncio.create_task(batcher.run())
+        server = await asyncio.start_server(ScoringServer(batcher).handle, host, port)
+        # Warm the workers so the first requests don't pay for process start-up
+        await asyncio.get_running_loop().run_in_executor(executor, score_batch, [{"age": 40}])
+        print(f"Scoring service on http://{host}:{port}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Steps 1-4 scoring over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT * 1000, help="batch window in ms")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_batch, args.max_wait / 1000,
+                          args.max_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Compact per-session column store
+#
+# Every per-year series a session needs (Step 1 costs, Step 2 projections, Step 3
+# comparison, Step 4 capital, risk trajectory) lives once in a typed NumPy array keyed by
+# its column name. Arrays handed in with the store's dtype are kept as-is, so columns
+# shared with the StepGraph or between steps are one buffer; frames are built as views.
+
+import os
+import weakref
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DTYPE = np.dtype(os.environ.get("HSS_SESSION_DTYPE", "float64"))
+DEFAULT_MAX_BYTES = int(os.environ.get("HSS_SESSION_MAX_BYTES", 4 * 1024 * 1024))
+
+_SESSIONS = weakref.WeakSet()
+
+
+def _root(array):
+    # Owner of an array's memory, so views of one buffer are counted once
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+class SessionStore:
+    """Named 1-D columns for one user session, with a byte ceiling.
+
+    Floating-point columns are stored as `dtype` (float32 halves the footprint at the
+    cost of a copy from the float64 engine output); other columns keep their dtype.
+    Stored arrays are read-only and shared with every frame built from them.
+    """
+
+    def __init__(self, dtype=DEFAULT_DTYPE, max_bytes=DEFAULT_MAX_BYTES):
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.columns = {}
+        _SESSIONS.add(self)
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def _typed(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind == "f" or values.dtype == object:
+            values = values.astype(self.dtype, copy=False)
+        return values
+
+    def put(self, **columns):
+        # Store columns by name; raises MemoryError past the ceiling, leaving the store unchanged
+        updated = {**self.columns, **{name: self._typed(values) for name, values in columns.items()}}
+        size = self._bytes(updated)
+        if size > self.max_bytes:
+            raise MemoryError(f"Session store needs {size:,} bytes, over its {self.max_bytes:,} byte ceiling")
+        for values in updated.values():
+            values.flags.writeable = False
+        self.columns = updated
+
+    def put_frame(self, df: pd.DataFrame, columns=None):
+        self.put(**{name: df[name].to_numpy() for name in (columns or df.columns)})
+
+    def drop(self, *names):
+        self.columns = {name: values for name, values in self.columns.items() if name not in names}
+
+    def frame(self, columns, rename=None) -> pd.DataFrame:
+        df = pd.DataFrame({name: self.columns[name] for name in columns}, copy=False)
+        return df.rename(columns=rename) if rename else df
+
+    @staticmethod
+    def _bytes(columns):
+        buffers = {id(_root(values)): _root(values).nbytes for values in columns.values()}
+        return sum(buffers.values())
+
+    @property
+    def nbytes(self):
+        return self._bytes(self.columns)
+
+
+def session_bytes():
+    # Bytes held by each live session store, for sizing app servers
+    return pd.Series([store.nbytes for store in list(_SESSIONS)], name="bytes", dtype=np.int64)
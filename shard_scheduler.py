@@ -0,0 +1,230 @@
+# Checkpointed, resumable population runs
+#
+#   python shard_scheduler.py profiles.parquet runs/book-2026 --shard-size 20000 --workers 8
+#   python shard_scheduler.py profiles.parquet runs/book-2026 --mode stats     # population_stats partials
+#
+# The input is cut into shards of --shard-size profiles that idle pool workers pull
+# from a shared queue, so slow shards never hold up a fixed share of the work. Every
+# finished shard is written to its own file in the run directory and renamed into
+# place, so a shard file on disk is always complete. Running the same command again
+# resumes: finished shards are skipped and only the rest are projected. In projections
+# mode the run directory is a Parquet dataset (pq.read_table(run_dir)); in stats mode
+# the shard aggregates are merged into population.npz and summary.json at the end.
+# Invalid input rows are skipped; their ids and reasons are checkpointed next to the
+# shard (_rejected-<shard>.json) and reported when the run finishes.
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pyarrow.parquet as pq
+
+from batch_runner import print_rejected, project_chunk, read_profiles, split_invalid
+from population_stats import PopulationStats, summary_json
+
+SHARD_SIZE = 20000
+MODES = {"projections": ".parquet", "stats": ".npz"}
+MANIFEST = "_manifest.json"
+PROGRESS_INTERVAL = 10.0
+# Settings a resumed run must share with the run that wrote the shards
+RUN_KEYS = ("input", "input_bytes", "input_mtime_ns", "shard_size", "mode", "monthly", "id_column")
+
+
+def count_profiles(path):
+    # Rows in the input: Parquet metadata, otherwise non-empty lines (minus the CSV header)
+    if path.endswith(".parquet"):
+        return pq.ParquetFile(path).metadata.num_rows
+    lines = 0
+    with open(path, "rb") as f:
+        for line in f:
+            lines += bool(line.strip())
+    return lines if path.endswith((".jsonl", ".json")) else max(lines - 1, 0)
+
+
+def shard_path(run_dir, index, mode):
+    return os.path.join(run_dir, f"shard-{index:06d}{MODES[mode]}")
+
+
+def rejected_path(run_dir, index):
+    # Leading underscore: Parquet dataset readers skip it
+    return os.path.join(run_dir, f"_rejected-{index:06d}.json")
+
+
+def _write_atomic(path, write):
+    # Write to a hidden temporary name and rename; dot files are ignored as dataset parts
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def run_shard(task):
+    """Project one shard and checkpoint it; runs in a pool worker."""
+    index, chunk, run_dir, mode, monthly, id_column, row_offset = task
+    valid, rejected = split_invalid(chunk, id_column, row_offset)
+    table = project_chunk(valid, id_column=id_column, monthly=monthly)
+    # Rejections first: the shard file marks the shard done
+    if rejected:
+        _write_atomic(rejected_path(run_dir, index), lambda tmp_path: _dump_json(rejected, tmp_path))
+    path = shard_path(run_dir, index, mode)
+    if mode == "stats":
+        stats = PopulationStats().update(valid, table)
+        stats.rejected = len(rejected)
+        stats.save(path)
+    else:
+        _write_atomic(path, lambda tmp_path: pq.write_table(table, tmp_path))
+    return index, len(chunk)
+
+
+def _load_manifest(run_dir, settings):
+    # Start a run directory, or check that an existing one was started with the same settings
+    path = os.path.join(run_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        changed = [key for key in RUN_KEYS if manifest.get(key) != settings[key]]
+        if changed:
+            raise ValueError(f"{run_dir} holds a run with different {', '.join(changed)}; "
+                             "use a new run directory")
+        return manifest
+    manifest = {**settings, "total_profiles": count_profiles(settings["input"])}
+    os.makedirs(run_dir, exist_ok=True)
+    _write_atomic(path, lambda tmp_path: _dump_json(manifest, tmp_path))
+    return manifest
+
+
+def _dump_json(value, path):
+    with open(path, "w") as f:
+        json.dump(value, f, indent=2)
+
+
+def _format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def print_progress(progress):
+    eta = _format_eta(progress["eta_seconds"]) if progress["eta_seconds"] is not None else "?"
+    print(f"{progress['shards_done']:,} shards, {progress['profiles_done']:,}/{progress['total_profiles']:,} "
+          f"profiles ({progress['fraction']:.1%}), {progress['profiles_per_sec']:,.0f} profiles/sec, ETA {eta}",
+          file=sys.stderr)
+
+
+def run_sharded(input_path, run_dir, shard_size=SHARD_SIZE, workers=None, mode="projections", monthly=False,
+                id_column="profile_id", progress=print_progress, progress_interval=PROGRESS_INTERVAL):
+    """Project `input_path` shard by shard into `run_dir`, resuming any earlier run there.
+
+    At most two shards per worker are in flight, so memory stays flat. `progress` is
+    called at most every `progress_interval` seconds (and once at the end) with shard
+    and profile counts, this session's throughput and the ETA.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {list(MODES)}")
+    input_path = os.path.abspath(input_path)
+    info = os.stat(input_path)
+    manifest = _load_manifest(run_dir, {
+        "input": input_path, "input_bytes": info.st_size, "input_mtime_ns": info.st_mtime_ns,
+        "shard_size": shard_size, "mode": mode, "monthly": monthly, "id_column": id_column
+    })
+    # Temporary files left by an interrupted run never became shards
+    for name in os.listdir(run_dir):
+        if name.startswith("."):
+            os.remove(os.path.join(run_dir, name))
+
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    total = manifest["total_profiles"]
+    counts = {"shards_done": 0, "shards_skipped": 0, "profiles_done": 0, "profiles_skipped": 0}
+    last_report = start
+
+    def report(force=False):
+        nonlocal last_report
+        now = time.perf_counter()
+        if progress is None or (not force and now - last_report < progress_interval):
+            return
+        last_report = now
+        elapsed = now - start
+        processed = counts["profiles_done"] - counts["profiles_skipped"]
+        rate = processed / elapsed if elapsed else 0.0
+        remaining = max(total - counts["profiles_done"], 0)
+        progress({**counts, "total_profiles": total, "fraction": counts["profiles_done"] / total if total else 1.0,
+                  "profiles_per_sec": rate, "eta_seconds": remaining / rate if rate else None})
+
+    def finish(done):
+        for future in done:
+            _, rows = future.result()
+            counts["shards_done"] += 1
+            counts["profiles_done"] += rows
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for index, chunk in enumerate(read_profiles(input_path, shard_size)):
+            if os.path.exists(shard_path(run_dir, index, mode)):
+                counts["shards_done"] += 1
+                counts["shards_skipped"] += 1
+                counts["profiles_done"] += len(chunk)
+                counts["profiles_skipped"] += len(chunk)
+                continue
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finish(done)
+                report()
+            pending.add(pool.submit(run_shard, (index, chunk, run_dir, mode, monthly, id_column,
+                                                index * shard_size)))
+        finish(wait(pending).done)
+    report(force=True)
+
+    if mode == "stats":
+        stats = PopulationStats()
+        for index in range(counts["shards_done"]):
+            stats.merge(PopulationStats.load(shard_path(run_dir, index, mode)))
+        stats.save(os.path.join(run_dir, "population.npz"))
+        _write_atomic(os.path.join(run_dir, "summary.json"), lambda tmp_path: _dump_json(summary_json(stats), tmp_path))
+
+    rejected = []
+    for index in range(counts["shards_done"]):
+        if os.path.exists(rejected_path(run_dir, index)):
+            with open(rejected_path(run_dir, index)) as f:
+                rejected += [tuple(row) for row in json.load(f)]
+
+    elapsed = time.perf_counter() - start
+    processed = counts["profiles_done"] - counts["profiles_skipped"]
+    return {
+        "shards": counts["shards_done"],
+        "rejected": rejected,
+        "skipped_shards": counts["shards_skipped"],
+        "profiles": counts["profiles_done"],
+        "processed_profiles": processed,
+        "seconds": elapsed,
+        "profiles_per_sec": processed / elapsed if elapsed else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Steps 1-4 projections in resumable, checkpointed shards.")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file with one profile per row")
+    parser.add_argument("run_dir", help="directory for shard checkpoints; rerun with the same one to resume")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--mode", choices=list(MODES), default="projections")
+    parser.add_argument("--monthly", action="store_true", help="add monthly deficit columns")
+    parser.add_argument("--id-column", default="profile_id")
+    parser.add_argument("--progress-interval", type=float, default=PROGRESS_INTERVAL, help="seconds")
+    args = parser.parse_args(argv)
+
+    stats = run_sharded(args.input, args.run_dir, args.shard_size, args.workers, args.mode, args.monthly,
+                        args.id_column, progress_interval=args.progress_interval)
+    print_rejected(stats["rejected"])
+    print(f"Projected {stats['processed_profiles']:,} profiles in {stats['seconds']:.1f}s "
+          f"({stats['profiles_per_sec']:,.0f} profiles/sec, peak RSS {stats['peak_rss_mb']:,.0f} MB); "
+          f"{stats['skipped_shards']:,} of {stats['shards']:,} shards were already done; "
+          f"{len(stats['rejected']):,} invalid profiles skipped", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Simulation result cache
+#
+# Results are keyed by a canonical hash of their inputs, ENGINE_VERSION and the
+# assumption table fingerprint, kept in an in-process LRU bounded by bytes and
+# optionally spilled to an on-disk tier. One cache instance per process is shared by
+# every Streamlit session and batch job. The disk tier is best effort: I/O errors are
+# logged and counted, and the lookup or write falls back to memory only.
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from assumptions import current_assumptions
+from simulator_core import ENGINE_VERSION
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _canonical(value):
+    # Normalize inputs so equivalent scenarios hash identically (30 == 30.0, key order)
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda item: str(item[0]))}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        value = float(value)
+        return int(value) if value.is_integer() else round(value, 12)
+    return value
+
+
+def cache_key(*parts):
+    # The assumption fingerprint keeps results from replaced tables from being reused
+    payload = json.dumps([ENGINE_VERSION, current_assumptions().fingerprint, _canonical(list(parts))],
+                         separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_size_of(v) for v in value) + 8 * len(value)
+    if isinstance(value, dict):
+        return sum(_size_of(v) for v in value.values()) + 64 * len(value)
+    return 64
+
+
+def _freeze(value):
+    # Shared arrays are made read-only, so a caller mutating one fails loudly instead of
+    # corrupting every other session's result
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _freeze(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v)
+    return value
+
+
+class SimulationCache:
+    """Thread-safe LRU of simulation results with a byte budget and optional disk tier.
+
+    Cached objects are shared between callers and must be treated as read-only; NumPy
+    arrays (also inside lists and dicts) are stored with `writeable` off.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_errors = 0
+        if disk_dir:
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning("Simulation cache: disk tier %s unavailable, memory only: %s", disk_dir, e)
+                self.disk_dir = None
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".pkl")
+
+    def _disk_error(self, action, key, error):
+        with self._lock:
+            self.disk_errors += 1
+        logger.warning("Simulation cache: could not %s %s on disk: %s", action, key, error)
+
+    def _store(self, key, value, size):
+        # Caller holds the lock; a replaced entry's bytes are released first
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (_freeze(value), size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    value = pickle.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                self._disk_error("read", key, e)
+            else:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, _size_of(value))
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def put(self, key, value):
+        size = _size_of(value)
+        with self._lock:
+            self._store(key, value, size)
+        if self.disk_dir:
+            try:
+                self._write_disk(key, value)
+            except OSError as e:
+                self._disk_error("write", key, e)
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_errors": self.disk_errors,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+
+# Process-wide cache; HSS_CACHE_DIR enables the on-disk tier
+SIMULATION_CACHE = SimulationCache(disk_dir=os.environ.get("HSS_CACHE_DIR"))
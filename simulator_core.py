@@ -1,55 +1,673 @@
 # Core simulation logic
+#
+# The engines take plain arrays (or DataFrames, which the app and batch runner pass);
+# pandas is only imported by the DataFrame-returning Step helpers.
 
-import pandas as pd
+from __future__ import annotations
 
+from collections.abc import Mapping
+from itertools import chain
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from assumptions import CARE_SCOPES, HEALTH_STATES, MAX_AGE, current_assumptions
+from instrumentation import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Bump when a change alters simulation output, so cached results are not reused
+ENGINE_VERSION = "4"
+
+AGE_END = 85
+
+# Household members: the partner ages and carries their own risk multiplier; each
+# dependent costs a share of the base cost (see assumption_tables) until aging out of
+# the family plan
+DEPENDENT_AGE_OUT = 26
+PEDIATRIC_AGE_OUT = 18
+DEFAULT_DEPENDENT_AGE = 5
+
+
+def _as_table(rows):
+    # Profiles as columns: a DataFrame or a dict of equal-length arrays as given, and a
+    # list of profile dicts turned into {column: list} (keys a profile lacks are None)
+    if isinstance(rows, Mapping) or hasattr(rows, "columns"):
+        return rows
+    rows = list(rows)
+    names = dict.fromkeys(chain.from_iterable(rows))
+    return {name: [row.get(name) for row in rows] for name in names}
+
+
+def _is_column(value):
+    return hasattr(value, "__len__") and not isinstance(value, (str, bytes))
+
+
+def _table_length(table):
+    if hasattr(table, "columns"):
+        return len(table)
+    return len(next(iter(table.values()), ()))
+
+
+def _profile_column(table, name, default, n):
+    if name in table:
+        return np.asarray(table[name])
+    return np.full(n, default)
+
+
+def _missing(values):
+    # None / NaN entries, like pandas.isna for the columns profiles hold
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind == "O":
+        return np.equal(values, None) | (values != values)
+    return np.zeros(values.shape, dtype=bool)
+
+
+def _numeric(values):
+    # Floats with NaN for missing or unparseable entries (pandas.to_numeric(errors="coerce"))
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        def to_float(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+        return np.fromiter(map(to_float, values.tolist()), dtype=np.float64, count=len(values))
+
+
+def _flags(values):
+    # Booleans with missing entries as False
+    if values.dtype.kind == "b":
+        return values
+    return np.where(_missing(values), False, values).astype(bool)
+
+
+def horizon_years(start_ages):
+    # Number of simulated years for each start age (every profile runs to AGE_END)
+    return AGE_END - np.asarray(start_ages, dtype=np.int64) + 1
+
+
+def _is_missing_value(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def _dependent_ages(value):
+    # One profile's dependent_ages: a list/tuple/array of ages, or missing (no ages)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return value
+    if _is_missing_value(value):
+        return ()
+    raise ValueError(f"dependent_ages must be a list of ages, got {value!r}")
+
+
+def _dependents(table, n, is_family):
+    # Flat (household row, dependent rank, age) for every dependent of a family row;
+    # `dependent_ages` beyond num_dependents are dropped and missing ages use
+    # DEFAULT_DEPENDENT_AGE. Singles have no dependents, whatever num_dependents says
+    num_dependents = np.nan_to_num(_numeric(_profile_column(table, "num_dependents", 0, n))).astype(np.int64)
+    num_dependents = np.where(is_family, num_dependents, 0)
+    listed = [()] * n
+    if "dependent_ages" in table and num_dependents.any():
+        listed = [_dependent_ages(ages) for ages in list(table["dependent_ages"])]
+    listed_count = np.fromiter(map(len, listed), dtype=np.int64, count=n)
+    rows = np.repeat(np.arange(n), listed_count)
+    ages = np.fromiter(chain.from_iterable(listed), dtype=np.float64, count=int(listed_count.sum()))
+    known = ~np.isnan(ages)
+    rows, ages = rows[known], ages[known].astype(np.int64)
+    listed_count = np.bincount(rows, minlength=n)
+    rank = np.arange(len(rows)) - np.repeat(np.cumsum(listed_count) - listed_count, listed_count)
+    keep = rank < num_dependents[rows]
+    rows, ages, rank = rows[keep], ages[keep], rank[keep]
+
+    listed_count = np.minimum(listed_count, num_dependents)
+    missing = np.maximum(num_dependents - listed_count, 0)
+    fill_rows = np.repeat(np.arange(n), missing)
+    fill_rank = listed_count[fill_rows] + np.arange(len(fill_rows)) - np.repeat(np.cumsum(missing) - missing, missing)
+    return (np.concatenate([rows, fill_rows]), np.concatenate([rank, fill_rank]),
+            np.concatenate([ages, np.full(len(fill_rows), DEFAULT_DEPENDENT_AGE, dtype=np.int64)]))
+
+
+def _risk_multipliers(tables, ages, statuses):
+    # Multiplier at each member's starting age; unknown statuses count as 1.0
+    status = tables.status_codes(statuses)
+    age_index = np.clip(np.asarray(ages, dtype=np.int64), 0, MAX_AGE)
+    return np.where(status >= 0, tables.risk_multiplier[age_index, status], 1.0)
+
+
+def _partner(tables, partner_age, partner_status, start_ages, t):
+    # Partner costs for family rows: own risk, aging from their own age, covered until
+    # they pass AGE_END
+    if not len(start_ages):
+        return np.zeros((0, len(t)))
+    partner_age = _numeric(partner_age)
+    partner_age = np.where(np.isnan(partner_age), start_ages, partner_age)
+    partner_risk = _risk_multipliers(tables, partner_age, partner_status)
+    partner = np.add.outer(partner_age - start_ages, t)
+    np.maximum(partner, 0, out=partner)
+    partner *= tables.parameters["aging_rate"]
+    partner += 1
+    partner *= (tables.parameters["base_cost"] * partner_risk)[:, None]
+    np.copyto(partner, 0.0, where=t[None, :] > (AGE_END - partner_age)[:, None])
+    return partner
+
+
+def _household(profiles, care_preferences):
+    """Per-member cost components shared by the household engines."""
+    tables = current_assumptions()
+    table = _as_table(profiles)
+    n = _table_length(table)
+
+    start_ages = np.asarray(table["age"], dtype=np.int64)
+    years = horizon_years(start_ages)
+    max_years = int(years.max()) if n else 0
+    t = np.arange(max_years, dtype=np.float64)
+
+    risk_multiplier = _risk_multipliers(tables, start_ages, table["health_status"])
+    is_family = np.asarray(_profile_column(table, "family_status", "single", n) == "family")
+
+    # One dict of flags shared by every profile, or per-profile flag columns
+    if isinstance(care_preferences, Mapping) and not any(map(_is_column, care_preferences.values())):
+        care_table = None
+    else:
+        care_table = _as_table(care_preferences)
+    # Yearly care bundle add-ons; family_only bundles are skipped for singles and
+    # per_dependent bundles are charged for each dependent (family rows only) under
+    # PEDIATRIC_AGE_OUT
+    care_costs = np.zeros(n, dtype=np.float64)
+    dependent_care = np.zeros(n, dtype=np.float64)
+    for key, addon, scope in zip(tables.care_categories, tables.care_cost, tables.care_scope):
+        if care_table is None:
+            selected = np.full(n, bool(care_preferences.get(key)))
+        elif key in care_table:
+            selected = _flags(np.asarray(care_table[key]))
+        else:
+            continue
+        if CARE_SCOPES[scope] == "per_dependent":
+            dependent_care += np.where(selected, addon, 0)
+            continue
+        if CARE_SCOPES[scope] == "family_only":
+            selected = selected & is_family
+        care_costs += np.where(selected, addon, 0)
+
+    # Primary member, carrying the household-level care bundles
+    base_cost = tables.parameters["base_cost"]
+    age_factor = 1 + tables.parameters["aging_rate"] * t
+    primary = (base_cost * risk_multiplier)[:, None] * age_factor[None, :] + care_costs[:, None]
+
+    partner_rows = np.flatnonzero(is_family)
+    partner = _partner(tables, _profile_column(table, "partner_age", np.nan, n)[partner_rows],
+                       _profile_column(table, "partner_health_status", "healthy", n)[partner_rows],
+                       start_ages[partner_rows], t)
+
+    dep_rows, dep_rank, dep_ages = _dependents(table, n, is_family)
+    return {
+        "n": n, "years": years, "max_years": max_years, "primary": primary,
+        "partner_rows": partner_rows, "partner": partner,
+        "dep_rows": dep_rows, "dep_rank": dep_rank,
+        "dependent_cost": base_cost * tables.parameters["dependent_cost_share"],
+        "dep_covered": DEPENDENT_AGE_OUT - dep_ages, "dep_pediatric": PEDIATRIC_AGE_OUT - dep_ages,
+        "dependent_care": dependent_care
+    }
+
+
+def _dependent_costs(h):
+    # Household dependent cost by year without a member x year array: each dependent
+    # adds its yearly cost at the year its coverage ends, and a reverse cumulative sum
+    # over years gives the total for dependents still covered
+    rows = h["dep_rows"]
+    households, slot = np.unique(rows, return_inverse=True)
+    width = h["max_years"] + 1
+    ends = np.concatenate([slot * width + np.clip(h["dep_covered"], 0, h["max_years"]),
+                           slot * width + np.clip(h["dep_pediatric"], 0, h["max_years"])])
+    weights = np.concatenate([np.full(len(rows), h["dependent_cost"]), h["dependent_care"][rows]])
+    ending = np.bincount(ends, weights, minlength=len(households) * width).reshape(len(households), width)
+    return households, ending[:, :0:-1].cumsum(axis=1)[:, ::-1]
+
+
+def _add_rows(costs, rows, values):
+    # In place; a fancy-indexed += would gather and scatter every row
+    if len(rows) == len(costs):
+        costs += values
+    else:
+        costs[rows] += values
+
+
+def _in_horizon(costs, years, dtype):
+    outside = np.arange(costs.shape[-1]) >= years[:, None]
+    np.copyto(costs, np.nan, where=outside.reshape(outside.shape[:1] + (1,) * (costs.ndim - 2) + outside.shape[1:]))
+    return costs.astype(dtype, copy=False)
+
+
+@timed()
+def generate_costs_batch(profiles, care_preferences, dtype=np.float64):
+    """Yearly household healthcare cost for many profiles at once.
+
+    `profiles` is a DataFrame, a dict of equal-length arrays or a list of profile dicts
+    with `age`, `health_status` and optionally `family_status`, `partner_age`,
+    `partner_health_status`, `num_dependents` and `dependent_ages`. `care_preferences`
+    is either one dict shared by every profile or a table (or dict of arrays) of
+    `include_*` flags aligned with `profiles`.
+
+    Returns a (profiles x years) array where column j is year j of each profile's
+    horizon; years past age 85 are NaN because horizons are ragged. Dependents are
+    summed without materializing a member x year array, so cost does not grow with
+    household size beyond one entry per dependent.
+    """
+    h = _household(profiles, care_preferences)
+    costs = h["primary"]
+    _add_rows(costs, h["partner_rows"], h["partner"])
+    if len(h["dep_rows"]):
+        households, dependents = _dependent_costs(h)
+        _add_rows(costs, households, dependents)
+    return _in_horizon(costs, h["years"], dtype)
+
+
+def household_member_costs(profiles, care_preferences, dtype=np.float64):
+    """Per-member yearly costs as a (profiles x members x years) array.
+
+    Member 0 is the primary (with household-level care bundles), member 1 the partner
+    and members 2.. the dependents in `dependent_ages` order; absent members are zero.
+    Summing over members gives generate_costs_batch.
+    """
+    h = _household(profiles, care_preferences)
+    n, max_years, rows = h["n"], h["max_years"], h["dep_rows"]
+    max_dependents = int(h["dep_rank"].max()) + 1 if len(rows) else 0
+    t = np.arange(max_years)
+
+    members = np.zeros((n, 2 + max_dependents, max_years), dtype=np.float64)
+    members[:, 0] = h["primary"]
+    members[h["partner_rows"], 1] = h["partner"]
+    members[rows, 2 + h["dep_rank"]] = (h["dependent_cost"] * (t[None, :] < h["dep_covered"][:, None])
+                                        + h["dependent_care"][rows][:, None]
+                                        * (t[None, :] < h["dep_pediatric"][:, None]))
+    return _in_horizon(members, h["years"], dtype)
+
+
+@timed()
 def generate_costs(profile, care_preferences):
-    age_start = profile["age"]
-    age_end = 85
-    base_cost = 2000
-    costs = []
-
-    dependent_ages = profile.get("dependent_ages", [])
-
-    for year_index, user_age in enumerate(range(age_start, age_end + 1)):
-        risk_multiplier = {
-            "healthy": 1.0,
-            "chronic": 1.5,
-            "high_risk": 2.0
-        }.get(profile["health_status"], 1.0)
-
-        age_factor = 1 + 0.03 * (user_age - age_start)
-        family_factor = 1 + 0.5 * profile["num_dependents"] if profile["family_status"] == "family" else 1
-
-        cost = base_cost * risk_multiplier * age_factor * family_factor
-
-        care_costs = 0
-        if care_preferences.get("include_primary"):
-            care_costs += 500
-        if care_preferences.get("include_surgical"):
-            care_costs += 1500
-        if care_preferences.get("include_cancer"):
-            care_costs += 2000
-        if care_preferences.get("include_pediatric"):
-            care_costs += 1000 if profile["family_status"] == "family" else 0
-        if care_preferences.get("include_maternity"):
-            care_costs += 1200 if profile["family_status"] == "family" else 0
-
-        total_cost = cost + care_costs
-        costs.append({
-            "Age": user_age,
-            "Healthcare Cost": total_cost
-        })
-
-    return pd.DataFrame(costs)
+    import pandas as pd
+
+    costs = generate_costs_batch([profile], care_preferences)[0]
+    ages = np.arange(profile["age"], AGE_END + 1)
+    return pd.DataFrame({
+        "Age": ages,
+        "Healthcare Cost": costs[:len(ages)]
+    })
+
+
+# Same defaults as the Step 1-4 widgets in health_simulator_app.py; NaN premiums and
+# OOP fall back to the national averages for the profile's insurance type (the
+# insurance assumption table)
+PROFILE_DEFAULTS = {
+    "health_status": "healthy",
+    "family_status": "single",
+    "num_dependents": 0,
+    "partner_health_status": None,
+    "insurance_type": "Employer-based",
+    "employee_premium": np.nan,
+    "employer_premium": np.nan,
+    "oop_pct": np.nan,
+    "premium_inflation": 0.05,
+    "include_primary": True,
+    "include_chronic": True,
+    "include_preventive": True,
+    "include_surgical": True,
+    "include_cancer": True,
+    "include_mental": True,
+    "include_emergency": True,
+    "include_eol": True,
+    "include_maternity": True,
+    "include_pediatric": True,
+    "monthly_income": 5000,
+    "est_tax_rate": 0.25,
+    "income_growth": 0.02,
+    "monthly_expenses": 2500,
+    "debt_monthly_payment": 500,
+    "savings_start": 10000,
+    "savings_growth": 0.03,
+    "annual_contrib": 3000,
+    "contrib_401k_employee": 4000,
+    "contrib_401k_employer": 2000,
+    "growth_401k": 0.05,
+    "cap_short": 0.1,
+    "cap_mid": 0.2,
+    "cap_long": 0.7,
+    "capital_from_savings_pct": 0,
+    "capital_monthly_contrib": 0
+}
+
+
+# Input rules for profiles (shared by the batch tools and the scoring service)
+MIN_START_AGE = 18
+FAMILY_STATUSES = ("single", "family")
+MAX_DEPENDENTS = 20
+
+
+def with_profile_defaults(profiles):
+    """`profiles` as {column: array} with every PROFILE_DEFAULTS column filled in.
+
+    Missing columns and missing values (None / NaN) take the defaults; NaN premiums and
+    OOP shares take the national averages for the profile's insurance type (unknown
+    types have none). Other columns are passed through.
+    """
+    table = _as_table(profiles)
+    n = _table_length(table)
+    columns = {name: table[name] for name in table}
+    for name, default in PROFILE_DEFAULTS.items():
+        if name not in columns:
+            columns[name] = np.full(n, default)
+            continue
+        values = np.asarray(columns[name])
+        if default is not None:
+            missing = _missing(values)
+            if missing.any():
+                values = np.where(missing, default, values)
+        columns[name] = values
+
+    tables = current_assumptions()
+    insurance = tables.insurance_codes(columns["insurance_type"])
+    known = insurance >= 0
+    for name, averages in (("employee_premium", tables.premiums[:, 0]), ("employer_premium", tables.premiums[:, 1]),
+                           ("oop_pct", tables.oop_pct)):
+        values = _numeric(columns[name])
+        columns[name] = np.where(np.isnan(values) & known, averages[insurance], values)
+    return columns
+
+
+def profile_errors(profiles):
+    """Why each profile cannot be projected: an array of messages, "" for valid rows.
+
+    `age` is required and must lie in MIN_START_AGE..AGE_END; labels must be known and
+    the other PROFILE_DEFAULTS columns numbers (or flags) where given. Missing values
+    take the defaults and are not errors. Only the first problem of a row is reported.
+    """
+    table = _as_table(profiles)
+    n = _table_length(table)
+    errors = np.full(n, "", dtype=object)
+
+    def check(bad, message):
+        errors[(errors == "") & bad] = message
+
+    def values(name):
+        return np.asarray(table[name]) if name in table else None
+
+    age = values("age")
+    if age is None:
+        check(np.ones(n, dtype=bool), "age is missing")
+    else:
+        age = _numeric(age)
+        check(np.isnan(age), "age is missing or not a number")
+        check(~((age >= MIN_START_AGE) & (age <= AGE_END)), f"age must be between {MIN_START_AGE} and {AGE_END}")
+
+    labels = (("health_status", HEALTH_STATES), ("partner_health_status", HEALTH_STATES),
+              ("family_status", FAMILY_STATUSES), ("insurance_type", current_assumptions().insurance_types))
+    for name, allowed in labels:
+        column = values(name)
+        if column is not None:
+            check(~_missing(column) & ~np.isin(column.astype(object), list(allowed)),
+                  f"{name} must be one of {list(allowed)}")
+
+    for name, default in PROFILE_DEFAULTS.items():
+        column = values(name)
+        if column is None or isinstance(default, str) or default is None:
+            continue
+        given = ~_missing(column)
+        if isinstance(default, bool):
+            if column.dtype.kind != "b":
+                check(given & ~np.isin(column.astype(object), [True, False]), f"{name} must be true or false")
+            continue
+        number = _numeric(column)
+        check(given & ~np.isfinite(number), f"{name} must be a number")
+        if name == "num_dependents":
+            check(given & ~((number == np.round(number)) & (number >= 0) & (number <= MAX_DEPENDENTS)),
+                  f"num_dependents must be a whole number between 0 and {MAX_DEPENDENTS}")
+
+    if "dependent_ages" in table:
+        def bad_ages(ages):
+            try:
+                ages = _numeric(np.asarray(_dependent_ages(ages), dtype=object))
+            except ValueError:
+                return True
+            return len(ages) > MAX_DEPENDENTS or not np.isfinite(ages).all()
+        check(np.fromiter(map(bad_ages, list(table["dependent_ages"])), dtype=bool, count=n),
+              f"dependent_ages must be a list of up to {MAX_DEPENDENTS} ages")
+    return errors
+
+
+# Up to this many distinct rates, growth factors come from Python's float pow so batch
+# results match the per-user app exactly (NumPy's vectorized pow can differ by an ulp)
+EXACT_RATE_LIMIT = 4096
+
+
+def growth_factors(rate, years):
+    # (1 + rate) ** i for each year i, with years on a new last axis
+    rate = np.asarray(rate, dtype=np.float64)
+    rates, inverse = np.unique(rate, return_inverse=True)
+    if len(rates) > EXACT_RATE_LIMIT:
+        return (1 + rate[..., None]) ** np.arange(years)
+    table = np.array([[(1 + r) ** i for i in range(years)] for r in rates.tolist()]).reshape(len(rates), years)
+    return table[inverse.reshape(rate.shape)]
+
+
+def growth_schedule(amount, rate, years):
+    # amount * (1 + rate) ** i for each year i; broadcasts over leading axes
+    return np.asarray(amount, dtype=np.float64)[..., None] * growth_factors(rate, years)
+
+
+def accumulate_balance(start, growth_rate, contribution, years):
+    # Year-end balances of `value = value * (1 + growth) + contribution`
+    value = np.asarray(start, dtype=np.float64)
+    growth = 1 + np.asarray(growth_rate, dtype=np.float64)
+    contribution = np.asarray(contribution, dtype=np.float64)
+    shape = np.broadcast_shapes(value.shape, growth.shape, contribution.shape)
+    values = np.empty(shape + (years,))
+    for t in range(years):
+        value = value * growth + contribution
+        values[..., t] = value
+    return values
+
 
+def insurance_costs(costs, total_premium, oop_pct, premium_inflation):
+    """Step 1: premiums, OOP share and total healthcare cost per year.
 
+    `costs` is the medical cost from `generate_costs`/`generate_costs_batch`
+    (years on the last axis); the other inputs are scalars or one value per profile.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    premiums = growth_schedule(total_premium, premium_inflation, costs.shape[-1])
+    oop = costs * np.asarray(oop_pct, dtype=np.float64)[..., None]
+    return {
+        "Premiums": premiums,
+        "OOP Cost": oop,
+        "Healthcare Cost": oop + premiums
+    }
+
+
+@timed()
+def apply_insurance(cost_df: pd.DataFrame, total_premium, oop_pct, premium_inflation) -> pd.DataFrame:
+    result = cost_df.copy(deep=False)
+    for column, values in insurance_costs(cost_df["Healthcare Cost"].to_numpy(), total_premium,
+                                          oop_pct, premium_inflation).items():
+        result[column] = values
+    return result
+
+
+@timed()
+def project_finances(net_income_annual, income_growth, savings_start, savings_growth, annual_contrib,
+                     contrib_401k, growth_401k, years):
+    # Step 2: income, savings and 401(k) projections
+    return {
+        "income_proj": growth_schedule(net_income_annual, income_growth, years),
+        "savings_proj": accumulate_balance(savings_start, savings_growth, annual_contrib, years),
+        "proj_401k": accumulate_balance(np.zeros_like(np.asarray(contrib_401k, dtype=np.float64)),
+                                        growth_401k, contrib_401k, years)
+    }
+
+
+@timed()
+def expense_comparison(premiums, oop, income_proj, savings_proj, monthly_expenses, debt_monthly_payment,
+                       income_growth):
+    # Step 3: expenses vs. income + savings; keys match the Step 3 table columns
+    years = np.shape(premiums)[-1]
+    household = growth_schedule(np.asarray(monthly_expenses, dtype=np.float64) * 12, income_growth, years)
+    debt = growth_schedule(np.asarray(debt_monthly_payment, dtype=np.float64) * 12, income_growth, years)
+    healthcare = premiums + oop
+    total_exp = household + debt + healthcare
+    total_income = income_proj + savings_proj
+    return {
+        "Household Expenses": household,
+        "Debt Payments": debt,
+        "Premiums": premiums,
+        "OOP": oop,
+        "Total Healthcare": healthcare,
+        "Total Expenses": total_exp,
+        "Income + Savings": total_income,
+        "Surplus/Deficit": total_income - total_exp
+    }
+
+
+def compound_contributions(savings_start, contribution, investment_rate, years):
+    """Year-end balances of `value = (value + contribution) * (1 + rate)`.
+
+    Inputs broadcast against each other with years on the last axis, so one call
+    evaluates any number of strategies; `contribution` may be a constant or a
+    per-year schedule. The scan runs over years only and is vectorized across
+    strategies, so results match the row-by-row loop exactly.
+    """
+    start = np.asarray(savings_start, dtype=np.float64)[..., None]
+    contribution = np.asarray(contribution, dtype=np.float64)
+    if contribution.ndim == 0:
+        contribution = contribution[None]
+    growth = 1 + np.asarray(investment_rate, dtype=np.float64)[..., None]
+
+    shape = np.broadcast_shapes(start.shape[:-1], contribution.shape[:-1], growth.shape[:-1]) + (years,)
+    contribution = np.broadcast_to(contribution, contribution.shape[:-1] + (years,))
+    values = np.empty(shape, dtype=np.float64)
+    value = np.broadcast_to(start[..., 0], shape[:-1])
+    for t in range(years):
+        value = (value + contribution[..., t]) * growth[..., 0]
+        values[..., t] = value
+    return values
+
+
+def simulate_investment_grid(years, investment_rates, contributions, savings_starts=0):
+    # Every (rate, contribution schedule, starting balance) combination in one call.
+    # Returns an array shaped (rates, contribution schedules, starts, years).
+    rates = np.atleast_1d(np.asarray(investment_rates, dtype=np.float64))
+    schedules = np.asarray(contributions, dtype=np.float64)
+    if schedules.ndim < 2:
+        schedules = np.broadcast_to(schedules.reshape(-1, 1), (schedules.size, years))
+    starts = np.atleast_1d(np.asarray(savings_starts, dtype=np.float64))
+    return compound_contributions(
+        starts[None, None, :],
+        schedules[None, :, None, :],
+        rates[:, None, None],
+        years
+    )
+
+
+@timed()
 def simulate_investment_strategy(cost_df: pd.DataFrame, investment_rate: float, contribution, savings_start=0) -> pd.DataFrame:
-    investment_value = savings_start
-    investment_growth = []
-    for i, row in cost_df.iterrows():
-        annual_contribution = contribution[i] if isinstance(contribution, list) else contribution
-        investment_value = (investment_value + annual_contribution) * (1 + investment_rate)
-        investment_growth.append(investment_value)
-    cost_df["investment_value"] = investment_growth
-    cost_df["Capital - Total"] = cost_df.get("Capital - Short", 0) + cost_df.get("Capital - Mid", 0) + cost_df.get("Capital - Long", 0)
-    return cost_df
+    years = len(cost_df)
+    if not np.isscalar(contribution):
+        contribution = np.asarray(contribution, dtype=np.float64)[:years]
+    result = cost_df.copy(deep=False)
+    result["investment_value"] = compound_contributions(savings_start, contribution, investment_rate, years)
+    result["Capital - Total"] = result.get("Capital - Short", 0) + result.get("Capital - Mid", 0) + result.get("Capital - Long", 0)
+    return result
+
+
+# Capital care buckets, drawn down in horizon order
+CAPITAL_BUCKETS = ("short", "mid", "long")
+BUCKET_RETURNS = {
+    "short": 0.02,
+    "mid": 0.04,
+    "long": 0.06
+}
+# Liquidity rule: years before a bucket can be drawn on
+BUCKET_LOCK_YEARS = {
+    "short": 0,
+    "mid": 5,
+    "long": 10
+}
+# Columns added by apply_capital_buckets
+CAPITAL_COLUMNS = tuple(f"Capital - {bucket.title()}" for bucket in CAPITAL_BUCKETS) + (
+    "Capital - Total", "Capital Drawdown", "Capital Shortfall", "Cumulative Cost")
+
+
+def _allocation_matrix(allocations):
+    if isinstance(allocations, dict):
+        return np.array([allocations.get(b, 0) for b in CAPITAL_BUCKETS], dtype=np.float64)
+    return np.asarray(allocations, dtype=np.float64)
+
+
+def simulate_capital_buckets(costs, allocations, contribution=0, savings_start=0,
+                             bucket_returns=None, lock_years=None):
+    """Fund yearly costs from short/mid/long capital buckets.
+
+    `allocations` is a `cap_alloc` dict or an (..., 3) array of short/mid/long shares,
+    so many allocations can be evaluated at once. Each year the contribution is split
+    by allocation, the cost is drawn from unlocked buckets in horizon order, and what
+    is left grows at each bucket's own return. Unmet cost is reported as shortfall.
+    """
+    bucket_returns = {**BUCKET_RETURNS, **(bucket_returns or {})}
+    lock_years = {**BUCKET_LOCK_YEARS, **(lock_years or {})}
+
+    shares = _allocation_matrix(allocations)
+    costs = np.nan_to_num(np.asarray(costs, dtype=np.float64))
+    years = costs.shape[-1]
+    # Contribution is a constant or schedule with years (or 1) on the last axis
+    contribution = np.asarray(contribution, dtype=np.float64)
+    if contribution.ndim == 0:
+        contribution = contribution[None]
+    growth = 1 + np.array([bucket_returns[b] for b in CAPITAL_BUCKETS])
+    unlock_year = np.array([lock_years[b] for b in CAPITAL_BUCKETS])
+
+    batch_shape = np.broadcast_shapes(shares.shape[:-1], costs.shape[:-1], contribution.shape[:-1],
+                                      np.shape(savings_start))
+    contribution = np.broadcast_to(contribution, contribution.shape[:-1] + (years,))
+    balance = np.broadcast_to(np.asarray(savings_start, dtype=np.float64)[..., None] * shares,
+                              batch_shape + (3,)).copy()
+    balances = np.empty(batch_shape + (3, years))
+    drawdown = np.zeros(batch_shape + (3, years))
+    shortfall = np.empty(batch_shape + (years,))
+
+    for t in range(years):
+        balance += contribution[..., t, None] * shares
+        remaining = np.broadcast_to(costs[..., t], batch_shape).copy()
+        for b in range(3):
+            if t < unlock_year[b]:
+                continue
+            draw = np.minimum(balance[..., b], remaining)
+            balance[..., b] -= draw
+            remaining -= draw
+            drawdown[..., b, t] = draw
+        balance *= growth
+        balances[..., t] = balance
+        shortfall[..., t] = remaining
+
+    return {
+        "balances": balances,
+        "drawdown": drawdown,
+        "shortfall": shortfall,
+        "shortfall_years": shortfall > 0
+    }
+
+
+@timed()
+def apply_capital_buckets(cost_df: pd.DataFrame, cap_alloc, contribution=0, savings_start=0,
+                          bucket_returns=None, lock_years=None) -> pd.DataFrame:
+    # Adds bucket balances, drawdown and shortfall columns for one allocation
+    run = simulate_capital_buckets(cost_df["Healthcare Cost"].to_numpy(), cap_alloc, contribution,
+                                   savings_start, bucket_returns, lock_years)
+    result = cost_df.copy(deep=False)
+    for b, bucket in enumerate(CAPITAL_BUCKETS):
+        result[f"Capital - {bucket.title()}"] = run["balances"][b]
+    result["Capital - Total"] = run["balances"].sum(axis=0)
+    result["Capital Drawdown"] = run["drawdown"].sum(axis=0)
+    result["Capital Shortfall"] = run["shortfall"]
+    result["Cumulative Cost"] = result["Healthcare Cost"].cumsum()
+    return result
@@ -0,0 +1,134 @@
+# Incremental Steps 1-3 pipeline
+#
+# Every derived column is a node with the inputs/nodes it depends on. Changing an input
+# only invalidates the nodes downstream of it, and nodes are recomputed lazily on read,
+# so e.g. a new premium_inflation recomputes Premiums and the totals built on it but
+# never the medical cost curve or the savings projections.
+
+import numpy as np
+import pandas as pd
+
+from simulator_core import AGE_END, generate_costs, growth_schedule, accumulate_balance
+from projected_health_risk import get_risk_trajectory
+from sim_cache import SIMULATION_CACHE, cache_key
+
+STEP1_INPUTS = ("profile", "care_prefs", "total_premium", "oop_pct", "premium_inflation")
+STEP2_INPUTS = ("monthly_income", "est_tax_rate", "income_growth", "monthly_expenses", "debt_monthly_payment",
+                "savings_start", "savings_growth", "annual_contrib", "contrib_401k_employee",
+                "contrib_401k_employer", "growth_401k")
+
+
+def _medical_cost(profile, care_prefs):
+    # Shared with other sessions through the simulation cache
+    key = cache_key("medical_cost", profile, care_prefs)
+    return SIMULATION_CACHE.get_or_compute(
+        key, lambda: generate_costs(profile, care_prefs)["Healthcare Cost"].to_numpy())
+
+
+# node: (dependencies, function of those dependencies in order)
+PIPELINE = {
+    "Age": (("profile",), lambda profile: np.arange(profile["age"], AGE_END + 1)),
+    "medical_cost": (("profile", "care_prefs"), _medical_cost),
+    "risk_trajectory": (("profile",), lambda profile: get_risk_trajectory(profile["age"], profile["health_status"])),
+    "Premiums": (("total_premium", "premium_inflation", "Age"),
+                 lambda total_premium, premium_inflation, ages: growth_schedule(total_premium, premium_inflation,
+                                                                               len(ages))),
+    "OOP Cost": (("medical_cost", "oop_pct"), lambda medical_cost, oop_pct: medical_cost * oop_pct),
+    "Healthcare Cost": (("OOP Cost", "Premiums"), lambda oop, premiums: oop + premiums),
+    "net_income_annual": (("monthly_income", "est_tax_rate"),
+                          lambda monthly_income, est_tax_rate: monthly_income * (1 - est_tax_rate) * 12),
+    "income_proj": (("net_income_annual", "income_growth", "Age"),
+                    lambda income, growth, ages: growth_schedule(income, growth, len(ages))),
+    "savings_proj": (("savings_start", "savings_growth", "annual_contrib", "Age"),
+                     lambda start, growth, contrib, ages: accumulate_balance(start, growth, contrib, len(ages))),
+    "proj_401k": (("contrib_401k_employee", "contrib_401k_employer", "growth_401k", "Age"),
+                  lambda employee, employer, growth, ages: accumulate_balance(0.0, growth, employee + employer,
+                                                                              len(ages))),
+    "Household Expenses": (("monthly_expenses", "income_growth", "Age"),
+                           lambda expenses, growth, ages: growth_schedule(expenses * 12, growth, len(ages))),
+    "Debt Payments": (("debt_monthly_payment", "income_growth", "Age"),
+                      lambda debt, growth, ages: growth_schedule(debt * 12, growth, len(ages))),
+    "Total Healthcare": (("Premiums", "OOP Cost"), lambda premiums, oop: premiums + oop),
+    "Total Expenses": (("Household Expenses", "Debt Payments", "Total Healthcare"),
+                       lambda household, debt, healthcare: household + debt + healthcare),
+    "Income + Savings": (("income_proj", "savings_proj"), lambda income, savings: income + savings),
+    "Surplus/Deficit": (("Income + Savings", "Total Expenses"), lambda income, expenses: income - expenses)
+}
+
+COST_COLUMNS = ("Age", "Healthcare Cost", "Premiums", "OOP Cost")
+COMPARE_COLUMNS = ("Age", "Household Expenses", "Debt Payments", "Premiums", "OOP Cost", "Total Healthcare",
+                   "Total Expenses", "Income + Savings", "Surplus/Deficit")
+
+
+def _same(a, b):
+    try:
+        return bool(np.all(a == b)) and type(a) is type(b)
+    except (TypeError, ValueError):
+        return False
+
+
+class StepGraph:
+    """Lazily evaluated Steps 1-3 columns that recompute only what an edit affects."""
+
+    def __init__(self, pipeline=PIPELINE):
+        self.pipeline = pipeline
+        self.inputs = {}
+        self.values = {}
+        self.recomputed = {name: 0 for name in pipeline}
+        self.dependents = {}
+        for name, (deps, _) in pipeline.items():
+            for dep in deps:
+                self.dependents.setdefault(dep, []).append(name)
+
+    def _invalidate(self, name):
+        stack = list(self.dependents.get(name, ()))
+        while stack:
+            node = stack.pop()
+            # Nodes without a value have no computed dependents either
+            if node in self.values:
+                del self.values[node]
+                stack.extend(self.dependents.get(node, ()))
+
+    def update(self, **inputs):
+        # Set inputs; returns the names that actually changed
+        changed = []
+        for name, value in inputs.items():
+            if name in self.inputs and _same(self.inputs[name], value):
+                continue
+            self.inputs[name] = value
+            self._invalidate(name)
+            changed.append(name)
+        return changed
+
+    def get(self, name):
+        if name in self.inputs:
+            return self.inputs[name]
+        if name not in self.values:
+            deps, func = self.pipeline[name]
+            self.values[name] = func(*(self.get(dep) for dep in deps))
+            self.recomputed[name] += 1
+        return self.values[name]
+
+    def stale(self):
+        # Nodes that the next read would recompute
+        return [name for name in self.pipeline if name not in self.values]
+
+    def frame(self, columns):
+        return pd.DataFrame({column: self.get(column) for column in columns})
+
+    def cost_df(self):
+        return self.frame(COST_COLUMNS)
+
+    def compare_df(self):
+        return self.frame(COMPARE_COLUMNS).rename(columns={"OOP Cost": "OOP"})
+
+    def sweep(self, input_name, values, node):
+        # Evaluate `node` for each value of one input, recomputing only its subgraph
+        original = self.inputs.get(input_name)
+        results = []
+        for value in values:
+            self.update(**{input_name: value})
+            results.append(self.get(node))
+        if original is not None:
+            self.update(**{input_name: original})
+        return results
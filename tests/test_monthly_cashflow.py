@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import monthly_cashflow as monthly
+
+MONTHS = monthly.MONTHS
+
+
+def random_inputs(seed):
+    # Step 2 inputs per profile, including zero, negative and flat rates and negative savings
+    rng = np.random.default_rng(seed)
+    n, years = int(rng.integers(1, 30)), int(rng.integers(1, 68))
+    return (
+        rng.random((n, years)) * 15000, rng.random((n, years)) * 3000, rng.random((n, years)) * 60000,
+        rng.random(n) * 3000, rng.random(n) * 600, rng.normal(0.02, 0.02, n),
+        rng.normal(5000, 20000, n), np.where(rng.random(n) < 0.3, 0.0, rng.normal(0.03, 0.05, n)),
+        rng.normal(2000, 3000, n), rng.random(n) * 6000, rng.normal(0.05, 0.03, n)
+    )
+
+
+def month_loop(premiums, oop, income, monthly_expenses, debt_monthly_payment, income_growth, savings_start,
+               savings_growth, annual_contrib, contrib_401k, growth_401k):
+    # Monthly Surplus/Deficit and year-end balances, one month at a time
+    n, years = premiums.shape
+    surplus = np.empty((n, years, MONTHS))
+    savings = np.empty((n, years))
+    retirement = np.empty((n, years))
+    for i in range(n):
+        savings_step = (1 + savings_growth[i]) ** (1 / MONTHS) - 1
+        retirement_step = (1 + growth_401k[i]) ** (1 / MONTHS) - 1
+        balance, balance_401k = savings_start[i], 0.0
+        for year in range(years):
+            scale = (1 + income_growth[i]) ** year
+            expenses = (monthly_expenses[i] + debt_monthly_payment[i]) * 12 * scale + premiums[i, year] + oop[i, year]
+            net_flow = (income[i, year] - expenses) / MONTHS
+            for month in range(MONTHS):
+                balance = balance * (1 + savings_step) + annual_contrib[i] / MONTHS
+                balance_401k = balance_401k * (1 + retirement_step) + contrib_401k[i] / MONTHS
+                surplus[i, year, month] = balance + net_flow * (month + 1)
+            savings[i, year], retirement[i, year] = balance, balance_401k
+    return surplus, savings, retirement
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_summary_matches_month_loop(seed):
+    inputs = random_inputs(seed)
+    surplus, savings, retirement = month_loop(*inputs)
+    short = surplus < 0
+    # Months within rounding of zero may land on either side
+    certain = (np.abs(surplus) > 1e-6 * np.maximum(np.abs(surplus).max(), 1)).all(axis=-1)
+    first = np.where(short.any(axis=-1), short.argmax(axis=-1) + 1, 0)
+
+    chunk_years = int(np.random.default_rng(seed).integers(1, 20))
+    for first_year, summary in monthly.iter_monthly_summary(*inputs, chunk_years=chunk_years):
+        years = slice(first_year, first_year + summary["Savings"].shape[-1])
+        np.testing.assert_allclose(summary["Savings"], savings[:, years], rtol=1e-9, atol=1e-6)
+        np.testing.assert_allclose(summary["401(k)"], retirement[:, years], rtol=1e-9, atol=1e-6)
+        np.testing.assert_allclose(summary["Surplus/Deficit"], surplus[:, years, -1], rtol=1e-9, atol=1e-6)
+        known = certain[:, years]
+        np.testing.assert_array_equal(summary["Deficit Months"][known], short[:, years].sum(axis=-1)[known])
+        np.testing.assert_array_equal(summary["First Deficit Month"][known], first[:, years][known])
+
+
+def test_monthly_series_matches_month_loop():
+    inputs = random_inputs(0)
+    surplus, _, _ = month_loop(*inputs)
+    months = monthly.monthly_cashflow(*inputs)
+    np.testing.assert_allclose(months["Surplus/Deficit"], surplus.reshape(len(surplus), -1), rtol=1e-9, atol=1e-6)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import simulator_core as core
+from assumptions import HEALTH_STATES, current_assumptions
+
+
+def random_profiles(n, seed):
+    # Mixed single and family households, partners and dependents with their ages
+    rng = np.random.default_rng(seed)
+    profiles = []
+    for _ in range(n):
+        family = rng.random() < 0.6
+        dependents = int(rng.integers(0, 5)) if family else 0
+        profiles.append({
+            "age": int(rng.integers(core.MIN_START_AGE, core.AGE_END + 1)),
+            "health_status": str(rng.choice(HEALTH_STATES)),
+            "family_status": "family" if family else "single",
+            "partner_age": int(rng.integers(core.MIN_START_AGE, core.AGE_END + 1)),
+            "partner_health_status": str(rng.choice(HEALTH_STATES)),
+            "num_dependents": dependents,
+            "dependent_ages": [int(age) for age in rng.integers(0, 26, dependents)]
+        })
+    return profiles
+
+
+def random_care_prefs(seed):
+    rng = np.random.default_rng(seed)
+    return {key: bool(rng.random() < 0.5) for key in current_assumptions().care_categories}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_matches_per_profile(seed):
+    profiles = random_profiles(40, seed)
+    care_prefs = random_care_prefs(seed)
+    batch = core.generate_costs_batch(profiles, care_prefs)
+    for row, profile in zip(batch, profiles):
+        scalar = core.generate_costs(profile, care_prefs)["Healthcare Cost"].to_numpy()
+        np.testing.assert_allclose(row[:len(scalar)], scalar, rtol=1e-12)
+        assert np.isnan(row[len(scalar):]).all()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_member_costs_sum_to_household(seed):
+    profiles = random_profiles(40, seed)
+    care_prefs = random_care_prefs(seed)
+    members = core.household_member_costs(profiles, care_prefs)
+    np.testing.assert_allclose(members.sum(axis=1), core.generate_costs_batch(profiles, care_prefs), rtol=1e-12)
+    # Absent members cost nothing
+    for row, profile in zip(members, profiles):
+        years = core.AGE_END - profile["age"] + 1
+        if profile["family_status"] != "family":
+            assert not row[1:, :years].any()
+        assert not row[2 + profile["num_dependents"]:, :years].any()
+
+
+def test_simulate_investment_strategy_leaves_input_unchanged():
+    cost_df = core.generate_costs(random_profiles(1, 0)[0], {})
+    before = cost_df.copy()
+    result = core.simulate_investment_strategy(cost_df, 0.05, 1000, 10000)
+    pd.testing.assert_frame_equal(cost_df, before)
+    assert "investment_value" in result and "investment_value" not in cost_df